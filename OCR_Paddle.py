@@ -1,56 +1,88 @@
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import onnxruntime as ort
 import cv2
 import numpy as np
 import os
-import requests
+import io
+import sys
+import time
+import argparse
+import contextlib
 from datetime import datetime
-from paddleocr import PaddleOCR
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import re
+from collections import Counter
+import fast_renderer
+from batch_processor import is_image_name
+from box_clustering import connected_labels, group_bounds, neighbor_pairs
+from inpainting import INPAINT_METHODS, inpaint_regions
+from layout import analyze_layout, layout_text
+from text_masks import build_text_masks, crop_box, crop_region
+from tiled_detection import detect_tiled, needs_tiling, tile_settings
 
-# 解决matplotlib中文显示问题
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
-
-def setup_chinese_font():
-    """自动检测并设置中文字体"""
-    try:
-        for font in fm.fontManager.ttflist:
-            if any(chinese_name in font.name for chinese_name in ['SimHei', 'Microsoft YaHei', 'PingFang']):
-                plt.rcParams['font.sans-serif'] = [font.name] + plt.rcParams['font.sans-serif']
-                print(f"✅ 找到中文字体: {font.name}")
-                return
-        print("⚠️ 未找到理想中文字体，使用默认字体")
-    except:
-        print("⚠️ 字体设置失败，使用默认字体")
+# PaddleOCR整图检测时的最长边上限（det_limit_side_len 默认值），超过时整图缩小后检测
+PADDLE_DET_LIMIT_SIDE = 960
 
 class ONNXOCRTextSeparator:
-    def __init__(self):
-        """初始化ONNX OCR文字分离器"""
-        setup_chinese_font()
+    def __init__(self, engine='paddle', model_name=None, batch_size=None, threads=None):
+        """初始化ONNX OCR文字分离器
+        
+        engine: 'paddle' 使用PaddleOCR; 'onnx' 使用ONNX Runtime直接加载
+                models/model-config.json 中的检测/识别模型
+        batch_size: 批量识别时每批的文字区域数量，默认读取配置中的 defaultSettings.batchSize
+        threads: 推理和OpenCV使用的线程数，None时使用各库的默认值
+        """
         print("🔍 初始化ONNX Runtime OCR...")
         
+        self.threads = threads
+        if threads:
+            cv2.setNumThreads(threads)
+        
+        from model_config import load_default_settings
+        settings = load_default_settings()
+        if batch_size is None:
+            batch_size = settings.get('batchSize', 8)
+        self.batch_size = batch_size
+        self.tiling = tile_settings(settings)
+        
         # 使用OpenCV作为后端，演示ONNX Runtime框架
         self.use_opencv_backend = True
-        print("📝 当前使用OpenCV检测 + PaddleOCR识别")
-        print("💡 可扩展为完整ONNX模型")
+        self.use_onnx_engine = False
+        self.use_paddleocr = False
+        
+        if engine == 'onnx':
+            self._init_onnx_engine(model_name)
         
-        # 初始化PaddleOCR
-        self._init_paddleocr()
+        if not self.use_onnx_engine:
+            print("📝 当前使用OpenCV检测 + PaddleOCR识别")
+            print("💡 可扩展为完整ONNX模型")
+            # 初始化PaddleOCR
+            self._init_paddleocr()
         
         print("✅ ONNX Runtime OCR初始化完成")
     
+    def _init_onnx_engine(self, model_name):
+        """初始化ONNX Runtime检测+识别引擎"""
+        try:
+            from onnx_ocr_engine import ONNXOCREngine
+            self.onnx_engine = ONNXOCREngine(model_name, intra_op_threads=self.threads)
+            self.use_onnx_engine = True
+            print("📝 当前使用ONNX Runtime检测 + 识别")
+        except Exception as e:
+            print(f"⚠️ ONNX模型加载失败: {e}")
+            print("🔧 将使用PaddleOCR")
+    
     def _init_paddleocr(self):
         """初始化PaddleOCR"""
         try:
             print("🔍 初始化PaddleOCR...")
+            from paddleocr import PaddleOCR
             # 初始化PaddleOCR，支持中英文识别
             self.paddle_reader = PaddleOCR(
                 use_angle_cls=True,  # 使用方向分类器
                 lang='ch',  # 中文模式
                 show_log=False,  # 关闭日志显示
-                use_gpu=False  # 使用CPU
+                use_gpu=False,  # 使用CPU
+                rec_batch_num=self.batch_size,  # 批量识别的批次大小
+                cpu_threads=self.threads or 10  # CPU推理线程数（默认值与PaddleOCR相同）
             )
             print("✅ PaddleOCR初始化完成")
             self.use_paddleocr = True
@@ -66,6 +98,13 @@ class ONNXOCRTextSeparator:
         os.makedirs(output_dir, exist_ok=True)
         return output_dir
     
+    def prepare_output_directory(self, image_path, output_dir=None):
+        """使用指定的输出目录，未指定时按时间戳创建"""
+        if output_dir is None:
+            return self.create_output_directory(image_path)
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
+    
     def detect_text_opencv(self, image):
         """使用OpenCV检测文字区域"""
         print("🔍 使用OpenCV检测文字区域...")
@@ -105,49 +144,28 @@ class ONNXOCRTextSeparator:
         return bboxes
     
     def _merge_nearby_boxes(self, bboxes, distance_threshold=20):
-        """合并相近的检测框"""
+        """合并相近的检测框
+        
+        中心点距离小于阈值的框属于同一组（传递合并：A近B、B近C时三者合并），
+        用网格近邻搜索 + 并查集分组，框很多时耗时近似线性
+        """
         if not bboxes:
             return bboxes
         
-        merged = []
-        used = set()
+        points = np.array(bboxes)
+        rects = np.concatenate([points[:, 0], points[:, 2]], axis=1)  # x1, y1, x2, y2
+        centers = (rects[:, :2] + rects[:, 2:]) / 2
+        labels = connected_labels(len(bboxes), *neighbor_pairs(centers, distance_threshold))
         
-        for i, bbox1 in enumerate(bboxes):
-            if i in used:
-                continue
-                
-            x1, y1 = bbox1[0]
-            x2, y2 = bbox1[2]
-            
-            # 查找相近的框
-            group = [bbox1]
-            used.add(i)
-            
-            for j, bbox2 in enumerate(bboxes):
-                if j in used:
-                    continue
-                    
-                x3, y3 = bbox2[0]
-                x4, y4 = bbox2[2]
-                
-                # 计算距离
-                center1 = ((x1 + x2) / 2, (y1 + y2) / 2)
-                center2 = ((x3 + x4) / 2, (y3 + y4) / 2)
-                distance = np.sqrt((center1[0] - center2[0])**2 + (center1[1] - center2[1])**2)
-                
-                if distance < distance_threshold:
-                    group.append(bbox2)
-                    used.add(j)
-            
-            # 合并组内的框
-            if len(group) > 1:
-                all_points = np.array([point for bbox in group for point in bbox])
-                min_x, min_y = np.min(all_points, axis=0)
-                max_x, max_y = np.max(all_points, axis=0)
-                merged_bbox = [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]]
-                merged.append(merged_bbox)
+        # 合并组内的框（组按其中第一个框的顺序输出）
+        roots, bounds = group_bounds(rects, labels)
+        sizes = np.bincount(labels, minlength=len(bboxes))[roots]
+        merged = []
+        for root, size, (min_x, min_y, max_x, max_y) in zip(roots, sizes, bounds):
+            if size > 1:
+                merged.append([[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]])
             else:
-                merged.append(group[0])
+                merged.append(bboxes[root])
         
         return merged
     
@@ -206,6 +224,39 @@ class ONNXOCRTextSeparator:
             print(f"⚠️ OCR识别错误: {e}")
             return self._fallback_recognition(image_crop)
     
+    def recognize_text_batch(self, image_crops):
+        """批量识别文字区域（仅识别，不再对每个裁剪区域重复检测）
+        
+        识别器内部按宽高比排序分组，补齐到识别模型输入尺寸后按 batch_size 分批推理
+        """
+        results = [("", 0.0)] * len(image_crops)
+        
+        # 过小的区域直接跳过
+        indices = [i for i, crop in enumerate(image_crops)
+                   if crop.shape[1] >= 20 and crop.shape[0] >= 10]
+        crops = [image_crops[i] for i in indices]
+        if not crops:
+            return results
+        
+        try:
+            if self.use_onnx_engine:
+                recognized = self.onnx_engine.recognize(crops, batch_size=self.batch_size)
+            elif self.use_paddleocr:
+                if self.paddle_reader.use_angle_cls:
+                    crops, _, _ = self.paddle_reader.text_classifier(crops)
+                recognized, _ = self.paddle_reader.text_recognizer(crops)
+            else:
+                recognized = [self._fallback_recognition(crop) for crop in crops]
+        except Exception as e:
+            print(f"⚠️ 批量识别错误: {e}")
+            recognized = [self._fallback_recognition(crop) for crop in crops]
+        
+        for i, (text, confidence) in zip(indices, recognized):
+            text = re.sub(r'\s+', ' ', text.strip())
+            if confidence > 0.3 and text:  # 过滤低置信度结果
+                results[i] = (text, confidence)
+        return results
+    
     def _fallback_recognition(self, image_crop):
         """备用识别方案"""
         height, width = image_crop.shape[:2]
@@ -223,14 +274,29 @@ class ONNXOCRTextSeparator:
         
         # 读取图像
         img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError(f"无法读取图像: {image_path}")
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         
+        if self.use_onnx_engine:
+            print("🔍 使用ONNX Runtime进行文字检测和识别...")
+            results = self.onnx_engine.readtext(img)
+            
+            print(f"\n🎯 检测到 {len(results)} 个文字区域:")
+            valid_results = []
+            for i, (bbox, text, confidence) in enumerate(results):
+                if confidence > 0.3:
+                    print(f"  {i+1}. '{text}' (置信度: {confidence:.2f})")
+                    valid_results.append((bbox, text, confidence, i+1))
         # 直接使用PaddleOCR进行整体检测和识别
-        if hasattr(self, 'use_paddleocr') and self.use_paddleocr:
+        elif hasattr(self, 'use_paddleocr') and self.use_paddleocr:
             print("🔍 使用PaddleOCR进行文字检测和识别...")
             try:
-                # 使用PaddleOCR检测和识别文字
-                results = self.paddle_reader.ocr(image_path, cls=True)
+                # 使用PaddleOCR检测和识别文字（大图分块检测）
+                if self.tiling['enabled'] and needs_tiling(img.shape, self.tiling['tileSize'], PADDLE_DET_LIMIT_SIDE):
+                    results = self._paddle_tiled_ocr(img)
+                else:
+                    results = self.paddle_reader.ocr(image_path, cls=True)
                 
                 # 处理PaddleOCR的结果格式
                 processed_results = []
@@ -260,56 +326,49 @@ class ONNXOCRTextSeparator:
             # 备用方案：使用OpenCV检测
             valid_results = self._fallback_opencv_detection(img)
         
-        # 创建matplotlib图形
-        fig, ax = plt.subplots(1, 1, figsize=(15, 10))
-        ax.imshow(img_rgb)
-        
-        # 颜色列表
-        colors = ['red', 'green', 'blue', 'orange', 'purple', 'brown', 'pink', 'cyan']
-        
-        # 绘制检测框和文字标注
-        for bbox, text, confidence, num in valid_results:
-            color = colors[(num-1) % len(colors)]
-            
-            # 绘制检测框
-            points = np.array(bbox)
-            x_coords = np.append(points[:, 0], points[0, 0])
-            y_coords = np.append(points[:, 1], points[0, 1])
-            ax.plot(x_coords, y_coords, color=color, linewidth=3)
-            
-            # 在检测框中心显示序号
-            center_x = np.mean(points[:, 0])
-            center_y = np.mean(points[:, 1])
-            ax.text(center_x, center_y, str(num), fontsize=18, fontweight='bold',
-                   ha='center', va='center', color='white',
-                   bbox=dict(boxstyle="circle,pad=0.3", facecolor=color, alpha=0.8))
-            
-            # 在检测框旁边显示识别的文字
-            text_x = np.max(points[:, 0]) + 10
-            text_y = np.min(points[:, 1])
-            
-            if text_x + len(text) * 8 > img_rgb.shape[1]:
-                text_x = np.min(points[:, 0]) - len(text) * 8 - 10
-            
-            ax.text(text_x, text_y, f'{num}: {text}', fontsize=11, fontweight='bold',
-                   bbox=dict(boxstyle="round,pad=0.4", facecolor=color, alpha=0.9, edgecolor='black'),
-                   color='white' if color in ['blue', 'purple', 'brown'] else 'black')
-        
-        # 设置标题
-        engine_name = "PaddleOCR" if (hasattr(self, 'use_paddleocr') and self.use_paddleocr) else "OpenCV+备用识别"
-        ax.set_title(f'ONNX Runtime + {engine_name} 识别结果 - 检测到 {len(valid_results)} 个文字', fontsize=16, pad=20)
-        ax.axis('off')
+        # 绘制检测框和文字标注（原图分辨率）
+        engine_name = self.engine_name()
+        title = f'ONNX Runtime + {engine_name} 识别结果 - 检测到 {len(valid_results)} 个文字'
         
         # 在图像左下角添加文字列表
+        legend_lines = None
         if valid_results:
-            text_list = '\n'.join([f'{num}. {text} (置信度: {confidence:.2f})' 
-                                  for _, text, confidence, num in valid_results])
-            ax.text(0.02, 0.02, f'识别结果:\n{text_list}', 
-                   transform=ax.transAxes, fontsize=10,
-                   verticalalignment='bottom',
-                   bbox=dict(boxstyle="round,pad=0.5", facecolor="white", alpha=0.9, edgecolor='gray'))
-        
-        return img, img_rgb, valid_results, fig, ax
+            legend_lines = ['识别结果:'] + [f'{num}. {text} (置信度: {confidence:.2f})'
+                                            for _, text, confidence, num in valid_results]
+        
+        try:
+            visualization = fast_renderer.render_visualization(
+                img,
+                [{'bbox': bbox, 'text': text, 'id': num} for bbox, text, _, num in valid_results],
+                title=title, legend_lines=legend_lines)
+        except Exception as e:
+            # 可视化失败不影响识别结果和其他结果文件，以原图代替
+            print(f"⚠️ 可视化图像生成失败，使用原图代替: {e}")
+            visualization = img.copy()
+        
+        return img, img_rgb, valid_results, visualization
+    
+    def _paddle_tiled_ocr(self, img):
+        """大图分块检测后统一批量识别，返回格式与 PaddleOCR.ocr 相同"""
+        def detect_tiles(tiles):
+            return [self.paddle_reader.ocr(tile, det=True, rec=False, cls=False)[0] or []
+                    for tile in tiles]
+
+        # PaddleOCR的预测器不能在多个线程中同时使用，块逐个检测
+        boxes = detect_tiled(img, detect_tiles, self.tiling['tileSize'], self.tiling['overlap'],
+                             self.tiling['batchSize'], workers=1)
+        print(f"🧩 分块检测到 {len(boxes)} 个文字区域")
+        recognized = self.recognize_text_batch([crop_box(img, box) for box in boxes])
+        return [[(box.tolist(), (text, confidence))
+                 for box, (text, confidence) in zip(boxes, recognized) if text]]
+    
+    def engine_name(self):
+        """当前使用的识别引擎名称"""
+        if self.use_onnx_engine:
+            return f"ONNX模型({self.onnx_engine.model_name})"
+        if self.use_paddleocr:
+            return "PaddleOCR"
+        return "OpenCV+备用识别"
     
     def _fallback_opencv_detection(self, img):
         """备用方案：使用OpenCV检测"""
@@ -318,114 +377,60 @@ class ONNXOCRTextSeparator:
         # 使用OpenCV检测
         bboxes = self.detect_text_opencv(img)
         
-        # 处理结果
+        # 提取所有文字区域
         print(f"\n🎯 检测到 {len(bboxes)} 个文字区域:")
-        valid_results = []
-        
+        candidates = []
         for i, bbox in enumerate(bboxes):
-            # 提取文字区域进行识别
             x1, y1 = bbox[0]
             x2, y2 = bbox[2]
             
-            crop = img[y1:y2, x1:x2]
+            crop = img[int(y1):int(y2), int(x1):int(x2)]
             if crop.size > 0:
-                text, confidence = self.recognize_text_opencv(crop)
-                
-                if confidence > 0.4 and len(text.strip()) > 0:
-                    print(f"  {i+1}. '{text}' (置信度: {confidence:.2f})")
-                    valid_results.append((bbox, text, confidence, i+1))
+                candidates.append((i, bbox, crop))
+        
+        # 批量识别
+        recognized = self.recognize_text_batch([crop for _, _, crop in candidates])
+        
+        valid_results = []
+        for (i, bbox, _), (text, confidence) in zip(candidates, recognized):
+            if confidence > 0.4 and len(text.strip()) > 0:
+                print(f"  {i+1}. '{text}' (置信度: {confidence:.2f})")
+                valid_results.append((bbox, text, confidence, i+1))
         
         return valid_results
     
     def create_text_masks(self, img, valid_results):
-        """创建文字区域掩码"""
+        """创建文字区域掩码：总体掩码为整图，每个文字区域只保存裁剪范围内的局部掩码"""
         print("🎭 创建文字掩码...")
         
-        height, width = img.shape[:2]
-        
-        # 创建总体掩码
-        combined_mask = np.zeros((height, width), dtype=np.uint8)
+        combined_mask, regions = build_text_masks(img.shape, [bbox for bbox, _, _, _ in valid_results])
         
-        # 为每个文字区域创建单独的掩码
         individual_masks = []
-        
-        for bbox, text, confidence, num in valid_results:
-            # 单独掩码
-            single_mask = np.zeros((height, width), dtype=np.uint8)
-            
-            # 转换坐标并扩展区域
-            points = np.array(bbox, dtype=np.int32)
-            
-            # 计算中心点并扩展区域
-            center = np.mean(points, axis=0)
-            expanded_points = []
-            for point in points:
-                direction = point - center
-                expanded_point = center + direction * 1.2  # 扩展20%
-                expanded_points.append(expanded_point)
-            
-            expanded_points = np.array(expanded_points, dtype=np.int32)
-            
-            # 填充掩码
-            cv2.fillPoly(single_mask, [expanded_points], 255)
-            cv2.fillPoly(combined_mask, [expanded_points], 255)
-            
-            individual_masks.append((single_mask, text, num))
-        
-        # 对掩码进行形态学处理
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
-        combined_mask = cv2.dilate(combined_mask, kernel, iterations=1)
+        for (bbox, text, confidence, num), region in zip(valid_results, regions):
+            if region is not None:
+                position, local_mask = region
+                individual_masks.append((local_mask, position, text, num))
         
         return combined_mask, individual_masks
     
     def separate_text_regions(self, img, individual_masks):
-        """分离每个文字区域"""
+        """分离每个文字区域（直接从原图的裁剪范围中提取）"""
         print("✂️ 分离文字区域...")
         
         text_regions = []
         
-        for mask, text, num in individual_masks:
-            # 提取文字区域
-            text_region = cv2.bitwise_and(img, img, mask=mask)
-            
-            # 找到文字区域的边界框
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                x, y, w, h = cv2.boundingRect(contours[0])
-                # 添加一些边距
-                margin = 10
-                x = max(0, x - margin)
-                y = max(0, y - margin)
-                w = min(img.shape[1] - x, w + 2 * margin)
-                h = min(img.shape[0] - y, h + 2 * margin)
-                
-                # 裁剪文字区域
-                cropped_text = text_region[y:y+h, x:x+w]
-                text_regions.append((cropped_text, text, num, (x, y, w, h)))
+        for mask, position, text, num in individual_masks:
+            cropped_text = crop_region(img, position, mask)
+            text_regions.append((cropped_text, text, num, position))
         
         return text_regions
     
-    def inpaint_image(self, img, combined_mask):
-        """使用多种方法修复图像"""
-        print("🎨 修复图像...")
-        
-        # 方法1: Navier-Stokes
-        inpainted_ns = cv2.inpaint(img, combined_mask, 7, cv2.INPAINT_NS)
-        
-        # 方法2: Telea
-        inpainted_telea = cv2.inpaint(img, combined_mask, 7, cv2.INPAINT_TELEA)
-        
-        # 方法3: 混合方法
-        inpainted_mixed = cv2.addWeighted(inpainted_ns, 0.6, inpainted_telea, 0.4, 0)
-        
-        return {
-            'ns': inpainted_ns,
-            'telea': inpainted_telea,
-            'mixed': inpainted_mixed
-        }
+    def inpaint_image(self, img, combined_mask, methods=INPAINT_METHODS):
+        """修复图像：只在文字区域周围的小块上计算，且只计算请求的方法 (ns / telea / mixed)"""
+        print(f"🎨 修复图像 ({', '.join(methods)})...")
+        return inpaint_regions(img, combined_mask, methods)
     
-    def save_results(self, output_dir, image_path, img_rgb, valid_results, fig, 
+    def save_results(self, output_dir, image_path, img_rgb, valid_results, visualization, 
                     combined_mask, text_regions, inpainted_results):
         """保存所有结果到指定目录"""
         print(f"💾 保存结果到: {output_dir}")
@@ -433,8 +438,7 @@ class ONNXOCRTextSeparator:
         base_name = os.path.splitext(os.path.basename(image_path))[0]
         
         # 1. 保存可视化结果
-        fig.savefig(os.path.join(output_dir, f"{base_name}_onnx_visualization.png"), 
-                   dpi=300, bbox_inches='tight')
+        cv2.imwrite(os.path.join(output_dir, f"{base_name}_onnx_visualization.png"), visualization)
         
         # 2. 保存原图
         cv2.imwrite(os.path.join(output_dir, f"{base_name}_original.jpg"), 
@@ -484,7 +488,7 @@ class ONNXOCRTextSeparator:
                 f.write(f"原图像: {image_path}\n")
                 f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(f"检测到的文字数量: {len(valid_results)}\n")
-                f.write(f"OCR引擎: ONNX Runtime Framework + PaddleOCR\n\n")
+                f.write(f"OCR引擎: ONNX Runtime Framework + {self.engine_name()}\n\n")
                 
                 f.write("文字识别详情:\n")
                 f.write("-" * 30 + "\n")
@@ -510,50 +514,34 @@ class ONNXOCRTextSeparator:
         return output_dir
     
     def create_summary_image(self, output_dir, base_name, original, mask, repaired, text_count):
-        """创建结果概览图"""
-        fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-        
-        # 原图
-        axes[0,0].imshow(original)
-        axes[0,0].set_title('原始图像', fontsize=14)
-        axes[0,0].axis('off')
-        
-        # 掩码
-        axes[0,1].imshow(mask, cmap='gray')
-        axes[0,1].set_title(f'文字掩码 ({text_count}个文字)', fontsize=14)
-        axes[0,1].axis('off')
-        
-        # 修复结果
-        axes[1,0].imshow(cv2.cvtColor(repaired, cv2.COLOR_BGR2RGB))
-        axes[1,0].set_title('修复后图像', fontsize=14)
-        axes[1,0].axis('off')
-        
-        # 对比
-        comparison = np.hstack([original, cv2.cvtColor(repaired, cv2.COLOR_BGR2RGB)])
-        axes[1,1].imshow(comparison)
-        axes[1,1].set_title('修复前后对比', fontsize=14)
-        axes[1,1].axis('off')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, f"{base_name}_summary.png"), 
-                   dpi=300, bbox_inches='tight')
-        plt.close()
+        """创建结果概览图（original为RGB图像，repaired为BGR图像）"""
+        summary = fast_renderer.render_summary(cv2.cvtColor(original, cv2.COLOR_RGB2BGR),
+                                               mask, repaired, text_count)
+        cv2.imwrite(os.path.join(output_dir, f"{base_name}_summary.png"), summary)
+    
+    @staticmethod
+    def is_processed(output_dir, image_path):
+        """输出目录中已有最后生成的概览图（或未检测到文字的标记图）时视为已处理"""
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        return (os.path.exists(os.path.join(output_dir, f"{base_name}_summary.png")) or
+                os.path.exists(os.path.join(output_dir, "no_text_detected.png")))
     
-    def process_image(self, image_path):
-        """完整的图像处理流程"""
+    def process_image(self, image_path, output_dir=None):
+        """完整的图像处理流程
+        
+        output_dir: 结果保存目录，默认在当前目录下按时间戳创建
+        """
         print("🚀 开始完整的图像处理流程（使用ONNX Runtime框架）")
         print("=" * 60)
         
         try:
             # 1. 检测和可视化文字
-            img, img_rgb, valid_results, fig, ax = self.detect_and_visualize_text(image_path)
+            img, img_rgb, valid_results, visualization = self.detect_and_visualize_text(image_path)
             
             if not valid_results:
                 print("⚠️ 未检测到任何文字，仅保存可视化结果")
-                output_dir = self.create_output_directory(image_path)
-                fig.savefig(os.path.join(output_dir, "no_text_detected.png"), dpi=300, bbox_inches='tight')
-                plt.show()
-                plt.close()
+                output_dir = self.prepare_output_directory(image_path, output_dir)
+                cv2.imwrite(os.path.join(output_dir, "no_text_detected.png"), visualization)
                 return output_dir
             
             # 2. 创建文字掩码
@@ -566,15 +554,11 @@ class ONNXOCRTextSeparator:
             inpainted_results = self.inpaint_image(img, combined_mask)
             
             # 5. 创建输出目录并保存所有结果
-            output_dir = self.create_output_directory(image_path)
-            self.save_results(output_dir, image_path, img_rgb, valid_results, fig,
+            output_dir = self.prepare_output_directory(image_path, output_dir)
+            self.save_results(output_dir, image_path, img_rgb, valid_results, visualization,
                             combined_mask, text_regions, inpainted_results)
             
-            # 6. 显示可视化结果
-            plt.show()
-            plt.close()
-            
-            # 7. 打印处理结果摘要
+            # 6. 打印处理结果摘要
             self.print_summary(output_dir, valid_results, text_regions)
             
             return output_dir
@@ -592,7 +576,7 @@ class ONNXOCRTextSeparator:
         print(f"📁 输出目录: {output_dir}")
         print(f"🔢 检测到的文字数量: {len(valid_results)}")
         print(f"✂️ 分离的文字区域: {len(text_regions)}")
-        print(f"🔧 OCR引擎: ONNX Runtime Framework + PaddleOCR")
+        print(f"🔧 OCR引擎: ONNX Runtime Framework + {self.engine_name()}")
         
         print(f"\n📂 生成的文件夹:")
         print(f"   📝 separated_texts/ - 分离出的文字图片")
@@ -605,48 +589,123 @@ class ONNXOCRTextSeparator:
         print(f"   📋 *_summary.png - 结果概览")
         print(f"   📝 *_text_info.txt - 文字识别信息")
         
-        all_texts = [text for _, text, _, _ in valid_results]
-        print(f"\n📝 识别的完整文字: {' '.join(all_texts)}")
+        # 按阅读顺序输出：同一行的文字以空格分隔，行之间换行
+        layout = analyze_layout([{'bbox': bbox, 'text': text, 'confidence': confidence, 'id': num}
+                                 for bbox, text, confidence, num in valid_results])
+        print(f"\n📝 识别的完整文字 ({len(layout['lines'])} 行, {len(layout['blocks'])} 段):")
+        print(layout_text(layout))
+
+
+# 进程池中每个worker只加载一次模型
+_worker_processor = None
+
+
+def _init_worker(engine, model_name, threads):
+    """进程池worker初始化：加载模型（日志不输出，避免多个进程交错打印）"""
+    global _worker_processor
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_processor = ONNXOCRTextSeparator(engine=engine, model_name=model_name, threads=threads)
+
+
+def _process_task(task):
+    """在worker中处理一张图片，返回 (图片路径, 输出目录或None, 耗时, 失败时的日志)"""
+    image_path, output_dir = task
+    start = time.time()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = _worker_processor.process_image(image_path, output_dir)
+    return image_path, result, time.time() - start, None if result else log.getvalue()
+
+
+def collect_images(inputs, output_root):
+    """遍历输入的图片文件和目录，返回 [(图片路径, 输出目录), ...]，输出目录保持输入的目录结构"""
+    tasks = []
+    for path in inputs:
+        if os.path.isdir(path):
+            # 多个输入目录时以目录名区分，避免同名文件的结果互相覆盖
+            prefix = os.path.basename(os.path.normpath(path)) if len(inputs) > 1 else ''
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_image_name(name):
+                        image_path = os.path.join(root, name)
+                        relative = os.path.splitext(os.path.relpath(image_path, path))[0]
+                        tasks.append((image_path, os.path.join(output_root, prefix, relative)))
+        elif os.path.isfile(path):
+            tasks.append((path, os.path.join(output_root, os.path.splitext(os.path.basename(path))[0])))
+        else:
+            print(f"⚠️ 跳过不存在的路径: {path}")
+    # 只有扩展名不同的图片（如 a.png 和 a.jpg）输出目录名加上扩展名，避免结果互相覆盖
+    counts = Counter(output_dir for _, output_dir in tasks)
+    return [(image_path, f"{output_dir}_{os.path.splitext(image_path)[1].lstrip('.').lower()}"
+             if counts[output_dir] > 1 else output_dir)
+            for image_path, output_dir in tasks]
 
 
 def main():
-    """主函数"""
+    """主函数，有图片处理失败时返回1"""
+    parser = argparse.ArgumentParser(description='ONNX Runtime 中文文字分离系统 - 批量处理图片和目录')
+    parser.add_argument('inputs', nargs='+', help='图片文件或目录（递归处理目录中的图片）')
+    parser.add_argument('-o', '--output', default='onnx_ocr_results', help='结果根目录')
+    parser.add_argument('--engine', choices=['paddle', 'onnx'], default=os.environ.get('OCR_ENGINE', 'paddle'))
+    parser.add_argument('--model', default=os.environ.get('OCR_MODEL'), help='models/model-config.json 中的模型名称')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--threads', type=int, default=None, help='每个进程的推理线程数，默认为 CPU核数/进程数')
+    parser.add_argument('--no-resume', action='store_true', help='重新处理已有结果的图片')
+    args = parser.parse_args()
+    
     print("🎯 ONNX Runtime 中文文字分离系统")
     print("=" * 60)
-    print("功能:")
-    print("  🔍 中文文字识别和可视化（ONNX Runtime + PaddleOCR）")
-    print("  ✂️ 文字区域分离")
-    print("  🎨 图像修复")
-    print("  💾 结果保存")
-    print("  🚀 高性能推理引擎")
-    print("  🌐 可扩展到Web部署")
-    print("=" * 60)
-    
-    # 创建处理器
-    processor = ONNXOCRTextSeparator()
-    
-    # 图像路径
-    image_path = r"C:\python_learning\OmniParser-master\mmexport1750941479409.png"
+    try:
+        fast_renderer.check_chinese_font()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
     
-    # 检查文件是否存在
-    if not os.path.exists(image_path):
-        print(f"❌ 图片文件不存在: {image_path}")
-        print("请修改 image_path 变量为正确的图片路径")
+    tasks = collect_images(args.inputs, args.output)
+    total = len(tasks)
+    if not args.no_resume:
+        tasks = [task for task in tasks if not ONNXOCRTextSeparator.is_processed(task[1], task[0])]
+    skipped = total - len(tasks)
+    print(f"📂 共 {total} 张图片，跳过已处理 {skipped} 张，待处理 {len(tasks)} 张")
+    if not tasks:
         return
     
-    # 处理图像
-    output_dir = processor.process_image(image_path)
+    workers = max(1, min(args.workers, len(tasks)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    # 限制数学库线程数（子进程继承），使 进程数 x 线程数 不超过CPU核数
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    print(f"⚙️ {workers} 个进程 x {threads} 个线程, 引擎: {args.engine}")
     
-    if output_dir:
-        print(f"\n🎉 处理完成! 所有结果已保存到: {output_dir}")
-        print(f"\n💡 ONNX Runtime优势:")
-        print(f"   ⚡ 高性能推理引擎")
-        print(f"   🔧 支持多种硬件加速（CPU、GPU、Web）")
-        print(f"   🌐 跨平台部署（Windows、Linux、Web、移动端）")
-        print(f"   📦 模型格式标准化")
-        print(f"   🚀 可扩展为完整ONNX模型")
+    start = time.time()
+    failed = 0
+    if workers == 1:
+        # 单进程：直接在当前进程处理，保留完整日志
+        processor = ONNXOCRTextSeparator(engine=args.engine, model_name=args.model, threads=threads)
+        for i, (image_path, output_dir) in enumerate(tasks, 1):
+            if processor.process_image(image_path, output_dir):
+                print(f"[{i}/{len(tasks)}] ✅ {image_path} -> {output_dir}")
+            else:
+                failed += 1
+                print(f"[{i}/{len(tasks)}] ❌ {image_path}")
     else:
-        print("\n❌ 处理失败!")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(args.engine, args.model, threads)) as executor:
+            futures = [executor.submit(_process_task, task) for task in tasks]
+            for i, future in enumerate(as_completed(futures), 1):
+                image_path, output_dir, elapsed, log = future.result()
+                if output_dir:
+                    print(f"[{i}/{len(tasks)}] ✅ {image_path} -> {output_dir} ({elapsed:.2f}s)")
+                else:
+                    failed += 1
+                    print(f"[{i}/{len(tasks)}] ❌ {image_path}\n{log}")
+    
+    elapsed = time.time() - start
+    print(f"\n🎉 处理完成: 成功 {len(tasks) - failed} 张, 失败 {failed} 张, 用时 {elapsed:.1f}s, "
+          f"{len(tasks) / elapsed:.2f} 张/秒")
+    print(f"📁 结果目录: {os.path.abspath(args.output)}")
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+结果文件索引 - 结果目录名（任务）→ 文件名 → 绝对路径、大小、修改时间、ETag
+结果文件生成时登记，/api/file 请求直接查索引发送文件，不再逐个尝试候选路径；
+ETag由修改时间和大小得出，不读取文件内容。
+"""
+import os
+import threading
+
+
+def make_etag(stat):
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def write_atomic(path, data):
+    """先写入同目录下的临时文件再改名，其他进程不会读到（并登记、缓存）写了一半的文件"""
+    temp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ArtifactIndex:
+    """root（结果目录）下所有已生成文件的索引（线程安全）"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._jobs = {}  # 结果目录名 -> {目录内相对路径: 文件信息}
+        self._lock = threading.Lock()
+
+    def split(self, path):
+        """文件路径 -> (结果目录名, 目录内相对路径)，不在root下的路径返回None"""
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        parts = rel.replace(os.sep, '/').split('/')
+        if len(parts) < 2 or parts[0] in ('', '.', '..'):
+            return None
+        return parts[0], '/'.join(parts[1:])
+
+    def register(self, path):
+        """登记一个文件，返回文件信息；文件不存在时返回None"""
+        key = self.split(path)
+        if key is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = {
+            'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'etag': make_etag(stat)
+        }
+        with self._lock:
+            self._jobs.setdefault(key[0], {})[key[1]] = entry
+        return entry
+
+    def register_files(self, paths):
+        """登记一组文件（跳过尚未生成的）"""
+        for path in paths:
+            self.register(path)
+
+    def lookup(self, path):
+        """按路径查询已登记的文件信息（不访问文件系统）"""
+        key = self.split(path)
+        if key is None:
+            return None
+        with self._lock:
+            return self._jobs.get(key[0], {}).get(key[1])
+
+    def discard(self, path):
+        """移除一个文件的登记（文件已被删除时）"""
+        key = self.split(path)
+        if key is not None:
+            with self._lock:
+                self._jobs.get(key[0], {}).pop(key[1], None)
+
+    def remove_job(self, output_dir):
+        """移除整个结果目录的登记（结果目录被清理时）"""
+        key = self.split(os.path.join(output_dir, '_'))
+        if key is not None:
+            with self._lock:
+                self._jobs.pop(key[0], None)
+
+    def stats(self):
+        with self._lock:
+            return {'jobs': len(self._jobs), 'files': sum(len(files) for files in self._jobs.values())}
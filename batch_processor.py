@@ -0,0 +1,126 @@
+"""
+批量OCR - 从多个图片文件、目录或zip压缩包读取图片，按块批量检测和识别，
+每张图片的结果以NDJSON（每行一个JSON对象）逐行输出，最后一行为汇总信息。
+
+命令行:
+    python batch_processor.py screenshots/ archive.zip a.png --outputs text -o results.ndjson
+Web接口:
+    POST /api/batch   (images: 多个图片文件, archive: zip压缩包)
+"""
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import contextlib
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+
+def is_image_name(name):
+    """按扩展名判断是否为图片文件（忽略macOS压缩包中的元数据文件）"""
+    if '__MACOSX/' in name or os.path.basename(name).startswith('._'):
+        return False
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_zip_images(fileobj):
+    """逐个读取zip压缩包中的图片，产出 (压缩包内路径, 图片数据)"""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        print(f"⚠️ 无法读取压缩包: {e}")
+        return
+    with archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_image_name(info.filename):
+                yield info.filename, archive.read(info)
+
+
+def iter_path_images(paths):
+    """逐个读取图片文件、目录（递归）和zip压缩包中的图片，产出 (路径, 图片数据)"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_image_name(name):
+                        file_path = os.path.join(root, name)
+                        with open(file_path, 'rb') as f:
+                            yield file_path, f.read()
+        elif zipfile.is_zipfile(path):
+            for name, data in iter_zip_images(path):
+                yield f"{path}/{name}", data
+        elif os.path.isfile(path):
+            with open(path, 'rb') as f:
+                yield path, f.read()
+        else:
+            print(f"⚠️ 跳过不存在的路径: {path}")
+
+
+def chunked(items, size):
+    """将可迭代对象按固定大小分块，不需要一次读入全部元素"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_ndjson(record):
+    return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+
+def batch_summary(total, succeeded, elapsed):
+    """批量处理汇总信息（NDJSON最后一行）"""
+    return {
+        'summary': True,
+        'total': total,
+        'succeeded': succeeded,
+        'failed': total - succeeded,
+        'elapsed': round(elapsed, 3),
+        'images_per_second': round(total / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量OCR：处理多个图片/目录/zip压缩包，结果输出为NDJSON')
+    parser.add_argument('inputs', nargs='+', help='图片文件、目录或zip压缩包')
+    parser.add_argument('--outputs', default='all',
+                        help='立即生成的结果文件类型（逗号分隔），text表示只输出识别文字')
+    parser.add_argument('--chunk-size', type=int, default=None, help='每次一起推理的图片数量')
+    parser.add_argument('-o', '--output', help='NDJSON输出文件，默认输出到标准输出')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.time()
+    total = succeeded = 0
+    # 处理日志输出到stderr，标准输出只保留NDJSON
+    with contextlib.redirect_stdout(sys.stderr):
+        # OCR模型在第一次识别时加载
+        from main_server import BATCH_CHUNK_SIZE, parse_outputs, run_batch_ocr
+        try:
+            for result in run_batch_ocr(iter_path_images(args.inputs), parse_outputs(args.outputs),
+                                        args.chunk_size or BATCH_CHUNK_SIZE):
+                total += 1
+                succeeded += bool(result['success'])
+                out.write(to_ndjson(result))
+                out.flush()
+                if total % 50 == 0:
+                    print(f"📊 已处理 {total} 张, {total / (time.time() - start):.2f} 张/秒")
+            summary = batch_summary(total, succeeded, time.time() - start)
+            out.write(to_ndjson(summary))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        print(f"✅ 批量处理完成: {summary['succeeded']}/{summary['total']} 成功, "
+              f"{summary['images_per_second']} 张/秒")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+OCR处理流程基准测试 - 在合成图像上测量各处理流程和阶段方法的耗时，结果写入JSON并可与基线对比
+
+合成图像按 分辨率 x 文字区域数量 的网格生成（固定随机种子，结果可复现）；
+默认使用桩识别器（按已知的文字位置返回检测结果），不需要模型文件和网络，可在纯CPU的Linux上离线运行。
+
+    python benchmarks/bench_pipeline.py                                  # 默认网格，结果输出到 bench_results.json
+    python benchmarks/bench_pipeline.py --quick                          # 小网格，快速检查
+    python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json   # 与基线对比，有退化时退出码为1
+    python benchmarks/bench_pipeline.py --engine onnx                    # 使用真实的ONNX模型
+
+测试项:
+    web.process_image            main_server.WebOCRProcessor.process_image 完整流程（识别 + 结果文件）
+    separator.detect_text_opencv OCR_Paddle.ONNXOCRTextSeparator 的MSER检测 + 合并相近框
+    separator.create_text_masks  文字掩码
+    separator.separate_text_regions  分离文字区域
+    separator.inpaint_image      图像修复（ns / telea / mixed）
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_RESOLUTIONS = ['640x480', '1280x720', '1920x1080', '3328x1978']
+DEFAULT_REGIONS = [10, 50, 200]
+QUICK_RESOLUTIONS = ['640x480', '1280x720']
+QUICK_REGIONS = [10, 50]
+TARGETS = ('web.process_image', 'separator.detect_text_opencv', 'separator.create_text_masks',
+           'separator.separate_text_regions', 'separator.inpaint_image')
+# 与基线相比，中位数耗时增加超过该比例且超过绝对噪声下限时视为退化
+DEFAULT_THRESHOLD = 0.2
+NOISE_FLOOR = 0.005  # 秒
+WORDS = ['OCR', 'Hello', 'ONNX', 'Runtime', 'text', 'benchmark', '2024', 'image', 'paddle', 'layout']
+
+
+# ----------------------------------------------------------------------
+# 合成数据
+# ----------------------------------------------------------------------
+def synthetic_image(width, height, regions, seed=0):
+    """生成带有 regions 个文字行的图像，返回 (BGR图像, [(四点框, 文字), ...])"""
+    rng = random.Random(seed)
+    img = np.full((height, width, 3), 235, dtype=np.uint8)
+    # 低幅度噪声背景，避免修复和MSER在纯色背景上过于理想
+    noise = np.random.default_rng(seed).integers(0, 20, (height, width, 1), dtype=np.uint8)
+    img -= noise
+
+    boxes = []
+    for _ in range(regions):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        scale = rng.uniform(0.4, 1.2) * max(1.0, width / 1280)
+        (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+        if text_w >= width or text_h + baseline >= height:
+            continue
+        x = rng.randint(0, width - text_w - 1)
+        y = rng.randint(text_h, height - baseline - 1)
+        color = tuple(rng.randint(0, 90) for _ in range(3))
+        cv2.putText(img, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, color, 2, cv2.LINE_AA)
+        x0, y0, x1, y1 = x, y - text_h, x + text_w, y + baseline
+        boxes.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text))
+    return img, boxes
+
+
+class StubReader:
+    """桩识别器：接口与 easyocr.Reader 的 detect / recognize / readtext 相同，
+    按当前合成图像的已知文字位置返回结果，不做推理"""
+
+    def __init__(self, *args, **kwargs):
+        self.boxes = []
+
+    def _boxes_in(self, x_min, y_min, x_max, y_max):
+        """已知文字框落在区域 (x_min, y_min, x_max, y_max) 内的部分，[x0, x1, y0, y1] 格式的区域内坐标"""
+        horizontal_list = []
+        for bbox, _ in self.boxes:
+            x0, y0 = max(0, bbox[0][0] - x_min), max(0, bbox[0][1] - y_min)
+            x1 = min(x_max - x_min - 1, bbox[2][0] - x_min)
+            y1 = min(y_max - y_min - 1, bbox[2][1] - y_min)
+            if x1 - x0 > 3 and y1 - y0 > 3:
+                horizontal_list.append([x0, x1, y0, y1])
+        return horizontal_list
+
+    def detect(self, img, **kwargs):
+        """img 为单张图像或补边后堆叠的 (N, H, W, 3) 批次，每张图像返回一组结果"""
+        images = img if img.ndim == 4 else [img]
+        return ([self._boxes_in(0, 0, image.shape[1], image.shape[0]) for image in images],
+                [[] for _ in images])
+
+    def detect_tiled(self, img, detect_batch, tile_size, overlap, batch_size=4, workers=2):
+        """代替 main_server 中的 detect_tiled：各块的检测结果由块的位置显式计算（不调用 detect_batch），
+        接缝处的重复框和截断框仍由 merge_tile_boxes 合并"""
+        from tiled_detection import make_tiles, merge_tile_boxes
+        height, width = img.shape[:2]
+        boxes, sources = [], []
+        for tile in make_tiles(height, width, tile_size, overlap):
+            for x0, x1, y0, y1 in self._boxes_in(*tile):
+                x0, x1, y0, y1 = x0 + tile[0], x1 + tile[0], y0 + tile[1], y1 + tile[1]
+                boxes.append(np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float32))
+                sources.append(tile)
+        return merge_tile_boxes(boxes, sources, (height, width))
+
+    def recognize(self, img, horizontal_list=None, free_list=None, **kwargs):
+        """按框的位置返回已知文字；框不对应已知文字（如拼接后的识别图）时返回 'text'"""
+        texts = {(bbox[0][0], bbox[0][1]): text for bbox, text in self.boxes}
+        results = []
+        for x0, x1, y0, y1 in horizontal_list or []:
+            bbox = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+            results.append((bbox, texts.get((x0, y0), 'text'), 0.95))
+        return results
+
+    def readtext(self, img, **kwargs):
+        horizontal_list, free_list = self.detect(img)
+        return self.recognize(img, horizontal_list[0], free_list[0])
+
+
+# ----------------------------------------------------------------------
+# 测量
+# ----------------------------------------------------------------------
+def reset_peak_rss():
+    """重置进程的峰值内存（Linux的 /proc/self/clear_refs），不支持时返回False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * q / 100
+    low, high = int(index), min(int(index) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def measure(fn, repeats, warmup):
+    """运行 fn 多次，返回耗时统计、吞吐量、峰值内存和各阶段平均耗时"""
+    import metrics
+
+    for _ in range(warmup):
+        fn()
+    peak_reset = reset_peak_rss()
+    latencies, stages = [], {}
+    start = time.perf_counter()
+    for _ in range(repeats):
+        with metrics.request_timer() as timer:
+            fn()
+        latencies.append(time.perf_counter() - timer.started)
+        for stage, elapsed in timer.timings.items():
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+    elapsed = time.perf_counter() - start
+
+    return {
+        'repeats': repeats,
+        'latency': {
+            'mean': statistics.mean(latencies),
+            'min': min(latencies),
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies),
+        },
+        'throughput': repeats / elapsed if elapsed > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_rss_scope': 'case' if peak_reset else 'process',
+        'stages': {stage: total / repeats for stage, total in sorted(stages.items())},
+    }
+
+
+# ----------------------------------------------------------------------
+# 测试对象
+# ----------------------------------------------------------------------
+def load_web_processor(engine, outputs):
+    """导入 main_server 并返回 (处理器, 桩识别器或None)；stub模式下以桩识别器代替easyocr"""
+    stub = None
+    if engine == 'stub':
+        import types
+        stub = StubReader()
+        sys.modules['easyocr'] = types.SimpleNamespace(Reader=lambda *args, **kwargs: stub)
+        os.environ['OCR_ENGINE'] = 'easyocr'
+    else:
+        os.environ['OCR_ENGINE'] = engine
+    os.environ.pop('OCR_SIDECAR_SOCKET', None)
+    import main_server
+    if stub is not None:
+        main_server.detect_tiled = stub.detect_tiled
+    return main_server.get_ocr_processor(), stub
+
+
+def load_separator():
+    """只测试不依赖识别引擎的阶段方法，跳过模型加载"""
+    from OCR_Paddle import ONNXOCRTextSeparator
+    return ONNXOCRTextSeparator.__new__(ONNXOCRTextSeparator)
+
+
+def build_cases(targets, engine, outputs):
+    """返回 {测试项: 接收 (图像, 文字框) 并返回待测函数的工厂}"""
+    factories = {}
+    if 'web.process_image' in targets:
+        processor, stub = load_web_processor(engine, outputs)
+
+        def web_case(img, boxes):
+            if stub is not None:
+                stub.boxes = boxes
+            return lambda: processor.process_image(img, 'bench.png', outputs)
+        factories['web.process_image'] = web_case
+
+    if any(target.startswith('separator.') for target in targets):
+        separator = load_separator()
+
+        def separator_inputs(img, boxes):
+            valid_results = [(bbox, text, 0.95, i + 1) for i, (bbox, text) in enumerate(boxes)]
+            combined_mask, individual_masks = separator.create_text_masks(img, valid_results)
+            return valid_results, combined_mask, individual_masks
+
+        def detect_case(img, boxes):
+            return lambda: separator.detect_text_opencv(img)
+
+        def masks_case(img, boxes):
+            valid_results = separator_inputs(img, boxes)[0]
+            return lambda: separator.create_text_masks(img, valid_results)
+
+        def regions_case(img, boxes):
+            individual_masks = separator_inputs(img, boxes)[2]
+            return lambda: separator.separate_text_regions(img, individual_masks)
+
+        def inpaint_case(img, boxes):
+            combined_mask = separator_inputs(img, boxes)[1]
+            return lambda: separator.inpaint_image(img, combined_mask)
+
+        factories.update({
+            'separator.detect_text_opencv': detect_case,
+            'separator.create_text_masks': masks_case,
+            'separator.separate_text_regions': regions_case,
+            'separator.inpaint_image': inpaint_case,
+        })
+    return {target: factories[target] for target in targets}
+
+
+def run_benchmarks(args):
+    resolutions = args.resolutions or (QUICK_RESOLUTIONS if args.quick else DEFAULT_RESOLUTIONS)
+    region_counts = args.regions or (QUICK_REGIONS if args.quick else DEFAULT_REGIONS)
+    targets = args.targets or list(TARGETS)
+    outputs = None if args.outputs == 'all' else [k for k in args.outputs.split(',') if k]
+
+    # 结果文件写入临时目录，不污染项目的 results/
+    workdir = tempfile.mkdtemp(prefix='ocr_bench_')
+    os.chdir(workdir)
+    factories = build_cases(targets, args.engine, outputs)
+
+    cases = []
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        for regions in region_counts:
+            img, boxes = synthetic_image(width, height, regions, seed=args.seed)
+            for target in targets:
+                name = f"{target}/{width}x{height}/r{regions}"
+                print(f"⏱️ {name} ...", file=sys.stderr)
+                result = measure(factories[target](img, boxes), args.repeats, args.warmup)
+                result.update({'name': name, 'target': target, 'width': width, 'height': height,
+                               'regions': len(boxes)})
+                cases.append(result)
+                print(f"   p50 {result['latency']['p50'] * 1000:.1f}ms  "
+                      f"p95 {result['latency']['p95'] * 1000:.1f}ms  "
+                      f"{result['throughput']:.2f}/s  峰值内存 {result['peak_rss_mb']}MB", file=sys.stderr)
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'engine': args.engine,
+            'outputs': args.outputs,
+            'repeats': args.repeats,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'workdir': workdir,
+        },
+        'cases': cases,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, metric='p50'):
+    """与基线对比同名测试项，返回 (对比结果列表, 退化项列表)"""
+    baseline_cases = {case['name']: case for case in baseline.get('cases', [])}
+    rows, regressions = [], []
+    for case in current['cases']:
+        base = baseline_cases.get(case['name'])
+        if base is None:
+            continue
+        now, before = case['latency'][metric], base['latency'][metric]
+        ratio = now / before if before > 0 else float('inf')
+        row = {'name': case['name'], 'baseline': before, 'current': now, 'ratio': ratio,
+               'regression': now > before * (1 + threshold) and now - before > NOISE_FLOOR}
+        rows.append(row)
+        if row['regression']:
+            regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(rows, metric):
+    print(f"\n📊 与基线对比 ({metric}):", file=sys.stderr)
+    for row in rows:
+        flag = '❌ 退化' if row['regression'] else ('✅ 提升' if row['ratio'] < 1 else '  ')
+        print(f"  {row['name']:<55} {row['baseline'] * 1000:9.1f}ms -> {row['current'] * 1000:9.1f}ms "
+              f"({row['ratio']:.2f}x) {flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR处理流程基准测试')
+    parser.add_argument('--engine', default='stub', choices=['stub', 'onnx', 'easyocr'],
+                        help='web.process_image 使用的识别引擎，stub为不推理的桩识别器')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, help='测试项，默认全部')
+    parser.add_argument('--resolutions', nargs='+', help='图像尺寸，如 1280x720')
+    parser.add_argument('--regions', nargs='+', type=int, help='每张图像的文字区域数量')
+    parser.add_argument('--quick', action='store_true', help='使用小网格快速检查')
+    parser.add_argument('--outputs', default='all', help='process_image 立即生成的结果文件类型（逗号分隔）')
+    parser.add_argument('--repeats', type=int, default=5, help='每个测试项的计时次数')
+    parser.add_argument('--warmup', type=int, default=1, help='计时前的预热次数')
+    parser.add_argument('--seed', type=int, default=0, help='合成图像的随机种子')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='结果JSON文件')
+    parser.add_argument('--baseline', help='对比的基线JSON文件')
+    parser.add_argument('--save-baseline', help='将本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='判定退化的耗时增加比例')
+    parser.add_argument('--metric', default='p50', choices=['mean', 'p50', 'p90', 'p95', 'p99'],
+                        help='与基线对比的耗时指标')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    results = run_benchmarks(args)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存: {output}", file=sys.stderr)
+
+    if save_baseline:
+        with open(save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 基线已保存: {save_baseline}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold, args.metric)
+        print_comparison(rows, args.metric)
+        if regressions:
+            print(f"❌ {len(regressions)} 项性能退化（超过 {args.threshold:.0%}）", file=sys.stderr)
+            return 1
+        print("✅ 没有性能退化", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
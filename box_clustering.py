@@ -0,0 +1,95 @@
+"""
+文本框聚类 - 基于网格的近邻搜索 + 并查集（连通分量）分组
+每个点只与所在网格及相邻网格中的点比较，框的数量很多时耗时近似线性；
+分组是传递的：A近B、B近C时，A、B、C属于同一组。
+"""
+import numpy as np
+
+# 只需检查一半的相邻网格，另一半由对称的点对覆盖
+_HALF_NEIGHBORS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def neighbor_pairs(points, radius):
+    """返回距离小于radius的所有点对 (i, j)，i < j
+
+    points: (n, 2) 坐标数组；网格边长为radius，近邻只可能在相邻的网格中
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    empty = np.empty(0, dtype=np.int64)
+    if n < 2 or radius <= 0:
+        return empty, empty
+
+    cells = np.floor(points / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    span = cells[:, 1].max() + 2
+
+    def cell_key(cx, cy):
+        return cx * span + cy
+
+    keys = cell_key(cells[:, 0], cells[:, 1])
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs_i, pairs_j = [], []
+    for dx, dy in _HALF_NEIGHBORS:
+        target = cell_key(cells[:, 0] + dx, cells[:, 1] + dy)
+        lo = np.searchsorted(sorted_keys, target, side='left')
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        counts = hi - lo
+        total = counts.sum()
+        if total == 0:
+            continue
+        # 展开每个点在目标网格中的所有候选点
+        i = np.repeat(np.arange(n), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        j = order[starts + np.arange(total)]
+        keep = np.sum((points[i] - points[j]) ** 2, axis=1) < radius * radius
+        if (dx, dy) == (0, 0):
+            keep &= i < j
+        pairs_i.append(i[keep])
+        pairs_j.append(j[keep])
+
+    if not pairs_i:
+        return empty, empty
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def connected_labels(n, pairs_i, pairs_j):
+    """并查集分组：返回每个元素所在组的标签（组内最小的下标）
+
+    用向量化的最小标签传播 + 路径压缩（pointer jumping）实现，不在Python中逐对合并
+    """
+    labels = np.arange(n)
+    pairs_i = np.asarray(pairs_i, dtype=np.int64)
+    pairs_j = np.asarray(pairs_j, dtype=np.int64)
+    if len(pairs_i) == 0:
+        return labels
+    while True:
+        smaller = np.minimum(labels[pairs_i], labels[pairs_j])
+        updated = labels.copy()
+        np.minimum.at(updated, labels[pairs_i], smaller)
+        np.minimum.at(updated, labels[pairs_j], smaller)
+        # 路径压缩直到每个元素都直接指向组标签
+        while True:
+            compressed = updated[updated]
+            if np.array_equal(compressed, updated):
+                break
+            updated = compressed
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def group_bounds(rects, labels):
+    """按组求外接矩形：rects为 (n, 4) 的 x0, y0, x1, y1，返回 (组标签, 外接矩形)，按标签排序"""
+    rects = np.asarray(rects)
+    roots, inverse = np.unique(labels, return_inverse=True)
+    # 组标签就是组内的一个元素，以它的矩形为初值
+    bounds = rects[roots].copy()
+    np.minimum.at(bounds[:, 0], inverse, rects[:, 0])
+    np.minimum.at(bounds[:, 1], inverse, rects[:, 1])
+    np.maximum.at(bounds[:, 2], inverse, rects[:, 2])
+    np.maximum.at(bounds[:, 3], inverse, rects[:, 3])
+    return roots, bounds
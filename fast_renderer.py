@@ -0,0 +1,254 @@
+"""
+快速可视化渲染 - 直接在numpy图像上绘制检测框、序号和中文标签
+使用OpenCV绘制图形、PIL(FreeType)绘制文字，不依赖matplotlib，
+可在多线程中并发调用，输出保持原图分辨率。
+"""
+import os
+import functools
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 与原matplotlib版本相同的配色（BGR）
+COLORS = [
+    ('red', (0, 0, 255)),
+    ('green', (0, 128, 0)),
+    ('blue', (255, 0, 0)),
+    ('orange', (0, 165, 255)),
+    ('purple', (128, 0, 128)),
+    ('brown', (42, 42, 165)),
+    ('pink', (203, 192, 255)),
+    ('cyan', (255, 255, 0)),
+]
+DARK_COLORS = ('blue', 'purple', 'brown')
+
+# 可视化标签需要中文字体（Docker镜像安装 fonts-noto-cjk）；OCR_FONT_PATH 可指定字体文件
+FONT_PATH = os.environ.get('OCR_FONT_PATH')
+# 为1时找不到中文字体视为启动失败（/readyz 返回错误），否则只输出警告
+REQUIRE_CHINESE_FONT = os.environ.get('OCR_REQUIRE_CHINESE_FONT', '0') == '1'
+
+# 中文字体候选（按优先级）
+CHINESE_FONT_FILES = [
+    'C:/Windows/Fonts/simhei.ttf',
+    'C:/Windows/Fonts/msyh.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+]
+# 候选路径都不存在时，在系统字体目录中按文件名查找中文字体（文件名小写后包含其中之一）
+CHINESE_FONT_DIRS = ['/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+                     os.path.expanduser('~/.local/share/fonts'), '/Library/Fonts', '/System/Library/Fonts',
+                     'C:/Windows/Fonts']
+CHINESE_FONT_KEYWORDS = ('notosanscjk', 'notoserifcjk', 'sourcehansans', 'wqy', 'simhei', 'simsun',
+                         'msyh', 'pingfang', 'droidsansfallback')
+
+# 概览图中每个子图的最大边长
+SUMMARY_PANEL_MAX_SIDE = 1600
+
+
+def _scan_font_dirs():
+    """在系统字体目录中按文件名查找中文字体，找不到时返回None"""
+    for font_dir in CHINESE_FONT_DIRS:
+        for root, _, files in os.walk(font_dir):
+            for name in sorted(files):
+                lower = name.lower()
+                if lower.endswith(('.ttf', '.ttc', '.otf')) and any(k in lower for k in CHINESE_FONT_KEYWORDS):
+                    return os.path.join(root, name)
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def find_chinese_font():
+    """查找可用的中文字体文件路径，找不到时返回None（OCR_FONT_PATH 指定的文件不存在时报错）"""
+    if FONT_PATH:
+        if not os.path.exists(FONT_PATH):
+            raise RuntimeError(f"OCR_FONT_PATH 指定的字体文件不存在: {FONT_PATH}")
+        return FONT_PATH
+    for path in CHINESE_FONT_FILES:
+        if os.path.exists(path):
+            return path
+    return _scan_font_dirs()
+
+
+def check_chinese_font():
+    """启动时检查中文字体：找到时输出路径，找不到时警告（OCR_REQUIRE_CHINESE_FONT=1 时报错）"""
+    path = find_chinese_font()
+    if path:
+        print(f"✅ 找到中文字体: {path}")
+        return path
+    message = ("未找到中文字体，可视化图像中的中文标签无法显示（显示为'?'或方框）；"
+               "请安装中文字体（如 fonts-noto-cjk）或用 OCR_FONT_PATH 指定字体文件")
+    if REQUIRE_CHINESE_FONT:
+        raise RuntimeError(message)
+    print(f"⚠️ {message}")
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(size):
+    """按字号缓存字体对象"""
+    font_path = find_chinese_font()
+    if font_path:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 的默认字体不支持字号
+        return ImageFont.load_default()
+
+
+def _drawable(font, text):
+    """Pillow < 10.1 没有中文字体时只能使用latin-1位图字体，无法编码的字符替换为'?'，避免绘制失败"""
+    if isinstance(font, ImageFont.FreeTypeFont):
+        return text
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _text_size(font, text):
+    left, top, right, bottom = font.getbbox(_drawable(font, text))
+    return right - left, bottom - top, left, top
+
+
+def _draw_texts(img, texts):
+    """在BGR图像上一次性绘制所有文字: texts为 (x, y, 文本, 字体, BGR颜色) 列表"""
+    if not texts:
+        return img
+    pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_img)
+    for x, y, text, font, color in texts:
+        draw.text((x, y), _drawable(font, text), font=font, fill=(color[2], color[1], color[0]))
+    return cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+
+
+def _blend_rect(img, x0, y0, x1, y1, color, alpha):
+    """半透明填充矩形"""
+    h, w = img.shape[:2]
+    x0, y0, x1, y1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+    if x1 <= x0 or y1 <= y0:
+        return
+    roi = img[y0:y1, x0:x1]
+    overlay = np.empty_like(roi)
+    overlay[:] = color
+    cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, dst=roi)
+
+
+def render_visualization(img, results, title=None, legend_lines=None):
+    """绘制检测结果可视化图（原图分辨率）
+
+    img: BGR图像
+    results: [{'bbox', 'text', 'id'}, ...]
+    title: 顶部标题栏文字
+    legend_lines: 左下角的文字列表
+    """
+    height, width = img.shape[:2]
+    scale = max(height, width) / 1000.0
+    thickness = max(2, int(round(3 * scale)))
+    badge_font = get_font(max(14, int(18 * scale)))
+    label_font = get_font(max(12, int(14 * scale)))
+    pad = max(3, int(4 * scale))
+
+    canvas = img.copy()
+    if canvas.ndim == 2:
+        canvas = cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR)
+    texts = []
+
+    for result in results:
+        num = result['id']
+        text = result['text']
+        color_name, color = COLORS[(num - 1) % len(COLORS)]
+        text_color = (255, 255, 255) if color_name in DARK_COLORS else (0, 0, 0)
+        points = np.array(result['bbox'], dtype=np.float32)
+
+        # 检测框
+        cv2.polylines(canvas, [np.round(points).astype(np.int32)], True, color, thickness, cv2.LINE_AA)
+
+        # 检测框中心的圆形序号
+        cx, cy = points.mean(axis=0)
+        num_w, num_h, num_left, num_top = _text_size(badge_font, str(num))
+        radius = int(max(num_w, num_h) / 2 + pad * 2)
+        cv2.circle(canvas, (int(cx), int(cy)), radius, color, -1, cv2.LINE_AA)
+        texts.append((cx - num_w / 2 - num_left, cy - num_h / 2 - num_top, str(num), badge_font, (255, 255, 255)))
+
+        # 检测框旁边的识别文字
+        label = f'{num}: {text}'
+        label_w, label_h, label_left, label_top = _text_size(label_font, label)
+        box_w, box_h = label_w + 2 * pad, label_h + 2 * pad
+        label_x = int(points[:, 0].max()) + 10
+        label_y = int(points[:, 1].min())
+        if label_x + box_w > width:
+            label_x = int(points[:, 0].min()) - box_w - 10
+        label_x = int(np.clip(label_x, 0, max(0, width - box_w)))
+        label_y = int(np.clip(label_y, 0, max(0, height - box_h)))
+        _blend_rect(canvas, label_x, label_y, label_x + box_w, label_y + box_h, color, 0.9)
+        cv2.rectangle(canvas, (label_x, label_y), (label_x + box_w, label_y + box_h), (0, 0, 0), 1)
+        texts.append((label_x + pad - label_left, label_y + pad - label_top, label, label_font, text_color))
+
+    # 左下角文字列表
+    if legend_lines:
+        legend_font = get_font(max(12, int(12 * scale)))
+        line_h = _text_size(legend_font, '国Ag')[1] + pad
+        legend_w = max(_text_size(legend_font, line)[0] for line in legend_lines) + 2 * pad
+        legend_h = line_h * len(legend_lines) + 2 * pad
+        x0, y0 = pad * 2, height - legend_h - pad * 2
+        _blend_rect(canvas, x0, y0, x0 + legend_w, y0 + legend_h, (255, 255, 255), 0.9)
+        for i, line in enumerate(legend_lines):
+            texts.append((x0 + pad, y0 + pad + i * line_h, line, legend_font, (0, 0, 0)))
+
+    canvas = _draw_texts(canvas, texts)
+    if title:
+        canvas = _add_title(canvas, title, max(16, int(16 * scale)))
+    return canvas
+
+
+def _add_title(img, title, font_size):
+    """在图像上方添加白底标题栏"""
+    font = get_font(font_size)
+    title_w, title_h, left, top = _text_size(font, title)
+    # 标题栏高度只取决于字号，保证拼接的子图高度一致
+    bar_h = font_size * 2
+    bar = np.full((bar_h, img.shape[1], 3), 255, dtype=np.uint8)
+    x = max(0, (img.shape[1] - title_w) // 2)
+    bar = _draw_texts(bar, [(x - left, (bar_h - title_h) / 2 - top, title, font, (0, 0, 0))])
+    return np.vstack([bar, img])
+
+
+def _fit(img, width, height):
+    """等比缩放到指定区域内并居中放在白色背景上"""
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    ratio = min(width / img.shape[1], height / img.shape[0])
+    resized = cv2.resize(img, (max(1, int(img.shape[1] * ratio)), max(1, int(img.shape[0] * ratio))),
+                         interpolation=cv2.INTER_AREA)
+    panel = np.full((height, width, 3), 255, dtype=np.uint8)
+    y = (height - resized.shape[0]) // 2
+    x = (width - resized.shape[1]) // 2
+    panel[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+    return panel
+
+
+def render_summary(original, mask, repaired, text_count):
+    """结果概览图：原图 / 文字掩码 / 修复后图像 / 修复前后对比（均为BGR）"""
+    height, width = original.shape[:2]
+    ratio = min(1.0, SUMMARY_PANEL_MAX_SIDE / max(height, width))
+    panel_w, panel_h = max(1, int(width * ratio)), max(1, int(height * ratio))
+    font_size = max(16, int(14 * max(panel_w, panel_h) / 1000))
+
+    panels = [
+        (original, '原始图像'),
+        (mask, f'文字掩码 ({text_count}个文字)'),
+        (repaired, '修复后图像'),
+        (np.hstack([original, repaired]), '修复前后对比'),
+    ]
+    tiles = [_add_title(_fit(panel, panel_w, panel_h), name, font_size) for panel, name in panels]
+    return np.vstack([np.hstack(tiles[:2]), np.hstack(tiles[2:])])
+
+
+def encode_png(img):
+    """编码为PNG字节（较低压缩级别，优先速度）"""
+    ok, buffer = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    return buffer.tobytes() if ok else b''
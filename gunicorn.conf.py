@@ -0,0 +1,127 @@
+"""
+gunicorn配置 - 多worker共享OCR模型
+
+OCR_MODEL_MODE:
+  preload  模型在master进程中加载一次，worker通过fork以写时复制方式共享
+           （加载后冻结GC，避免垃圾回收触碰对象导致内存页被复制）
+  sidecar  模型在单独的推理进程中加载，worker通过本地Unix socket调用
+           （ONNX Runtime会话的线程池不能跨fork使用，onnx引擎默认使用此模式）；
+           master定期检查推理进程，进程退出或连续无响应时重启
+  worker   每个worker各自加载模型（旧行为）
+"""
+import gc
+import os
+import sys
+import time
+import secrets
+import threading
+import subprocess
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 120
+
+_default_mode = 'sidecar' if os.environ.get('OCR_ENGINE') == 'onnx' else 'preload'
+model_mode = os.environ.get('OCR_MODEL_MODE', _default_mode)
+sidecar_socket = os.environ.get('OCR_SIDECAR_SOCKET', '/tmp/ocr_sidecar.sock')
+
+# preload模式下由master导入应用（并加载模型），worker重启时无需重新加载
+preload_app = model_mode == 'preload'
+
+if model_mode == 'sidecar':
+    # worker在fork后继承此环境变量，WebOCRProcessor据此连接推理进程
+    os.environ['OCR_SIDECAR_SOCKET'] = sidecar_socket
+
+# 推理进程存活检查的间隔（秒），连续 SIDECAR_MAX_FAILURES 次无响应时重启
+sidecar_check_interval = float(os.environ.get('OCR_SIDECAR_CHECK_INTERVAL', 10))
+SIDECAR_MAX_FAILURES = 3
+
+_sidecar_process = None
+_stopping = threading.Event()
+
+
+def _start_sidecar(server):
+    """拉起推理进程，并等待模型加载和预热完成"""
+    global _sidecar_process
+    from ocr_sidecar import wait_until_ready
+    server.log.info(f"启动OCR推理进程: {sidecar_socket}")
+    _sidecar_process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_sidecar.py'),
+        '--socket', sidecar_socket
+    ])
+    if not wait_until_ready(sidecar_socket):
+        _sidecar_process.terminate()
+        raise RuntimeError("OCR推理进程启动超时")
+
+
+def _supervise_sidecar(server):
+    """定期检查推理进程：进程退出或连续多次无响应时重启（重启期间worker的 /readyz 返回503）"""
+    from ocr_sidecar import ping
+    failures = 0
+    while not _stopping.wait(sidecar_check_interval):
+        if _sidecar_process.poll() is not None:
+            error = "OCR推理进程已退出"
+            failures = SIDECAR_MAX_FAILURES
+        else:
+            error = ping(sidecar_socket)
+            failures = failures + 1 if error else 0
+        if failures < SIDECAR_MAX_FAILURES:
+            if error:
+                server.log.warning(error)
+            continue
+        if _stopping.is_set():
+            return
+        server.log.error(f"{error}，重启OCR推理进程")
+        _sidecar_process.kill()
+        _sidecar_process.wait()
+        failures = 0
+        try:
+            _start_sidecar(server)
+        except (RuntimeError, OSError) as e:
+            # 下一轮检查时进程已退出，再次重启
+            server.log.error(f"OCR推理进程重启失败: {e}")
+
+
+def on_starting(server):
+    """master启动时拉起推理进程，等待模型加载完成后开始监督"""
+    if model_mode != 'sidecar':
+        return
+    # 每次启动随机生成进程间认证密钥，推理进程和fork出的worker通过环境变量继承
+    os.environ['OCR_SIDECAR_AUTHKEY'] = secrets.token_hex(32)
+    _start_sidecar(server)
+    threading.Thread(target=_supervise_sidecar, args=(server,), name='sidecar-supervisor', daemon=True).start()
+
+
+def when_ready(server):
+    """应用已在master中导入：加载模型并冻结现有对象，fork后不再被GC扫描写入"""
+    if preload_app:
+        # 预热（算子初始化、线程池、内存池）要在fork之后的各worker中进行，见 post_worker_init
+        sys.modules['main_server'].get_ocr_processor()
+        gc.collect()
+        gc.freeze()
+        server.log.info(f"模型已预加载，冻结 {gc.get_freeze_count()} 个对象")
+
+
+def pre_fork(server, worker):
+    # fork前关闭GC，避免在fork瞬间触发回收
+    if preload_app:
+        gc.disable()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
+
+
+def post_worker_init(worker):
+    """worker已导入应用：在后台加载（preload模式下已加载）并预热模型"""
+    main_server = sys.modules.get('main_server')
+    if main_server is not None:
+        main_server.start_warmup()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _sidecar_process is not None:
+        _sidecar_process.terminate()
+        _sidecar_process.wait(timeout=10)
@@ -0,0 +1,73 @@
+"""
+局部图像修复 - 只在文字掩码连通区域周围的小块上运行 cv2.inpaint
+大图中只有少量文字时，修复耗时与文字面积相关，而不是与整张图的像素数相关；
+文字占比较大时修复耗时主要取决于掩码像素数，分块没有收益，直接整图修复。
+"""
+import cv2
+import numpy as np
+
+# 支持的修复方法: Navier-Stokes / Telea / 两者加权混合
+INPAINT_METHODS = ('ns', 'telea', 'mixed')
+INPAINT_RADIUS = 7
+MIXED_WEIGHTS = (0.6, 0.4)  # mixed = ns * 0.6 + telea * 0.4
+# 掩码像素占整图的比例超过该值时整图修复（实测4K图像上占比约3%以上时分块不再更快）
+TILED_MAX_MASK_RATIO = 0.02
+
+
+def mask_tiles(mask, padding):
+    """按掩码连通区域计算修复块 (x0, y0, x1, y1)，相距小于padding的区域合并为同一块"""
+    height, width = mask.shape[:2]
+    binary = (mask > 0).astype(np.uint8)
+    if padding > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * padding + 1, 2 * padding + 1))
+        binary = cv2.dilate(binary, kernel)
+    # 外轮廓的外接矩形即膨胀后连通区域的范围（比 connectedComponentsWithStats 快得多），
+    # 位于其他区域空洞中的区域没有外轮廓，已被外层的块覆盖
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    tiles = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        tiles.append((max(0, x), max(0, y), min(width, x + w), min(height, y + h)))
+    return tiles
+
+
+def inpaint_regions(img, mask, methods=INPAINT_METHODS, radius=INPAINT_RADIUS):
+    """只在掩码区域周围的小块上修复图像，返回 {方法: 修复后图像}
+
+    每个块向外扩展 3*radius 像素，结果与整图修复在视觉上一致（cv2.inpaint 的传播范围超出扩展范围，
+    个别像素可能相差1~2个灰度级）；只把掩码内的像素写回结果，掩码外保持原图。
+    掩码占比超过 TILED_MAX_MASK_RATIO 时整图修复。
+    """
+    methods = [m for m in INPAINT_METHODS if m in methods]
+    need_ns = 'ns' in methods or 'mixed' in methods
+    need_telea = 'telea' in methods or 'mixed' in methods
+
+    results = {method: img.copy() for method in methods}
+    if not methods or not np.any(mask):
+        return results
+
+    if np.count_nonzero(mask) > TILED_MAX_MASK_RATIO * mask.size:
+        tiles = [(0, 0, mask.shape[1], mask.shape[0])]
+    else:
+        tiles = mask_tiles(mask, padding=3 * radius)
+    for x0, y0, x1, y1 in tiles:
+        tile = img[y0:y1, x0:x1]
+        tile_mask = mask[y0:y1, x0:x1]
+        where = tile_mask > 0
+        if tile.ndim == 3:
+            where = where[:, :, np.newaxis]
+
+        tile_results = {}
+        if need_ns:
+            tile_results['ns'] = cv2.inpaint(tile, tile_mask, radius, cv2.INPAINT_NS)
+        if need_telea:
+            tile_results['telea'] = cv2.inpaint(tile, tile_mask, radius, cv2.INPAINT_TELEA)
+        if 'mixed' in methods:
+            tile_results['mixed'] = cv2.addWeighted(tile_results['ns'], MIXED_WEIGHTS[0],
+                                                    tile_results['telea'], MIXED_WEIGHTS[1], 0)
+
+        for method in methods:
+            np.copyto(results[method][y0:y1, x0:x1], tile_results[method], where=where)
+
+    return results
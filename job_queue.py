@@ -0,0 +1,206 @@
+"""
+OCR异步任务队列 - 有界队列 + 后台工作线程池
+上传接口只负责入队并返回任务ID，耗时的OCR、图像修复和文件保存在后台线程中完成
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+
+from process_local import OncePerProcess
+
+
+class QueueFullError(Exception):
+    """任务队列已满，调用方应稍后重试"""
+
+
+class OCRJobQueue:
+    """有界的进程内任务队列
+
+    任务状态同时写入 jobs_dir 下的JSON文件，多个gunicorn worker之间
+    可以互相查询到对方接收的任务。
+    file_max_age: 状态文件的最长保留秒数（0为不限制）；接收任务的worker重启或退出后，
+                  其任务文件不再由内存中的记录清理，按修改时间删除
+    """
+
+    # 检查过期状态文件的最短间隔（秒）
+    SWEEP_INTERVAL = 300
+
+    def __init__(self, handler, workers=2, max_pending=16, jobs_dir=None,
+                 max_finished=256, finished_ttl=3600, file_max_age=24 * 3600):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.jobs_dir = jobs_dir
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.file_max_age = file_max_age
+        self._last_sweep = 0.0
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # 工作线程在首次提交任务时按进程启动（见 process_local）
+        self._ensure_workers = OncePerProcess(self._start_workers)
+        if jobs_dir:
+            os.makedirs(jobs_dir, exist_ok=True)
+
+    def _start_workers(self):
+        # fork后丢弃从父进程继承的队列（其中的任务和等待中的线程属于父进程）
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        for i in range(self.workers):
+            threading.Thread(target=self._worker_loop, name=f"ocr-worker-{i}", daemon=True).start()
+        print(f"🧵 OCR任务队列已启动: {self.workers} 个工作线程, 队列上限 {self.max_pending}")
+
+    def submit(self, payload):
+        """提交任务，返回任务ID；队列已满时抛出 QueueFullError"""
+        self._ensure_workers()
+        job = self._new_job('queued')
+        self._store(job)
+        try:
+            self._queue.put_nowait((job['job_id'], payload))
+        except queue.Full:
+            self._discard(job['job_id'])
+            raise QueueFullError(f"任务队列已满 ({self.max_pending})")
+        return job['job_id']
+
+    def add_finished(self, result):
+        """直接登记一个已完成的任务（例如命中结果缓存时）"""
+        job = self._new_job('done')
+        job['finished'] = job['created']
+        job['result'] = result
+        self._store(job)
+        return job['job_id']
+
+    def get(self, job_id):
+        """查询任务，本进程没有时从任务状态文件读取；结果目录已被清理的任务视为不存在"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job) if job is not None else None
+        if job is None:
+            path = self._job_path(job_id)
+            if not path or not os.path.exists(path):
+                return None
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                return None
+        output_dir = (job.get('result') or {}).get('output_dir')
+        if job['status'] == 'done' and output_dir and not os.path.isdir(output_dir):
+            self._discard(job_id)
+            return None
+        return job
+
+    def pending_count(self):
+        """等待处理的任务数"""
+        return self._queue.qsize()
+
+    def _new_job(self, status):
+        return {
+            'job_id': uuid.uuid4().hex,
+            'status': status,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None
+        }
+
+    def _job_path(self, job_id):
+        if not self.jobs_dir or not job_id.isalnum():
+            return None
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _store(self, job):
+        """更新内存中的任务状态并写入状态文件"""
+        with self._lock:
+            self._jobs[job['job_id']] = job
+            self._jobs.move_to_end(job['job_id'])
+            self._prune()
+        path = self._job_path(job['job_id'])
+        if path:
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(job, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ 写入任务状态失败: {e}")
+        self._sweep_files()
+
+    def _sweep_files(self):
+        """删除超过 file_max_age 未更新的状态文件（包括其他进程留下的），最多每 SWEEP_INTERVAL 秒检查一次"""
+        now = time.time()
+        if not self.jobs_dir or not self.file_max_age or now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        try:
+            names = os.listdir(self.jobs_dir)
+        except OSError:
+            return
+        with self._lock:
+            own = set(self._jobs)
+        for name in names:
+            job_id, ext = os.path.splitext(name)
+            if ext not in ('.json', '.tmp') or job_id in own:
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.file_max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _discard(self, job_id):
+        """删除任务记录和状态文件"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._remove_job_file(job_id)
+
+    def _remove_job_file(self, job_id):
+        path = self._job_path(job_id)
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _prune(self):
+        """清理过期或超出数量上限的已完成任务（调用方持有锁）"""
+        now = time.time()
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job['status'] in ('done', 'failed')]
+        overflow = len(finished) - self.max_finished
+        for job_id in finished:
+            job = self._jobs[job_id]
+            if overflow > 0 or now - job['finished'] > self.finished_ttl:
+                del self._jobs[job_id]
+                overflow -= 1
+                self._remove_job_file(job_id)
+
+    def _worker_loop(self):
+        while True:
+            job_id, payload = self._queue.get()
+            try:
+                with self._lock:
+                    job = dict(self._jobs[job_id])
+                job['status'] = 'running'
+                job['started'] = time.time()
+                self._store(job)
+
+                try:
+                    job['result'] = self.handler(payload)
+                    job['status'] = 'done'
+                except Exception as e:
+                    print(f"❌ 任务 {job_id} 处理失败: {e}")
+                    traceback.print_exc()
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                job['finished'] = time.time()
+                self._store(job)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,156 @@
+"""
+版面分析 - 将识别出的文本框组合为文字行和段落，并按阅读顺序排序
+按上边界排序后做一次y方向扫描，每个框只与扫描线上仍然"打开"的行比较，
+文本框很多时也不需要两两比较。
+"""
+import numpy as np
+
+LINE_OVERLAP = 0.5     # 与行的垂直重叠 / 两者中较小的高度 超过该值时属于同一行
+WORD_GAP = 2.5         # 同一行内相邻框的水平间距超过 该值*行高 时断开为两行（如左右分栏）
+PARAGRAPH_GAP = 1.0    # 相邻行的垂直间距小于 该值*行高 时属于同一段落
+HEIGHT_RATIO = 1.6     # 相邻行的行高相差超过该倍数时（如标题和正文）不属于同一段落
+
+
+def _rects(items):
+    """文本框的外接矩形 (n, 4): x0, y0, x1, y1"""
+    points = [np.asarray(item['bbox'], dtype=np.float32).reshape(-1, 2) for item in items]
+    return np.array([[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()] for p in points],
+                    dtype=np.float32).reshape(-1, 4)
+
+
+def _bounds(rects, members):
+    sub = rects[members]
+    return [float(sub[:, 0].min()), float(sub[:, 1].min()), float(sub[:, 2].max()), float(sub[:, 3].max())]
+
+
+def group_lines(rects):
+    """将文本框分组为文字行，返回每行的框下标列表（行内从左到右）"""
+    lines = []
+    active = []  # 扫描线上仍可能加入新框的行: [y0, y1, 下标列表]
+    for i in np.argsort(rects[:, 1], kind='stable'):
+        x0, y0, x1, y1 = rects[i]
+        # 扫描线已越过下边界的行不会再有新框加入
+        lines.extend(line for line in active if line[1] <= y0)
+        active = [line for line in active if line[1] > y0]
+
+        best, best_ratio = None, LINE_OVERLAP
+        for line in active:
+            overlap = min(line[1], y1) - max(line[0], y0)
+            ratio = overlap / max(1.0, min(line[1] - line[0], y1 - y0))
+            if ratio > best_ratio:
+                best, best_ratio = line, ratio
+        if best is None:
+            active.append([y0, y1, [i]])
+        else:
+            best[0], best[1] = min(best[0], y0), max(best[1], y1)
+            best[2].append(i)
+    lines.extend(active)
+
+    # 行内按x排序，间距过大的位置断开
+    result = []
+    for y0, y1, members in lines:
+        members.sort(key=lambda k: rects[k, 0])
+        max_gap = WORD_GAP * max(1.0, y1 - y0)
+        segment, right = [members[0]], rects[members[0], 2]
+        for k in members[1:]:
+            if rects[k, 0] - right > max_gap:
+                result.append(segment)
+                segment, right = [], rects[k, 2]
+            segment.append(k)
+            right = max(right, rects[k, 2])
+        result.append(segment)
+    return result
+
+
+def group_blocks(line_rects):
+    """将文字行分组为段落：垂直间距小、水平范围重叠且行高相近的相邻行属于同一段落"""
+    blocks = []
+    active = []  # 仍可能接上新行的段落: [最后一行的矩形, 行下标列表]
+    for i in np.argsort(line_rects[:, 1], kind='stable'):
+        x0, y0, x1, y1 = line_rects[i]
+        height = y1 - y0
+        # 间距已超过可合并范围的段落不会再有新行加入
+        still_active = []
+        for block in active:
+            last_height = block[0][3] - block[0][1]
+            if y0 - block[0][3] > PARAGRAPH_GAP * HEIGHT_RATIO * last_height:
+                blocks.append(block)
+            else:
+                still_active.append(block)
+        active = still_active
+
+        best = None
+        for block in active:
+            bx0, by0, bx1, by1 = block[0]
+            last_height = by1 - by0
+            if (y0 - by1 <= PARAGRAPH_GAP * max(height, last_height) and y0 > by0 + 0.5 * last_height
+                    and min(x1, bx1) > max(x0, bx0)
+                    and max(height, last_height) <= HEIGHT_RATIO * max(1.0, min(height, last_height))):
+                if best is None or block[0][3] > best[0][3]:
+                    best = block
+        if best is None:
+            active.append([line_rects[i], [i]])
+        else:
+            best[0] = line_rects[i]
+            best[1].append(i)
+    blocks.extend(active)
+    return [members for _, members in blocks]
+
+
+def reading_order(rects, tolerance):
+    """从上到下、从左到右排序；上边界相差小于tolerance的视为同一排"""
+    order = list(np.argsort(rects[:, 1], kind='stable'))
+    result, row = [], []
+    for i in order:
+        if row and rects[i, 1] - rects[row[0], 1] > tolerance:
+            result.extend(sorted(row, key=lambda k: rects[k, 0]))
+            row = []
+        row.append(i)
+    result.extend(sorted(row, key=lambda k: rects[k, 0]))
+    return result
+
+
+def analyze_layout(items):
+    """版面分析
+
+    items: [{'bbox', 'text', 'confidence', 'id'}, ...]
+    返回 {'lines': [...], 'blocks': [...], 'reading_order': [文本框id, ...]}，
+    行和段落按阅读顺序编号，lines[].box_ids / blocks[].line_ids 引用对应的文本框和行
+    """
+    if not items:
+        return {'lines': [], 'blocks': [], 'reading_order': []}
+    rects = _rects(items)
+    lines = group_lines(rects)
+    line_rects = np.array([_bounds(rects, members) for members in lines], dtype=np.float32)
+    blocks = group_blocks(line_rects)
+
+    block_rects = np.array([_bounds(line_rects, members) for members in blocks], dtype=np.float32)
+    tolerance = 0.5 * float(np.median(line_rects[:, 3] - line_rects[:, 1]))
+
+    layout = {'lines': [], 'blocks': [], 'reading_order': []}
+    for block_index in reading_order(block_rects, tolerance):
+        line_ids = []
+        for line_index in sorted(blocks[block_index], key=lambda k: line_rects[k, 1]):
+            members = lines[line_index]
+            line_id = len(layout['lines']) + 1
+            layout['lines'].append({
+                'id': line_id,
+                'text': ' '.join(items[k]['text'] for k in members),
+                'bbox': _bounds(rects, members),
+                'box_ids': [items[k]['id'] for k in members],
+                'confidence': float(np.mean([items[k]['confidence'] for k in members]))
+            })
+            layout['reading_order'].extend(items[k]['id'] for k in members)
+            line_ids.append(line_id)
+        layout['blocks'].append({
+            'id': len(layout['blocks']) + 1,
+            'text': '\n'.join(layout['lines'][k - 1]['text'] for k in line_ids),
+            'bbox': [float(v) for v in block_rects[block_index]],
+            'line_ids': line_ids
+        })
+    return layout
+
+
+def layout_text(layout):
+    """按阅读顺序拼接的全文：行之间换行，段落之间空一行"""
+    return '\n\n'.join(block['text'] for block in layout['blocks'])
@@ -3,19 +3,34 @@ import sys
 import json
 import base64
 import shutil
-import zipfile
-from io import BytesIO
+import threading
+import time
+import mimetypes
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from io import BytesIO, StringIO
+from urllib.parse import quote
+from flask import Flask, Request, Response, request, jsonify, send_file, send_from_directory, stream_with_context
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import cv2
 import numpy as np
-import easyocr
-# 修复Matplotlib后端问题 - 必须在导入pyplot之前设置
-import matplotlib
-matplotlib.use('Agg')  # 使用非GUI后端，解决多线程问题
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
+from model_config import load_default_settings
+from result_cache import OCRResultCache
+from job_queue import OCRJobQueue, QueueFullError
+from micro_batcher import MicroBatcher, batching_settings
+from retention import ResultRetention
+from artifact_index import ArtifactIndex, write_atomic
+import fast_renderer
+from inpainting import INPAINT_METHODS, inpaint_regions
+from tiled_detection import detect_tiled, needs_tiling, tile_settings
+from layout import analyze_layout
+import metrics
+import zip_stream
+import warmup
+from process_local import OncePerProcess
+from text_masks import build_text_masks, crop_box, crop_region, expand_polygons, region_rect
+from batch_processor import batch_summary, chunked, iter_zip_images, to_ndjson
 
 # 修复PIL版本兼容性问题
 try:
@@ -34,38 +49,152 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
+class InMemoryRequest(Request):
+    """上传的文件直接解析到内存中，不经过磁盘临时文件（大小受 MAX_CONTENT_LENGTH 限制）"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
+# 上传的图片默认只在内存中解码处理；设置 SAVE_UPLOADS=1 时同时保存到 uploads/
+SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', '0') == '1'
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 50))
 RESULTS_FOLDER = 'results'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# OCR引擎: easyocr (默认) 或 onnx (ONNX Runtime, 模型见 models/model-config.json)
+OCR_ENGINE = os.environ.get('OCR_ENGINE', 'easyocr')
+OCR_MODEL = os.environ.get('OCR_MODEL')  # 为空时使用配置中的 defaultSettings.model
+# 设置后通过本地socket调用共享的推理进程，而不是在每个worker中加载模型（见 gunicorn.conf.py）
+OCR_SIDECAR_SOCKET = os.environ.get('OCR_SIDECAR_SOCKET')
+# 推理进程不可用（例如正在重启）时，后台加载每隔该秒数重新连接
+SIDECAR_RETRY_SECONDS = 5
+CONFIDENCE_THRESHOLD = 0.3  # 置信度阈值
+# 可按需生成的结果文件类型；未请求的文件在首次通过 /api/file 访问时再生成
+ARTIFACT_TYPES = ('visualization', 'original', 'mask', 'regions', 'repaired', 'info', 'summary')
+MANIFEST_NAME = 'ocr_manifest.json'
+# 设置后 /api/download 生成的压缩包保存在该目录，结果目录未变化时直接发送（默认每次流式生成）
+ZIP_CACHE_FOLDER = os.environ.get('ZIP_CACHE_FOLDER')
+# /api/file 返回的结果文件的浏览器缓存时间（秒），文件变化时ETag随之改变
+FILE_MAX_AGE = int(os.environ.get('FILE_MAX_AGE', 7 * 24 * 3600))
+# EasyOCR整图检测时的最长边上限（Reader.detect 的 canvas_size 默认值），不超过时不分块
+EASYOCR_CANVAS_SIZE = 2560
+# EasyOCR批量检测时，宽高按该值向上取整后相同的图像补边到同一尺寸，一起检测
+EASYOCR_SIZE_BUCKET = 256
+# EasyOCR拼接各图像的文字区域批量识别时，区域之间的间隔（像素）
+EASYOCR_CROP_GAP = 8
+# 批量处理时每次一起检测和识别的图片数量
+BATCH_CHUNK_SIZE = int(os.environ.get('OCR_BATCH_CHUNK', 8))
+DEFAULT_SETTINGS = load_default_settings()
+# 大图分块检测设置（defaultSettings.tiledDetection）
+TILE_SETTINGS = tile_settings(DEFAULT_SETTINGS)
+# EasyOCR每批识别的文字区域数量（defaultSettings.batchSize）
+EASYOCR_RECOGNIZE_BATCH = DEFAULT_SETTINGS.get('batchSize', 8) if DEFAULT_SETTINGS.get('enableBatch', True) else 1
+if SAVE_UPLOADS:
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
+if ZIP_CACHE_FOLDER:
+    os.makedirs(ZIP_CACHE_FOLDER, exist_ok=True)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
-# 解决matplotlib中文显示问题
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+# 按需生成结果文件时串行执行，避免同一文件被并发重复生成
+ARTIFACT_LOCK = threading.Lock()
+# 已生成的结果文件（/api/file 直接按索引发送）
+artifact_index = ArtifactIndex(RESULTS_FOLDER)
 
-def setup_chinese_font():
-    """自动检测并设置中文字体"""
-    try:
-        for font in fm.fontManager.ttflist:
-            if any(chinese_name in font.name for chinese_name in ['SimHei', 'Microsoft YaHei', 'PingFang']):
-                plt.rcParams['font.sans-serif'] = [font.name] + plt.rcParams['font.sans-serif']
-                print(f"✅ 找到中文字体: {font.name}")
-                return
-        print("⚠️ 未找到理想中文字体，使用默认字体")
-    except:
-        print("⚠️ 字体设置失败，使用默认字体")
+def save_image(path, img, params=()):
+    """按扩展名编码图像并原子写入（按需生成的文件可能同时被其他worker登记和发送）"""
+    ok, buf = cv2.imencode(os.path.splitext(path)[1], img, list(params))
+    if not ok:
+        raise ValueError(f"图像编码失败: {path}")
+    write_atomic(path, buf.tobytes())
 
 class WebOCRProcessor:
-    def __init__(self):
-        """初始化Web OCR处理器"""
-        setup_chinese_font()
-        print("🔍 初始化中文OCR...")
-        self.reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
-        print("✅ OCR初始化完成")
+    def __init__(self, engine=OCR_ENGINE, model_name=OCR_MODEL, sidecar_socket=OCR_SIDECAR_SOCKET):
+        """初始化Web OCR处理器（先检查可视化所需的中文字体）"""
+        fast_renderer.check_chinese_font()
+        start = time.perf_counter()
+        self.engine = engine
+        self.sidecar = bool(sidecar_socket)
+        if sidecar_socket:
+            print(f"🔌 连接OCR推理进程: {sidecar_socket}")
+            from ocr_sidecar import SidecarReader
+            self.reader = SidecarReader(sidecar_socket)
+            self.engine = self.reader.engine
+        elif engine == 'onnx':
+            print("🔍 初始化ONNX Runtime OCR...")
+            from onnx_ocr_engine import ONNXOCREngine
+            self.reader = ONNXOCREngine(model_name)
+        else:
+            print("🔍 初始化中文OCR...")
+            import easyocr
+            self.reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
+        self.load_seconds = time.perf_counter() - start
+        print(f"✅ OCR初始化完成 ({self.load_seconds:.2f}秒)")
+        self.warmup_seconds = None
+        self.warmup_error = None
+        self.ready = threading.Event()
+        
+        # 同一进程中并发请求的识别在一个短时间窗口内合并为一次 read_text（defaultSettings.microBatching）
+        batching = batching_settings(DEFAULT_SETTINGS)
+        self.read_batcher = None
+        if batching['enabled']:
+            self.read_batcher = MicroBatcher(self._read_text, batching['windowMs'] / 1000.0,
+                                             batching['maxImages'], 'ocr')
+        self._active = 0  # 正在执行 read_text 的调用数
+        self._active_lock = threading.Lock()
+    
+    def warm_up(self):
+        """用合成图像运行检测和识别，完成后标记为就绪（使用推理进程时模型已在推理进程中预热）"""
+        try:
+            if self.sidecar:
+                self.load_seconds = self.reader.load_seconds
+                self.warmup_seconds = self.reader.warmup_seconds
+            elif warmup.WARMUP_ENABLED:
+                print("🔥 预热OCR模型...")
+                self.warmup_seconds = warmup.warm_up(self.read_text)
+                print(f"🔥 预热完成 ({self.warmup_seconds:.2f}秒)")
+            else:
+                self.warmup_seconds = 0.0
+            self.ready.set()
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"❌ 预热失败: {e}")
+    
+    def status(self, check_sidecar=False):
+        """模型加载和预热状态（/readyz）；check_sidecar时检查推理进程是否存活，不可用时视为未就绪"""
+        status = {
+            'ready': self.ready.is_set(),
+            'engine': self.engine,
+            'load_seconds': round(self.load_seconds, 3),
+            'warmup_seconds': round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            'warmup_error': self.warmup_error
+        }
+        if check_sidecar and self.sidecar:
+            status['sidecar_error'] = self.reader.ping()
+            status['ready'] = status['ready'] and status['sidecar_error'] is None
+        return status
+    
+    def cache_params(self):
+        """影响识别结果的参数，作为结果缓存键的一部分"""
+        if self.engine == 'onnx':
+            model = self.reader.model_name
+            thresholds = {'det': self.reader.det_threshold}
+            tiling = self.reader.tiling
+        else:
+            model = 'ch_sim+en'
+            thresholds = {'width_ths': 0.5, 'height_ths': 0.5}
+            tiling = TILE_SETTINGS
+        return {
+            'engine': self.engine,
+            'model': model,
+            'thresholds': thresholds,
+            'tiling': tiling,
+            'confidence': CONFIDENCE_THRESHOLD
+        }
     
     def create_output_directory(self, base_name):
         """创建输出目录"""
@@ -76,401 +205,594 @@ class WebOCRProcessor:
         print(f"🗂️ 创建输出目录: {os.path.abspath(output_dir)}")
         return output_dir
     
-    def detect_and_recognize_text(self, image_path):
-        """检测并识别文字"""
-        print(f"📷 处理图像: {image_path}")
+    def read_text(self, imgs):
+        """检测并识别一组BGR图像中的文字，返回每张图像的原始识别结果；两种引擎都跨图像批量推理
+
+        有其他请求同时在识别时交给微批处理器，与它们的图像合并为一次 _read_text；
+        只有一个请求时直接推理，不等待时间窗口
+        """
+        with self._active_lock:
+            self._active += 1
+            concurrent = self._active > 1
+        try:
+            with metrics.timed('ocr'):
+                if self.read_batcher is not None and concurrent:
+                    return self.read_batcher.submit(imgs)
+                return self._read_text(imgs)
+        finally:
+            with self._active_lock:
+                self._active -= 1
+    
+    def _read_text(self, imgs):
+        """调用识别引擎处理一组图像（不经过微批处理）"""
+        if self.engine == 'onnx':
+            return self.reader.readtext_batch(imgs)
+        # EasyOCR读取文件时使用RGB图像，传入数组时保持一致
+        return self.easyocr_readtext_batch([cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in imgs])
+    
+    def use_tiling(self, img):
+        """EasyOCR是否对该图像分块检测（ONNX引擎在 readtext_batch 内部处理分块）"""
+        return TILE_SETTINGS['enabled'] and needs_tiling(img.shape, TILE_SETTINGS['tileSize'], EASYOCR_CANVAS_SIZE)
+    
+    def easyocr_readtext_batch(self, imgs_rgb):
+        """分别调用EasyOCR的检测和识别（与逐张 readtext 等价，可分别计时），多张图像一起检测和识别"""
+        with metrics.timed('detect'):
+            detections = self.easyocr_detect_batch(imgs_rgb)
+        with metrics.timed('recognize'):
+            return self.easyocr_recognize_batch(imgs_rgb, detections)
+    
+    def easyocr_detect_batch(self, imgs_rgb):
+        """返回每张图像的 (horizontal_list, free_list)：大图分块检测，
+        其余按尺寸分组，同组图像在右侧和下方补零到相同尺寸后作为一个批次检测（补边不改变框的坐标）
+        """
+        detections = [None] * len(imgs_rgb)
+        groups = {}
+        for i, img in enumerate(imgs_rgb):
+            if self.use_tiling(img):
+                detections[i] = self.easyocr_detect_tiled(img)
+                continue
+            height, width = img.shape[:2]
+            bucket = (-(-height // EASYOCR_SIZE_BUCKET) * EASYOCR_SIZE_BUCKET,
+                      -(-width // EASYOCR_SIZE_BUCKET) * EASYOCR_SIZE_BUCKET)
+            groups.setdefault(bucket, []).append(i)
         
-        # 检测和识别文字
-        results = self.reader.readtext(image_path, 
-                                     width_ths=0.5,
-                                     height_ths=0.5,
-                                     paragraph=False)
+        for indices in groups.values():
+            if len(indices) == 1:
+                batch, reformat = imgs_rgb[indices[0]], True
+            else:
+                height = max(imgs_rgb[i].shape[0] for i in indices)
+                width = max(imgs_rgb[i].shape[1] for i in indices)
+                batch, reformat = np.zeros((len(indices), height, width, 3), dtype=np.uint8), False
+                for j, i in enumerate(indices):
+                    h, w = imgs_rgb[i].shape[:2]
+                    batch[j, :h, :w] = imgs_rgb[i]
+            horizontal_lists, free_lists = self.reader.detect(batch, width_ths=0.5, height_ths=0.5,
+                                                              reformat=reformat)
+            for j, i in enumerate(indices):
+                detections[i] = (horizontal_lists[j], free_lists[j])
+        return detections
+    
+    def easyocr_recognize_batch(self, imgs_rgb, detections):
+        """所有图像的文字区域裁剪后纵向排列在一张灰度图上，一次 recognize 调用按 batchSize 批量识别，
+        再按区域在拼接图中的位置分回各图像；返回每张图像的 [(四点框, 文本, 置信度), ...]
+        """
+        crops, boxes, owners = [], [], []
+        for i, (img, (horizontal_list, free_list)) in enumerate(zip(imgs_rgb, detections)):
+            if not horizontal_list and not free_list:
+                continue
+            grey = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+            height, width = grey.shape
+            for x0, x1, y0, y1 in horizontal_list:
+                x0, x1 = max(0, int(x0)), min(width, int(x1))
+                y0, y1 = max(0, int(y0)), min(height, int(y1))
+                if x1 > x0 and y1 > y0:
+                    crops.append(grey[y0:y1, x0:x1])
+                    boxes.append([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+                    owners.append(i)
+            for box in free_list:
+                # 与EasyOCR相同，倾斜的框透视变换为水平后识别，竖排不旋转
+                crops.append(crop_box(grey, box, rotate_vertical=False))
+                boxes.append([[int(x), int(y)] for x, y in box])
+                owners.append(i)
+        results = [[] for _ in imgs_rgb]
+        if not crops:
+            return results
+        
+        canvas = np.full((sum(crop.shape[0] + EASYOCR_CROP_GAP for crop in crops),
+                          max(crop.shape[1] for crop in crops)), 255, dtype=np.uint8)
+        horizontal_list, index_by_top = [], {}
+        top = 0
+        for index, crop in enumerate(crops):
+            canvas[top:top + crop.shape[0], :crop.shape[1]] = crop
+            horizontal_list.append([0, crop.shape[1], top, top + crop.shape[0]])
+            index_by_top[top] = index
+            top += crop.shape[0] + EASYOCR_CROP_GAP
+        recognized = self.reader.recognize(canvas, horizontal_list=horizontal_list, free_list=[],
+                                           paragraph=False, batch_size=EASYOCR_RECOGNIZE_BATCH)
+        # recognize 的结果按区域的纵坐标排序，过小的区域会被跳过，按区域顶部位置对应回原图的框
+        for bbox, text, confidence in recognized:
+            index = index_by_top.get(int(bbox[0][1]))
+            if index is not None:
+                results[owners[index]].append((boxes[index], text, confidence))
+        return results
+    
+    def easyocr_detect_tiled(self, img_rgb):
+        """大图分块检测，返回与 Reader.detect 单张图像结果相同格式的 (horizontal_list, free_list)"""
+        def detect_tiles(tiles):
+            boxes = []
+            for tile in tiles:
+                horizontal_list, free_list = self.reader.detect(tile, width_ths=0.5, height_ths=0.5)
+                boxes.append([np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float32)
+                              for x0, x1, y0, y1 in horizontal_list[0]] +
+                             [np.array(box, dtype=np.float32) for box in free_list[0]])
+            return boxes
         
-        # 处理结果
+        boxes = detect_tiled(img_rgb, detect_tiles, TILE_SETTINGS['tileSize'], TILE_SETTINGS['overlap'],
+                             TILE_SETTINGS['batchSize'], TILE_SETTINGS['workers'])
+        print(f"🧩 分块检测到 {len(boxes)} 个文字区域")
+        # 水平框使用 [x_min, x_max, y_min, y_max] 格式，其余按四点坐标识别
+        horizontal_list, free_list = [], []
+        for box in boxes:
+            if box[0][1] == box[1][1] and box[0][0] == box[3][0]:
+                horizontal_list.append([int(box[0][0]), int(box[2][0]), int(box[0][1]), int(box[2][1])])
+            else:
+                free_list.append(box.tolist())
+        return horizontal_list, free_list
+    
+    def filter_results(self, results):
+        """过滤低置信度结果，转换为可JSON序列化的格式"""
         print(f"🎯 检测到 {len(results)} 个文字区域")
         valid_results = []
         for i, (bbox, text, confidence) in enumerate(results):
-            if confidence > 0.3:
+            if confidence > CONFIDENCE_THRESHOLD:
                 print(f"  {i+1}. '{text}' (置信度: {confidence:.2f})")
                 valid_results.append({
-                    'bbox': bbox,
+                    'bbox': [[float(x), float(y)] for x, y in bbox],
                     'text': text,
-                    'confidence': confidence,
+                    'confidence': float(confidence),
                     'id': i+1
                 })
         
         return valid_results
     
+    def detect_and_recognize_text(self, img):
+        """检测并识别文字（img为BGR图像）"""
+        print(f"📷 处理图像: {img.shape[1]}x{img.shape[0]}")
+        return self.filter_results(self.read_text([img])[0])
+    
     def create_text_masks(self, img, valid_results):
-        """创建文字区域掩码"""
+        """创建文字区域掩码：总体掩码为整图，每个文字区域只保存裁剪范围内的局部掩码"""
         print("🎭 创建文字掩码...")
         
-        height, width = img.shape[:2]
-        
-        # 创建总体掩码
-        combined_mask = np.zeros((height, width), dtype=np.uint8)
+        combined_mask, regions = build_text_masks(img.shape, [result['bbox'] for result in valid_results])
         
-        # 为每个文字区域创建单独的掩码
         individual_masks = []
-        
-        for result in valid_results:
-            bbox = result['bbox']
-            text = result['text']
-            result_id = result['id']
-            
-            # 单独掩码
-            single_mask = np.zeros((height, width), dtype=np.uint8)
-            
-            # 转换坐标并扩展区域
-            points = np.array(bbox, dtype=np.int32)
-            
-            # 计算中心点并扩展区域
-            center = np.mean(points, axis=0)
-            expanded_points = []
-            for point in points:
-                direction = point - center
-                expanded_point = center + direction * 1.2  # 扩展20%
-                expanded_points.append(expanded_point)
-            
-            expanded_points = np.array(expanded_points, dtype=np.int32)
-            
-            # 填充掩码
-            cv2.fillPoly(single_mask, [expanded_points], 255)
-            cv2.fillPoly(combined_mask, [expanded_points], 255)
-            
+        for result, region in zip(valid_results, regions):
+            if region is None:
+                continue
+            position, local_mask = region
             individual_masks.append({
-                'mask': single_mask,
-                'text': text,
-                'id': result_id,
-                'bbox': bbox
+                'mask': local_mask,
+                'position': position,
+                'text': result['text'],
+                'id': result['id']
             })
         
-        # 对掩码进行形态学处理
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
-        combined_mask = cv2.dilate(combined_mask, kernel, iterations=1)
-        
         return combined_mask, individual_masks
     
     def separate_text_regions(self, img, individual_masks):
-        """分离每个文字区域"""
+        """分离每个文字区域（直接从原图的裁剪范围中提取）"""
         print("✂️ 分离文字区域...")
         
         text_regions = []
         
         for mask_info in individual_masks:
-            mask = mask_info['mask']
-            text = mask_info['text']
-            result_id = mask_info['id']
-            
-            # 提取文字区域
-            text_region = cv2.bitwise_and(img, img, mask=mask)
-            
-            # 找到文字区域的边界框
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                x, y, w, h = cv2.boundingRect(contours[0])
-                # 添加一些边距
-                margin = 10
-                x = max(0, x - margin)
-                y = max(0, y - margin)
-                w = min(img.shape[1] - x, w + 2 * margin)
-                h = min(img.shape[0] - y, h + 2 * margin)
-                
-                # 裁剪文字区域
-                cropped_text = text_region[y:y+h, x:x+w]
-                text_regions.append({
-                    'image': cropped_text,
-                    'text': text,
-                    'id': result_id,
-                    'position': (x, y, w, h)
-                })
+            text_regions.append({
+                'image': crop_region(img, mask_info['position'], mask_info['mask']),
+                'text': mask_info['text'],
+                'id': mask_info['id'],
+                'position': mask_info['position']
+            })
         
         return text_regions
     
-    def inpaint_image(self, img, combined_mask):
-        """使用多种方法修复图像"""
-        print("🎨 修复图像...")
-        
-        # 方法1: Navier-Stokes
-        inpainted_ns = cv2.inpaint(img, combined_mask, 7, cv2.INPAINT_NS)
-        
-        # 方法2: Telea
-        inpainted_telea = cv2.inpaint(img, combined_mask, 7, cv2.INPAINT_TELEA)
-        
-        # 方法3: 混合方法
-        inpainted_mixed = cv2.addWeighted(inpainted_ns, 0.6, inpainted_telea, 0.4, 0)
-        
-        return {
-            'ns': inpainted_ns,
-            'telea': inpainted_telea,
-            'mixed': inpainted_mixed
-        }
+    def inpaint_image(self, img, combined_mask, methods=INPAINT_METHODS):
+        """修复图像：只在文字区域周围的小块上计算，且只计算请求的方法 (ns / telea / mixed)"""
+        print(f"🎨 修复图像 ({', '.join(methods)})...")
+        return inpaint_regions(img, combined_mask, methods)
     
-    def create_visualization(self, img_rgb, valid_results):
-        """创建可视化图像"""
+    def create_visualization(self, img, valid_results):
+        """创建可视化图像（原图分辨率PNG字节）"""
         print("🎨 创建可视化图像...")
         
         try:
-            # 创建matplotlib图形（线程安全）
-            plt.ioff()  # 关闭交互模式
-            fig, ax = plt.subplots(1, 1, figsize=(15, 10))
-            ax.imshow(img_rgb)
-            
-            # 颜色列表
-            colors = ['red', 'green', 'blue', 'orange', 'purple', 'brown', 'pink', 'cyan']
-            
-            # 绘制检测框和文字标注
-            for result in valid_results:
-                bbox = result['bbox']
-                text = result['text']
-                confidence = result['confidence']
-                num = result['id']
-                
-                color = colors[(num-1) % len(colors)]
-                
-                # 绘制检测框
-                points = np.array(bbox)
-                x_coords = np.append(points[:, 0], points[0, 0])
-                y_coords = np.append(points[:, 1], points[0, 1])
-                ax.plot(x_coords, y_coords, color=color, linewidth=3)
-                
-                # 在检测框中心显示序号
-                center_x = np.mean(points[:, 0])
-                center_y = np.mean(points[:, 1])
-                ax.text(center_x, center_y, str(num), fontsize=18, fontweight='bold',
-                       ha='center', va='center', color='white',
-                       bbox=dict(boxstyle="circle,pad=0.3", facecolor=color, alpha=0.8))
-                
-                # 在检测框旁边显示识别的文字
-                text_x = np.max(points[:, 0]) + 10
-                text_y = np.min(points[:, 1])
-                
-                if text_x + len(text) * 8 > img_rgb.shape[1]:
-                    text_x = np.min(points[:, 0]) - len(text) * 8 - 10
-                
-                ax.text(text_x, text_y, f'{num}: {text}', fontsize=11, fontweight='bold',
-                       bbox=dict(boxstyle="round,pad=0.4", facecolor=color, alpha=0.9, edgecolor='black'),
-                       color='white' if color in ['blue', 'purple', 'brown'] else 'black')
-            
-            # 设置标题
-            ax.set_title(f'中文OCR识别结果 - 检测到 {len(valid_results)} 个文字', fontsize=16, pad=20)
-            ax.axis('off')
-            
-            # 保存到内存
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-            buffer.seek(0)
-            
-            return buffer.getvalue()
-            
+            canvas = fast_renderer.render_visualization(
+                img, valid_results, title=f'中文OCR识别结果 - 检测到 {len(valid_results)} 个文字')
+            return fast_renderer.encode_png(canvas)
         except Exception as e:
             print(f"❌ 创建可视化图像失败: {e}")
             # 返回空字节，调用者需要处理
             return b''
-        finally:
-            # 确保图形被关闭，防止内存泄漏
-            plt.close('all')
-    
-    def save_results(self, output_dir, base_name, img, img_rgb, valid_results, 
-                    combined_mask, text_regions, inpainted_results, visualization):
-        """保存所有结果"""
-        print(f"💾 保存结果到: {output_dir}")
-        print(f"💾 当前工作目录: {os.getcwd()}")
-        print(f"💾 输出目录绝对路径: {os.path.abspath(output_dir)}")
-        
-        file_paths = {}
-        
-        # 1. 保存可视化结果
-        viz_path = os.path.join(output_dir, f"{base_name}_visualization.png")
-        with open(viz_path, 'wb') as f:
-            f.write(visualization)
-        file_paths['visualization'] = viz_path
-        
-        # 2. 保存原图
-        original_path = os.path.join(output_dir, f"{base_name}_original.jpg")
-        cv2.imwrite(original_path, cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR))
-        file_paths['original'] = original_path
-        
-        # 3. 保存文字掩码
-        mask_path = os.path.join(output_dir, f"{base_name}_text_mask.jpg")
-        cv2.imwrite(mask_path, combined_mask)
-        file_paths['mask'] = mask_path
-        
-        # 4. 保存分离的文字区域
+    
+    def artifact_paths(self, output_dir, base_name, img_shape, valid_results):
+        """计算所有结果文件的路径（不生成文件）"""
         text_folder = os.path.join(output_dir, "separated_texts")
-        os.makedirs(text_folder, exist_ok=True)
+        repaired_folder = os.path.join(output_dir, "repaired_images")
         
         text_files = []
-        for region in text_regions:
-            safe_filename = f"{base_name}_text_{region['id']:02d}_pos_{region['position'][0]}_{region['position'][1]}.jpg"
-            file_path = os.path.join(text_folder, safe_filename)
-            cv2.imwrite(file_path, region['image'])
+        polygons = expand_polygons([result['bbox'] for result in valid_results])
+        for result, polygon in zip(valid_results, polygons):
+            position = region_rect(polygon, img_shape)
+            if position is None:
+                continue
+            safe_filename = f"{base_name}_text_{result['id']:02d}_pos_{position[0]}_{position[1]}.jpg"
             text_files.append({
-                'path': file_path,
+                'path': os.path.join(text_folder, safe_filename),
                 'filename': safe_filename,
-                'text': region['text'],
-                'id': region['id']
+                'text': result['text'],
+                'id': result['id']
             })
         
-        file_paths['text_regions'] = text_files
+        return {
+            'visualization': os.path.join(output_dir, f"{base_name}_visualization.png"),
+            'original': os.path.join(output_dir, f"{base_name}_original.jpg"),
+            'mask': os.path.join(output_dir, f"{base_name}_text_mask.jpg"),
+            'text_regions': text_files,
+            'repaired': {method: os.path.join(repaired_folder, f"{base_name}_repaired_{method}.jpg")
+                         for method in INPAINT_METHODS},
+            'info': os.path.join(output_dir, f"{base_name}_text_info.txt"),
+            'summary': os.path.join(output_dir, f"{base_name}_summary.png")
+        }
+    
+    @staticmethod
+    def artifact_files(file_paths):
+        """artifact_paths 返回的所有文件路径"""
+        paths = [file_paths[name] for name in ('visualization', 'original', 'mask', 'info', 'summary')]
+        paths.extend(file_paths['repaired'].values())
+        paths.extend(text_file['path'] for text_file in file_paths['text_regions'])
+        return paths
+    
+    def write_manifest(self, output_dir, base_name, source_path, valid_results, file_paths):
+        """保存生成结果文件所需的信息，供之后按需生成未请求的文件"""
+        manifest = {
+            'base_name': base_name,
+            'source': os.path.abspath(source_path) if source_path else None,
+            'valid_results': valid_results,
+            'files': file_paths
+        }
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+    
+    def save_results(self, output_dir, base_name, img, valid_results, file_paths, kinds, repaired_methods=None):
+        """生成并保存指定类型的结果文件，中间结果（掩码、修复图）只在需要时计算
+
+        repaired_methods: 只生成指定方法的修复图，默认生成 file_paths['repaired'] 中的全部方法
+        """
+        print(f"💾 保存结果到: {output_dir} ({', '.join(kinds)})")
         
-        # 5. 保存修复后的图像
-        repaired_folder = os.path.join(output_dir, "repaired_images")
-        os.makedirs(repaired_folder, exist_ok=True)
+        computed = {}
         
-        repaired_files = {}
-        for method, result in inpainted_results.items():
-            repaired_path = os.path.join(repaired_folder, f"{base_name}_repaired_{method}.jpg")
-            cv2.imwrite(repaired_path, result)
-            repaired_files[method] = repaired_path
+        def masks():
+            if 'masks' not in computed:
+                with metrics.timed('mask'):
+                    computed['masks'] = self.create_text_masks(img, valid_results)
+            return computed['masks']
         
-        file_paths['repaired'] = repaired_files
+        def inpainted(methods):
+            repaired = computed.setdefault('inpainted', {})
+            missing = [method for method in methods if method not in repaired]
+            if missing:
+                with metrics.timed('inpaint'):
+                    repaired.update(self.inpaint_image(img, masks()[0], missing))
+            return repaired
         
-        # 6. 保存文字信息
-        info_path = os.path.join(output_dir, f"{base_name}_text_info.txt")
+        for kind in kinds:
+            if kind == 'visualization':
+                with metrics.timed('visualize'):
+                    visualization = self.create_visualization(img, valid_results)
+                with metrics.timed('save'):
+                    write_atomic(file_paths['visualization'], visualization)
+            
+            elif kind == 'original':
+                with metrics.timed('save'):
+                    save_image(file_paths['original'], img)
+            
+            elif kind == 'mask':
+                mask = masks()[0]
+                with metrics.timed('save'):
+                    save_image(file_paths['mask'], mask)
+            
+            elif kind == 'regions':
+                individual_masks = masks()[1]
+                with metrics.timed('save'):
+                    os.makedirs(os.path.join(output_dir, "separated_texts"), exist_ok=True)
+                    region_paths = {text_file['id']: text_file['path'] for text_file in file_paths['text_regions']}
+                    for region in self.separate_text_regions(img, individual_masks):
+                        save_image(region_paths[region['id']], region['image'])
+            
+            elif kind == 'repaired':
+                methods = repaired_methods or list(file_paths['repaired'])
+                repaired = inpainted(methods)
+                with metrics.timed('save'):
+                    os.makedirs(os.path.join(output_dir, "repaired_images"), exist_ok=True)
+                    for method in methods:
+                        save_image(file_paths['repaired'][method], repaired[method])
+            
+            elif kind == 'info':
+                with metrics.timed('save'):
+                    self.save_text_info(file_paths['info'], valid_results, file_paths['text_regions'])
+            
+            elif kind == 'summary':
+                mask, repaired = masks()[0], inpainted(['mixed'])['mixed']
+                with metrics.timed('visualize'):
+                    self.create_summary_image(output_dir, base_name, img, mask, repaired, len(valid_results))
+    
+    def save_text_info(self, info_path, valid_results, text_files):
+        """保存文字信息"""
         print(f"📝 保存文字信息到: {info_path}")
         
         try:
-            with open(info_path, 'w', encoding='utf-8') as f:
-                f.write("图像文字识别结果\n")
-                f.write("=" * 40 + "\n")
-                f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"检测到的文字数量: {len(valid_results)}\n\n")
-                
-                f.write("文字识别详情:\n")
-                f.write("-" * 30 + "\n")
-                for result in valid_results:
-                    f.write(f"{result['id']:2d}. {result['text']} (置信度: {result['confidence']:.2f})\n")
-                
-                f.write(f"\n文件映射:\n")
-                f.write("-" * 30 + "\n")
-                for text_file in text_files:
-                    f.write(f"ID {text_file['id']}: {text_file['filename']} -> '{text_file['text']}'\n")
+            f = StringIO()
+            f.write("图像文字识别结果\n")
+            f.write("=" * 40 + "\n")
+            f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"检测到的文字数量: {len(valid_results)}\n\n")
+            
+            f.write("文字识别详情:\n")
+            f.write("-" * 30 + "\n")
+            for result in valid_results:
+                f.write(f"{result['id']:2d}. {result['text']} (置信度: {result['confidence']:.2f})\n")
+            
+            f.write(f"\n文件映射:\n")
+            f.write("-" * 30 + "\n")
+            for text_file in text_files:
+                f.write(f"ID {text_file['id']}: {text_file['filename']} -> '{text_file['text']}'\n")
+            write_atomic(info_path, f.getvalue().encode('utf-8'))
             
             print(f"✅ 文字信息文件已保存: {os.path.abspath(info_path)}")
-            print(f"📝 文件大小: {os.path.getsize(info_path)} 字节")
             
         except Exception as e:
             print(f"❌ 保存文字信息失败: {e}")
+    
+    def materialize_file(self, file_path):
+        """按需生成尚未生成的结果文件，成功返回True"""
+        # 文件位于结果目录或其子目录（separated_texts / repaired_images）中
+        target = os.path.abspath(file_path)
+        parent = os.path.dirname(target)
+        output_dir = next((d for d in (parent, os.path.dirname(parent))
+                           if os.path.exists(os.path.join(d, MANIFEST_NAME))), None)
+        if output_dir is None:
+            return False
         
-        file_paths['info'] = info_path
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
         
-        # 7. 创建概览图
-        summary_path = self.create_summary_image(output_dir, base_name, img_rgb, 
-                                                combined_mask, inpainted_results['mixed'], 
-                                                len(valid_results))
-        file_paths['summary'] = summary_path
+        # 根据路径确定文件类型
+        files = manifest['files']
+        kind = None
+        repaired_methods = None
+        for name in ('visualization', 'original', 'mask', 'info', 'summary'):
+            if os.path.abspath(files[name]) == target:
+                kind = name
+        for method, path in files['repaired'].items():
+            if os.path.abspath(path) == target:
+                # 只修复被请求的这一种方法
+                kind = 'repaired'
+                repaired_methods = [method]
+        if any(os.path.abspath(text_file['path']) == target for text_file in files['text_regions']):
+            kind = 'regions'
+        if kind is None:
+            return False
         
-        return file_paths
+        with ARTIFACT_LOCK:
+            # 其他请求可能已经生成了该文件
+            if os.path.exists(target):
+                return True
+            img = cv2.imread(manifest['source']) if manifest['source'] else None
+            if img is None:
+                print(f"❌ 无法按需生成 {kind}: 原图不存在 {manifest['source']}")
+                return False
+            print(f"🛠️ 按需生成结果文件: {kind}")
+            self.save_results(output_dir, manifest['base_name'], img,
+                              manifest['valid_results'], files, [kind], repaired_methods)
+            artifact_index.register_files(self.artifact_files(files))
+        retention.update(output_dir)
+        return os.path.exists(target)
     
     def create_summary_image(self, output_dir, base_name, original, mask, repaired, text_count):
-        """创建结果概览图"""
+        """创建结果概览图（original/repaired为BGR图像）"""
+        summary_path = os.path.join(output_dir, f"{base_name}_summary.png")
         try:
-            plt.ioff()  # 关闭交互模式
-            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-            
-            # 原图
-            axes[0,0].imshow(original)
-            axes[0,0].set_title('原始图像', fontsize=14)
-            axes[0,0].axis('off')
-            
-            # 掩码
-            axes[0,1].imshow(mask, cmap='gray')
-            axes[0,1].set_title(f'文字掩码 ({text_count}个文字)', fontsize=14)
-            axes[0,1].axis('off')
-            
-            # 修复结果
-            axes[1,0].imshow(cv2.cvtColor(repaired, cv2.COLOR_BGR2RGB))
-            axes[1,0].set_title('修复后图像', fontsize=14)
-            axes[1,0].axis('off')
-            
-            # 对比
-            comparison = np.hstack([original, cv2.cvtColor(repaired, cv2.COLOR_BGR2RGB)])
-            axes[1,1].imshow(comparison)
-            axes[1,1].set_title('修复前后对比', fontsize=14)
-            axes[1,1].axis('off')
-            
-            plt.tight_layout()
-            summary_path = os.path.join(output_dir, f"{base_name}_summary.png")
-            plt.savefig(summary_path, dpi=300, bbox_inches='tight')
-            
-            return summary_path
-            
+            summary = fast_renderer.render_summary(original, mask, repaired, text_count)
+            save_image(summary_path, summary, [cv2.IMWRITE_PNG_COMPRESSION, 1])
         except Exception as e:
             print(f"❌ 创建概览图失败: {e}")
             # 创建一个简单的替代图像
-            summary_path = os.path.join(output_dir, f"{base_name}_summary.png")
             simple_img = np.ones((400, 600, 3), dtype=np.uint8) * 255
             cv2.putText(simple_img, "Summary creation failed", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-            cv2.imwrite(summary_path, simple_img)
-            return summary_path
-        finally:
-            # 确保图形被关闭
-            plt.close('all')
+            save_image(summary_path, simple_img)
+        return summary_path
     
-    def process_image(self, image_path):
-        """完整的图像处理流程"""
+    def process_image(self, image, filename=None, outputs=None, source_path=None, image_bytes=None):
+        """完整的图像处理流程
+        
+        image: 图像路径或已解码的BGR图像
+        filename: 用于命名结果目录的文件名，默认取图像路径的文件名
+        outputs: 需要立即生成的结果文件类型（见 ARTIFACT_TYPES），None表示全部生成；
+                 未生成的文件仍返回路径，首次访问时再生成
+        source_path: 已保存在磁盘上的原图路径
+        image_bytes: 上传的原始图像数据；没有source_path且有未生成的文件时写入结果目录，供按需生成使用
+        """
         print("🚀 开始Web OCR处理流程")
         
         try:
             # 读取图像
-            img = cv2.imread(image_path)
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            if isinstance(image, str):
+                source_path = image
+                filename = filename or os.path.basename(image)
+                img = cv2.imread(image)
+            else:
+                img = image
             
             # 1. 检测和识别文字
-            valid_results = self.detect_and_recognize_text(image_path)
-            
-            if not valid_results:
-                return {
-                    'success': False,
-                    'message': '未检测到任何文字',
-                    'text_count': 0
-                }
-            
-            # 2. 创建文字掩码
-            combined_mask, individual_masks = self.create_text_masks(img, valid_results)
-            
-            # 3. 分离文字区域
-            text_regions = self.separate_text_regions(img, individual_masks)
-            
-            # 4. 修复图像
-            inpainted_results = self.inpaint_image(img, combined_mask)
+            valid_results = self.detect_and_recognize_text(img)
             
-            # 5. 创建可视化
-            visualization = self.create_visualization(img_rgb, valid_results)
-            
-            # 6. 保存结果
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            output_dir = self.create_output_directory(base_name)
-            file_paths = self.save_results(output_dir, base_name, img, img_rgb, 
-                                         valid_results, combined_mask, text_regions, 
-                                         inpainted_results, visualization)
-            
-            # 7. 准备响应数据
-            response = {
-                'success': True,
-                'text_count': len(valid_results),
-                'texts': [{'id': r['id'], 'text': r['text'], 'confidence': r['confidence']} 
-                         for r in valid_results],
-                'output_dir': output_dir,
-                'files': file_paths
-            }
-            
-            return response
+            return self.build_response(img, valid_results, filename, outputs, source_path, image_bytes)
             
         except Exception as e:
-            print(f"❌ 处理错误: {e}")
-            import traceback
-            traceback.print_exc()
+            return self.failure_response(e)
+    
+    def process_batch(self, images, outputs=None):
+        """批量处理一组图像：一起检测和识别（见 read_text），再逐张生成结果文件
+        
+        images: [(文件名, BGR图像, 原始图像数据), ...]
+        返回与输入顺序一致的结果列表
+        """
+        print(f"🚀 批量处理 {len(images)} 张图像")
+        
+        try:
+            with metrics.request_timer() as batch_timer:
+                batch_results = self.read_text([img for _, img, _ in images])
+        except Exception as e:
+            failure = self.failure_response(e)
+            return [dict(failure) for _ in images]
+        
+        responses = []
+        for (filename, img, image_bytes), results in zip(images, batch_results):
+            # 检测和识别为整批的耗时，total从整批开始计算
+            with metrics.request_timer(inherit=batch_timer) as timer:
+                try:
+                    valid_results = self.filter_results(results)
+                    response = self.build_response(img, valid_results, filename, outputs,
+                                                   image_bytes=image_bytes)
+                except Exception as e:
+                    response = self.failure_response(e)
+            response['timings'] = timer.as_dict(batch_size=len(images))
+            responses.append(response)
+        return responses
+    
+    def build_response(self, img, valid_results, filename, outputs=None, source_path=None, image_bytes=None):
+        """创建输出目录、生成请求的结果文件并准备响应数据（参数含义同 process_image）"""
+        if not valid_results:
             return {
                 'success': False,
-                'message': f'处理失败: {str(e)}',
+                'message': '未检测到任何文字',
                 'text_count': 0
             }
+        
+        kinds = [kind for kind in ARTIFACT_TYPES if outputs is None or kind in outputs]
+        deferred = [kind for kind in ARTIFACT_TYPES if kind not in kinds]
+        
+        # 2. 创建输出目录并记录生成结果文件所需的信息
+        base_name, ext = os.path.splitext(filename)
+        output_dir = self.create_output_directory(base_name)
+        file_paths = self.artifact_paths(output_dir, base_name, img.shape, valid_results)
+        if deferred and source_path is None and image_bytes is not None:
+            # 原图只在内存中：保存原始上传数据（不重新编码），供之后按需生成文件
+            source_path = os.path.join(output_dir, f"{base_name}_source{ext or '.img'}")
+            with open(source_path, 'wb') as f:
+                f.write(image_bytes)
+        self.write_manifest(output_dir, base_name, source_path, valid_results, file_paths)
+        
+        # 3. 生成请求的结果文件（掩码、图像修复、可视化等）
+        self.save_results(output_dir, base_name, img, valid_results, file_paths, kinds)
+        artifact_index.register_files(self.artifact_files(file_paths))
+        
+        # 4. 准备响应数据
+        with metrics.timed('layout'):
+            layout = analyze_layout(valid_results)
+        response = {
+            'success': True,
+            'text_count': len(valid_results),
+            'texts': [{'id': r['id'], 'text': r['text'], 'confidence': r['confidence']} 
+                     for r in valid_results],
+            # 文字行/段落及阅读顺序（lines[].box_ids 对应 texts[].id）
+            'layout': layout,
+            'output_dir': output_dir,
+            'files': file_paths,
+            'deferred': deferred
+        }
+        retention.update(output_dir)
+        
+        return response
+    
+    @staticmethod
+    def failure_response(e):
+        """记录异常并返回处理失败的响应"""
+        print(f"❌ 处理错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'success': False,
+            'message': f'处理失败: {str(e)}',
+            'text_count': 0
+        }
+
+# OCR处理器在第一次使用时创建（easyocr会导入torch，加载需要数秒）
+_ocr_processor = None
+_ocr_processor_lock = threading.Lock()
+_load_error = None
+
+def get_ocr_processor():
+    """返回OCR处理器，第一次调用时加载模型（多个线程同时调用时只加载一次）"""
+    global _ocr_processor
+    if _ocr_processor is None:
+        with _ocr_processor_lock:
+            if _ocr_processor is None:
+                _ocr_processor = WebOCRProcessor()
+    return _ocr_processor
+
+def load_and_warm_up():
+    """加载并预热模型（后台线程），加载失败时记录错误供 /readyz 返回；推理进程不可用时定期重试"""
+    global _load_error
+    while True:
+        try:
+            processor = get_ocr_processor()
+            break
+        except Exception as e:
+            _load_error = str(e)
+            print(f"❌ OCR初始化失败: {e}")
+            if not OCR_SIDECAR_SOCKET:
+                return
+            time.sleep(SIDECAR_RETRY_SECONDS)
+    _load_error = None
+    processor.warm_up()
 
-# 初始化OCR处理器
-ocr_processor = WebOCRProcessor()
+def processor_status(check_sidecar=False):
+    """模型加载和预热状态，模型尚未加载完成时不触发加载（check_sidecar 见 WebOCRProcessor.status）"""
+    if _ocr_processor is None:
+        return {'ready': False, 'engine': OCR_ENGINE, 'load_seconds': None,
+                'warmup_seconds': None, 'warmup_error': _load_error}
+    return _ocr_processor.status(check_sidecar)
+
+def _start_warmup_thread():
+    threading.Thread(target=load_and_warm_up, name='ocr-warmup', daemon=True).start()
+
+# 在后台线程中加载并预热模型（每个进程一次），服务立即开始监听，完成前 /readyz 返回503
+start_warmup = OncePerProcess(_start_warmup_thread)
+
+# 导入本模块不启动后台加载（batch_processor等命令行工具在第一次识别时同步加载）；
+# 服务由 __main__、gunicorn 的 post_worker_init（见 gunicorn.conf.py）或第一个请求启动加载和预热
+
+# 结果目录、保存的上传图片和缓存的压缩包按过期时间和总大小上限定期清理（0为不限制）
+retention = ResultRetention(
+    [RESULTS_FOLDER, UPLOAD_FOLDER, ZIP_CACHE_FOLDER],
+    max_age=int(os.environ.get('RESULTS_MAX_AGE', 24 * 3600)),
+    max_bytes=int(os.environ.get('RESULTS_MAX_MB', 2048)) * 1024 * 1024,
+    interval=int(os.environ.get('RESULTS_CLEANUP_INTERVAL', 300)),
+    on_evict=artifact_index.remove_job
+)
+
+# 识别结果缓存（models/model-config.json 中 defaultSettings.enableCache 控制是否启用）；
+# 条目中结果文件的大小取自结果保留索引（生成结果时已测量）
+result_cache = None
+if DEFAULT_SETTINGS.get('enableCache', False):
+    result_cache = OCRResultCache(
+        max_entries=int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 256)),
+        max_bytes=int(os.environ.get('OCR_CACHE_MAX_MB', 512)) * 1024 * 1024,
+        max_age=int(os.environ.get('OCR_CACHE_MAX_AGE', 24 * 3600)),
+        artifact_size=retention.size
+    )
 
 @app.route('/')
 def index():
@@ -483,26 +805,15 @@ def favicon():
 
 @app.route('/api/debug/files')
 def debug_files():
-    """调试：列出当前目录和results目录的文件"""
+    """调试：列出结果目录和上传文件（从保留索引读取，不遍历文件系统）"""
     try:
-        debug_info = {
+        return jsonify({
             'current_dir': os.getcwd(),
-            'current_files': os.listdir('.'),
-        }
-        
-        if os.path.exists(RESULTS_FOLDER):
-            debug_info['results_dir'] = os.path.abspath(RESULTS_FOLDER)
-            debug_info['results_files'] = []
-            for root, dirs, files in os.walk(RESULTS_FOLDER):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    debug_info['results_files'].append({
-                        'path': file_path,
-                        'size': os.path.getsize(file_path),
-                        'exists': os.path.exists(file_path)
-                    })
-        
-        return jsonify(debug_info)
+            'results_dir': os.path.abspath(RESULTS_FOLDER),
+            'retention': {'max_age': retention.max_age, 'max_bytes': retention.max_bytes, **retention.stats()},
+            'results': retention.list_entries(RESULTS_FOLDER),
+            'uploads': retention.list_entries(UPLOAD_FOLDER)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -510,53 +821,229 @@ def debug_files():
 def serve_static(filename):
     return send_from_directory('.', filename)
 
+def add_file_urls(result):
+    """为处理结果中的文件路径添加前端访问URL"""
+    # 转换文件路径为相对路径，供前端访问（使用正斜杠）
+    def fix_path(path):
+        # 将Windows路径转换为URL路径
+        rel_path = os.path.relpath(path, '.')
+        return rel_path.replace('\\', '/')
+    
+    result['files']['visualization_url'] = f"/api/file/{fix_path(result['files']['visualization'])}"
+    result['files']['original_url'] = f"/api/file/{fix_path(result['files']['original'])}"
+    result['files']['mask_url'] = f"/api/file/{fix_path(result['files']['mask'])}"
+    result['files']['summary_url'] = f"/api/file/{fix_path(result['files']['summary'])}"
+    result['files']['info_url'] = f"/api/file/{fix_path(result['files']['info'])}"
+    
+    # 处理修复图像URL
+    result['files']['repaired_urls'] = {}
+    for method, path in result['files']['repaired'].items():
+        result['files']['repaired_urls'][method] = f"/api/file/{fix_path(path)}"
+    
+    # 处理文字区域URL
+    result['files']['text_region_urls'] = []
+    for text_file in result['files']['text_regions']:
+        result['files']['text_region_urls'].append({
+            'id': text_file['id'],
+            'text': text_file['text'],
+            'filename': text_file['filename'],
+            'url': f"/api/file/{fix_path(text_file['path'])}"
+        })
+
+def validate_upload():
+    """检查请求中的上传文件，返回 (file, 错误响应)"""
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return None, {'success': False, 'message': f'文件过大，最大 {MAX_UPLOAD_MB}MB'}
+    
+    if 'image' not in files:
+        return None, {'success': False, 'message': '没有上传文件'}
+    
+    file = files['image']
+    if file.filename == '':
+        return None, {'success': False, 'message': '文件名为空'}
+    
+    return file, None
+
+def lookup_cached_result(image_bytes, filename, outputs=None):
+    """查询结果缓存，返回 (cache_key, 缓存结果)；缓存的结果缺少 outputs 中的文件类型时不命中"""
+    if result_cache is None:
+        return None, None
+    
+    with metrics.request_timer() as timer:
+        with metrics.timed('cache'):
+            cache_key = OCRResultCache.make_key(image_bytes, **get_ocr_processor().cache_params())
+            cached = result_cache.get(cache_key, outputs)
+    if cached is not None:
+        print(f"⚡ 命中结果缓存: {filename}")
+        cached['cached'] = True
+        cached['timings'] = timer.as_dict()
+    return cache_key, cached
+
+def upload_filename(file):
+    """上传图片的命名（时间戳前缀），同时用于结果目录"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{file.filename}"
+
+def save_upload(filename, image_bytes):
+    """保存上传的图片，返回保存路径"""
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    with open(file_path, 'wb') as f:
+        f.write(image_bytes)
+    retention.update(file_path)
+    return file_path
+
+def decode_image(image_bytes):
+    """在内存中解码图片数据为BGR图像，无法解码时返回None"""
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+def parse_outputs(value=None):
+    """解析 outputs 参数（逗号分隔，默认读取请求参数），未指定或为all时返回None表示全部生成"""
+    if value is None:
+        value = request.values.get('outputs', '')
+    value = value.strip()
+    if not value or value == 'all':
+        return None
+    return [kind.strip() for kind in value.split(',') if kind.strip() in ARTIFACT_TYPES]
+
+def run_ocr(image_bytes, filename, cache_key=None, outputs=None):
+    """解码上传的图片，运行完整的OCR处理流程并生成访问URL（timings为各阶段耗时）"""
+    with metrics.request_timer() as timer:
+        with metrics.timed('decode'):
+            img = decode_image(image_bytes)
+        if img is None:
+            return {'success': False, 'message': '无法解析图像文件', 'text_count': 0}
+        
+        if SAVE_UPLOADS:
+            with metrics.timed('save'):
+                source_path = save_upload(filename, image_bytes)
+            result = get_ocr_processor().process_image(img, filename, outputs, source_path=source_path)
+        else:
+            result = get_ocr_processor().process_image(img, filename, outputs, image_bytes=image_bytes)
+    result['timings'] = timer.as_dict()
+    
+    if result['success']:
+        add_file_urls(result)
+        if cache_key is not None:
+            result_cache.put(cache_key, result)
+    
+    return result
+
+def run_batch_ocr(items, outputs=None, chunk_size=BATCH_CHUNK_SIZE):
+    """批量OCR：items 为 (文件名, 图片数据) 的可迭代对象，按块读取；
+    命中缓存的图片直接返回，其余整块一起推理，逐张产出结果（含 filename）
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    index = 0
+    for chunk in chunked(items, chunk_size):
+        pending = []
+        for name, image_bytes in chunk:
+            index += 1
+            cache_key, cached = lookup_cached_result(image_bytes, name, outputs)
+            if cached is not None:
+                cached['filename'] = name
+                yield cached
+                continue
+            with metrics.timed('decode'):
+                img = decode_image(image_bytes)
+            if img is None:
+                yield {'filename': name, 'success': False, 'message': '无法解析图像文件', 'text_count': 0}
+                continue
+            # 同一批中可能有同名图片（不同目录），用序号区分结果目录
+            filename = f"{timestamp}_{index:05d}_{os.path.basename(name)}"
+            pending.append((name, filename, img, image_bytes, cache_key))
+        
+        if not pending:
+            continue
+        responses = get_ocr_processor().process_batch(
+            [(filename, img, image_bytes) for _, filename, img, image_bytes, _ in pending], outputs)
+        for (name, _, _, _, cache_key), result in zip(pending, responses):
+            if result['success']:
+                add_file_urls(result)
+                if cache_key is not None:
+                    result_cache.put(cache_key, result)
+            result['filename'] = name
+            yield result
+
+# 异步任务队列：后台线程运行OCR，HTTP worker只负责入队和查询
+job_queue = OCRJobQueue(
+    handler=lambda payload: run_ocr(**payload),
+    workers=int(os.environ.get('OCR_JOB_WORKERS', 2)),
+    max_pending=int(os.environ.get('OCR_JOB_QUEUE_SIZE', 16)),
+    jobs_dir=os.path.join(RESULTS_FOLDER, '_jobs'),
+    # 任务状态文件与结果目录保留相同的时间
+    file_max_age=retention.max_age
+)
+
+def cache_stat(name):
+    """结果缓存统计值，未启用缓存时返回None"""
+    return result_cache.stats()[name] if result_cache is not None else None
+
+metrics.register_gauge('ocr_model_load_seconds', 'OCR模型加载耗时（秒）', lambda: processor_status()['load_seconds'])
+metrics.register_gauge('ocr_model_warmup_seconds', 'OCR模型预热耗时（秒）', lambda: processor_status()['warmup_seconds'])
+metrics.register_gauge('ocr_ready', '模型已加载并完成预热', lambda: int(processor_status()['ready']))
+metrics.register_gauge('ocr_job_queue_depth', '等待处理的异步任务数', job_queue.pending_count)
+metrics.register_gauge('ocr_cache_hits_total', '结果缓存命中次数', lambda: cache_stat('hits'), 'counter')
+metrics.register_gauge('ocr_cache_misses_total', '结果缓存未命中次数', lambda: cache_stat('misses'), 'counter')
+metrics.register_gauge('ocr_cache_hit_ratio', '结果缓存命中率', lambda: cache_stat('hit_rate'))
+metrics.register_gauge('ocr_cache_entries', '结果缓存条目数', lambda: cache_stat('entries'))
+metrics.register_gauge('ocr_cache_bytes', '结果缓存占用字节数', lambda: cache_stat('bytes'))
+metrics.register_gauge('ocr_results_entries', '保留的结果目录和文件数', lambda: retention.stats()['entries'])
+metrics.register_gauge('ocr_results_bytes', '保留的结果文件占用字节数', lambda: retention.stats()['bytes'])
+metrics.register_gauge('ocr_results_evicted_total', '已清理的结果目录和文件数',
+                       lambda: retention.stats()['evicted'], 'counter')
+
+@app.before_request
+def start_request_timer():
+    request.environ['ocr.request_start'] = time.perf_counter()
+    retention.ensure_started()
+    start_warmup()
+
+@app.after_request
+def record_request_time(response):
+    """按接口统计请求耗时（流式响应只统计到开始返回为止）"""
+    start = request.environ.get('ocr.request_start')
+    if start is not None and request.endpoint:
+        metrics.REQUEST_SECONDS.observe(request.endpoint, time.perf_counter() - start)
+    return response
+
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能处理请求即返回200"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """就绪检查：模型已加载并完成预热（且推理进程存活）时返回200，否则返回503（负载均衡器据此决定是否转发请求）"""
+    status = processor_status(check_sidecar=True)
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus格式的性能指标"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/upload', methods=['POST'])
 def upload_image():
     """处理图片上传和OCR识别"""
     try:
-        if 'image' not in request.files:
-            return jsonify({'success': False, 'message': '没有上传文件'})
+        file, error = validate_upload()
+        if error:
+            return jsonify(error)
         
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'success': False, 'message': '文件名为空'})
+        # 相同图片和参数直接返回缓存结果
+        image_bytes = file.read()
+        outputs = parse_outputs()
+        cache_key, cached = lookup_cached_result(image_bytes, file.filename, outputs)
+        if cached is not None:
+            return jsonify(cached)
         
-        # 保存上传的图片
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-        
-        # 处理图片
-        result = ocr_processor.process_image(file_path)
-        
-        if result['success']:
-            # 转换文件路径为相对路径，供前端访问（使用正斜杠）
-            def fix_path(path):
-                # 将Windows路径转换为URL路径
-                rel_path = os.path.relpath(path, '.')
-                return rel_path.replace('\\', '/')
-            
-            result['files']['visualization_url'] = f"/api/file/{fix_path(result['files']['visualization'])}"
-            result['files']['original_url'] = f"/api/file/{fix_path(result['files']['original'])}"
-            result['files']['mask_url'] = f"/api/file/{fix_path(result['files']['mask'])}"
-            result['files']['summary_url'] = f"/api/file/{fix_path(result['files']['summary'])}"
-            result['files']['info_url'] = f"/api/file/{fix_path(result['files']['info'])}"
-            
-            # 处理修复图像URL
-            result['files']['repaired_urls'] = {}
-            for method, path in result['files']['repaired'].items():
-                result['files']['repaired_urls'][method] = f"/api/file/{fix_path(path)}"
-            
-            # 处理文字区域URL
-            result['files']['text_region_urls'] = []
-            for text_file in result['files']['text_regions']:
-                result['files']['text_region_urls'].append({
-                    'id': text_file['id'],
-                    'text': text_file['text'],
-                    'filename': text_file['filename'],
-                    'url': f"/api/file/{fix_path(text_file['path'])}"
-                })
+        # 在内存中解码并处理
+        result = run_ocr(image_bytes, upload_filename(file), cache_key, outputs)
         
         return jsonify(result)
         
@@ -564,93 +1051,179 @@ def upload_image():
         print(f"❌ 上传处理错误: {e}")
         return jsonify({'success': False, 'message': f'处理失败: {str(e)}'})
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """提交异步OCR任务，立即返回任务ID"""
+    try:
+        file, error = validate_upload()
+        if error:
+            return jsonify(error), 400
+        
+        image_bytes = file.read()
+        outputs = parse_outputs()
+        cache_key, cached = lookup_cached_result(image_bytes, file.filename, outputs)
+        if cached is not None:
+            job_id = job_queue.add_finished(cached)
+            return jsonify({'success': True, 'job_id': job_id, 'status': 'done'})
+        
+        try:
+            job_id = job_queue.submit({'image_bytes': image_bytes, 'filename': upload_filename(file),
+                                       'cache_key': cache_key, 'outputs': outputs})
+        except QueueFullError as e:
+            # 队列已满：拒绝新任务，由客户端稍后重试
+            print(f"⚠️ {e}")
+            response = jsonify({'success': False, 'message': '服务繁忙，请稍后重试'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        
+        print(f"🧾 任务已入队: {job_id} (等待中: {job_queue.pending_count()})")
+        return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+        
+    except Exception as e:
+        print(f"❌ 任务提交错误: {e}")
+        return jsonify({'success': False, 'message': f'提交失败: {str(e)}'}), 500
+
+@app.route('/api/batch', methods=['POST'])
+def batch_upload():
+    """批量OCR：上传多张图片(images字段)和/或zip压缩包(archive字段)，以NDJSON逐行返回每张图片的结果"""
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'message': f'文件过大，最大 {MAX_UPLOAD_MB}MB'}), 413
+    
+    # 上传的文件在响应开始流式返回前就会被关闭，先取出数据（已在内存中）
+    uploads = [(file.filename, file.read()) for file in files.getlist('images') if file.filename]
+    archives = [BytesIO(file.read()) for file in files.getlist('archive') if file.filename]
+    if not uploads and not archives:
+        return jsonify({'success': False, 'message': '没有上传文件'}), 400
+    outputs = parse_outputs()
+    
+    def items():
+        yield from uploads
+        for archive in archives:
+            yield from iter_zip_images(archive)
+    
+    def generate():
+        start = time.time()
+        total = succeeded = 0
+        try:
+            for result in run_batch_ocr(items(), outputs):
+                total += 1
+                succeeded += bool(result['success'])
+                yield to_ndjson(result)
+        except Exception as e:
+            print(f"❌ 批量处理错误: {e}")
+            yield to_ndjson({'success': False, 'message': f'批量处理中断: {str(e)}'})
+        yield to_ndjson(batch_summary(total, succeeded, time.time() - start))
+    
+    print(f"📚 批量处理: {len(uploads)} 张图片, {len(archives)} 个压缩包")
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """查询任务状态"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    
+    job.pop('result', None)
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    """获取任务结果；任务未完成时返回202"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    
+    if job['status'] == 'done':
+        return jsonify(job['result'])
+    if job['status'] == 'failed':
+        return jsonify({'success': False, 'message': f"处理失败: {job['error']}"}), 500
+    return jsonify({'job_id': job_id, 'status': job['status']}), 202
+
+def send_artifact(entry):
+    """发送索引中的结果文件：支持 If-None-Match（304）和 Range，可被浏览器长期缓存"""
+    if request.if_none_match.contains(entry['etag']):
+        response = Response(status=304)
+    else:
+        mimetype = mimetypes.guess_type(entry['path'])[0] or 'application/octet-stream'
+        response = Response(wrap_file(request.environ, open(entry['path'], 'rb')),
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = entry['size']
+        response.last_modified = entry['mtime']
+    response.set_etag(entry['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = FILE_MAX_AGE
+    if response.status_code == 304:
+        return response
+    return response.make_conditional(request, accept_ranges=True, complete_length=entry['size'])
+
 @app.route('/api/file/<path:filename>')
 def serve_file(filename):
-    """提供文件下载服务"""
+    """提供结果文件：先查文件索引；未登记时（其他worker生成或服务重启前的结果）登记后发送，
+    尚未生成的文件按需生成"""
+    file_path = filename.replace('/', os.sep)
     try:
-        # 将URL路径转换为系统路径
-        file_path = filename.replace('/', os.sep)
-        print(f"📁 请求文件: {filename}")
-        print(f"📁 转换后路径: {file_path}")
-        
-        # 尝试多个可能的位置
-        possible_paths = [
-            file_path,                                    # 原始路径
-            os.path.join('.', file_path),                # 当前目录
-            os.path.abspath(file_path),                  # 绝对路径
-            os.path.join(os.getcwd(), file_path),        # 工作目录
-        ]
-        
-        for test_path in possible_paths:
-            print(f"📁 测试路径: {test_path}")
-            if os.path.exists(test_path):
-                print(f"✅ 找到文件: {test_path}")
-                return send_file(os.path.abspath(test_path))
-        
-        print(f"❌ 在所有可能位置都找不到文件: {filename}")
-        print(f"📁 当前工作目录: {os.getcwd()}")
-        print(f"📁 当前目录内容: {os.listdir('.')}")
-        
-        return jsonify({'error': f'文件不存在: {filename}'}), 404
+        entry = artifact_index.lookup(file_path) or artifact_index.register(file_path)
+        if entry is None and artifact_index.split(file_path) is not None:
+            # 未请求立即生成的结果文件，首次访问时生成
+            if get_ocr_processor().materialize_file(file_path):
+                entry = artifact_index.register(file_path)
+        if entry is None:
+            return jsonify({'error': f'文件不存在: {filename}'}), 404
+        try:
+            return send_artifact(entry)
+        except FileNotFoundError:
+            # 文件已被清理
+            artifact_index.discard(file_path)
+            return jsonify({'error': f'文件不存在: {filename}'}), 404
         
     except Exception as e:
         print(f"❌ 文件服务错误: {e}")
         return jsonify({'error': str(e)}), 404
 
+def find_output_dir(output_dir):
+    """解析下载请求中的输出目录（如 results/xxx_时间戳），只允许results下的目录"""
+    name = os.path.basename(os.path.normpath(output_dir.replace('\\', '/')))
+    actual_dir = os.path.join(RESULTS_FOLDER, name)
+    return actual_dir if name not in ('', '.', '..') and os.path.isdir(actual_dir) else None
+
+def record_zip(actual_dir):
+    def on_complete(file_count, size, elapsed):
+        metrics.record('zip', elapsed)
+        print(f"📦 打包完成: {actual_dir}，{file_count} 个文件，{size} 字节，耗时 {elapsed:.2f}s")
+    return on_complete
+
 @app.route('/api/download/<path:output_dir>')
 def download_results(output_dir):
-    """打包下载所有结果"""
+    """打包下载所有结果：边读取文件边输出zip数据，不生成临时压缩包"""
     try:
-        print(f"📦 开始打包下载: {output_dir}")
-        
-        # 解析输出目录路径（处理URL编码的路径）
-        output_dir = output_dir.replace('/', os.sep)
-        
-        # 尝试多个可能的路径
-        possible_dirs = [
-            output_dir,
-            os.path.join('.', output_dir),
-            os.path.join(RESULTS_FOLDER, os.path.basename(output_dir)),
-            os.path.join('.', RESULTS_FOLDER, os.path.basename(output_dir))
-        ]
-        
-        actual_dir = None
-        for test_dir in possible_dirs:
-            print(f"📦 测试目录: {test_dir}")
-            if os.path.exists(test_dir):
-                actual_dir = test_dir
-                print(f"✅ 找到输出目录: {actual_dir}")
-                break
-        
+        actual_dir = find_output_dir(output_dir)
         if not actual_dir:
             print(f"❌ 找不到输出目录: {output_dir}")
-            print(f"📦 当前工作目录: {os.getcwd()}")
-            print(f"📦 当前目录内容: {os.listdir('.')}")
-            if os.path.exists(RESULTS_FOLDER):
-                print(f"📦 results目录内容: {os.listdir(RESULTS_FOLDER)}")
             return jsonify({'error': f'输出目录不存在: {output_dir}'}), 404
         
-        # 创建ZIP文件
-        zip_filename = f"{os.path.basename(actual_dir)}_results.zip"
-        zip_path = os.path.join('.', zip_filename)
-        
-        print(f"📦 创建ZIP文件: {zip_path}")
-        
-        file_count = 0
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(actual_dir):
-                print(f"📦 处理目录: {root}")
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, actual_dir)
-                    print(f"📦 添加文件: {file_path} -> {arcname}")
-                    zipf.write(file_path, arcname)
-                    file_count += 1
+        zip_filename = f"{os.path.basename(os.path.normpath(actual_dir))}_results.zip"
+        entries = zip_stream.list_entries(actual_dir)
+        chunks = zip_stream.stream_zip(entries, on_complete=record_zip(actual_dir))
         
-        print(f"📦 ZIP文件创建完成，包含 {file_count} 个文件")
-        print(f"📦 ZIP文件大小: {os.path.getsize(zip_path)} 字节")
+        # 设置 ZIP_CACHE_FOLDER 时保存完整的压缩包，目录内容未变化时直接发送
+        if ZIP_CACHE_FOLDER:
+            prefix = zip_filename[:-len('.zip')]
+            cache_path = os.path.join(ZIP_CACHE_FOLDER, f"{prefix}_{zip_stream.tree_version(actual_dir, entries)}.zip")
+            if os.path.exists(cache_path):
+                print(f"📦 使用已缓存的压缩包: {cache_path}")
+                return send_file(os.path.abspath(cache_path), as_attachment=True, download_name=zip_filename)
+            for name in os.listdir(ZIP_CACHE_FOLDER):
+                if name.startswith(prefix + '_') and name.endswith('.zip'):
+                    os.remove(os.path.join(ZIP_CACHE_FOLDER, name))
+            chunks = zip_stream.tee_to_file(chunks, cache_path)
         
-        return send_file(os.path.abspath(zip_path), as_attachment=True, download_name=zip_filename)
+        print(f"📦 开始打包下载: {actual_dir}（{len(entries)} 个文件）")
+        # 文件名可能包含中文，按RFC 5987附带UTF-8编码的文件名
+        disposition = f"attachment; filename=\"{quote(zip_filename)}\"; filename*=UTF-8''{quote(zip_filename)}"
+        return Response(chunks, mimetype='application/zip', headers={'Content-Disposition': disposition})
         
     except Exception as e:
         print(f"❌ 打包下载错误: {e}")
@@ -665,4 +1238,5 @@ if __name__ == '__main__':
     
     # 支持云平台动态端口（用于Railway、Render等部署）
     port = int(os.environ.get('PORT', 5000))
+    start_warmup()
     app.run(debug=False if os.environ.get('PORT') else True, host='0.0.0.0', port=port) 
\ No newline at end of file
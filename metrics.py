@@ -0,0 +1,146 @@
+"""
+性能指标 - 各处理阶段的耗时直方图和服务运行状态，以Prometheus文本格式从 /metrics 输出
+
+    with metrics.timed('inpaint'):
+        ...
+
+阶段耗时写入进程内的直方图；当前线程上有 StageTimer（见 request_timer）时同时累加到其中，
+随每次识别的响应返回（timings 字段）。gunicorn多worker时每个进程各自统计。
+"""
+import time
+import threading
+import contextlib
+
+# 处理阶段: 解码 / 缓存查询 / 检测+识别总耗时（含推理进程通信）/ 检测 / 识别 / 版面分析 /
+#          掩码 / 图像修复 / 可视化 / 写文件 / 打包下载
+STAGES = ('decode', 'cache', 'ocr', 'detect', 'recognize', 'layout',
+          'mask', 'inpaint', 'visualize', 'save', 'zip')
+# 直方图桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# 所有直方图（创建时自动登记，按创建顺序输出）
+_histograms = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    """按单个标签分组的直方图（线程安全）"""
+
+    def __init__(self, name, help_text, label_name, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = buckets
+        self._series = {}  # 标签值 -> [各桶计数, 总和, 次数]
+        self._lock = threading.Lock()
+        _histograms.append(self)
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.setdefault(label, [[0] * len(self.buckets), 0.0, 0])
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label, (counts, total, count) in sorted(self._series.items()):
+                for upper, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels([(self.label_name, label), ('le', upper)])
+                    lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+                labels = _format_labels([(self.label_name, label), ('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels([(self.label_name, label)])
+                lines.append(f'{self.name}_sum{labels} {total:.6f}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('ocr_stage_duration_seconds', '各处理阶段耗时', 'stage')
+REQUEST_SECONDS = Histogram('ocr_http_request_duration_seconds', 'HTTP请求耗时', 'endpoint')
+
+# 名称 -> (类型, 说明, 返回当前值的函数)；由服务在启动时注册
+_gauges = {}
+_local = threading.local()
+
+
+def register_gauge(name, help_text, getter, metric_type='gauge'):
+    """注册在输出 /metrics 时才读取的指标（队列长度、缓存命中等），getter返回None时不输出"""
+    _gauges[name] = (metric_type, help_text, getter)
+
+
+class StageTimer:
+    """一次识别请求（或一批图片）中各阶段的累计耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    def add(self, stage, elapsed):
+        self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+
+    def as_dict(self, **extra):
+        """各阶段耗时（秒），total为计时开始到现在的总耗时"""
+        result = {stage: round(self.timings[stage], 4) for stage in STAGES if stage in self.timings}
+        result.update(extra)
+        result['total'] = round(time.perf_counter() - self.started, 4)
+        return result
+
+
+@contextlib.contextmanager
+def request_timer(inherit=None):
+    """在当前线程上收集阶段耗时，嵌套使用时由最内层的计时器收集
+
+    inherit: 沿用另一个计时器的开始时间和已记录的耗时（如批量处理中整批共享的检测和识别）
+    """
+    timer = StageTimer()
+    if inherit is not None:
+        timer.started = inherit.started
+        timer.timings.update(inherit.timings)
+    previous = getattr(_local, 'timer', None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+def record(stage, elapsed):
+    """记录一个阶段的耗时"""
+    STAGE_SECONDS.observe(stage, elapsed)
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.add(stage, elapsed)
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """统计代码块的耗时（异常退出时同样记录）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def render():
+    """Prometheus文本格式的全部指标"""
+    lines = [line for histogram in _histograms for line in histogram.render()]
+    for name, (metric_type, help_text, getter) in sorted(_gauges.items()):
+        try:
+            value = getter()
+        except Exception:
+            value = None
+        if value is None:
+            continue
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,121 @@
+"""
+微批处理 - 将并发请求的推理工作在一个很短的时间窗口内收集起来，合并为一次批量推理后再分发结果
+多个用户同时上传时，各请求不再分别以batch=1推理；单个请求最多多等待一个时间窗口。
+
+    batcher = MicroBatcher(engine.detect_batch, window=0.01, max_items=8, name='detect')
+    boxes = batcher.submit(imgs)   # 与 engine.detect_batch(imgs) 的结果相同
+"""
+import time
+import queue
+import threading
+
+import metrics
+from process_local import OncePerProcess
+
+# models/model-config.json 中 defaultSettings.microBatching 的默认值
+DEFAULT_BATCHING_SETTINGS = {
+    'enabled': True,
+    'windowMs': 10,     # 收到第一份工作后等待其他请求的最长时间（毫秒）
+    'maxImages': 8,     # 每次合并检测的最大图像数
+    'maxCrops': 256,    # 每次合并识别的最大文字区域数
+}
+
+BATCH_ITEMS = metrics.Histogram('ocr_microbatch_items', '每次合并推理的图像/文字区域数', 'stage',
+                                buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+BATCH_REQUESTS = metrics.Histogram('ocr_microbatch_requests', '每次合并推理包含的请求数', 'stage',
+                                   buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32))
+
+
+def batching_settings(settings):
+    """合并配置中的微批处理设置与默认值"""
+    merged = dict(DEFAULT_BATCHING_SETTINGS)
+    merged.update(settings.get('microBatching') or {})
+    return merged
+
+
+class _Work:
+    def __init__(self, items):
+        self.items = items
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """在后台线程中合并多个调用方提交的工作（线程安全）
+
+    handler: 接收一个列表、返回等长结果列表的批量函数，只在后台线程中调用
+    window: 收到第一份工作后继续收集的秒数
+    max_items: 一次合并的元素数上限（单次提交超过上限时单独处理，不拆分）
+    """
+
+    def __init__(self, handler, window=0.01, max_items=8, name='batch'):
+        self.handler = handler
+        self.window = window
+        self.max_items = max_items
+        self.name = name
+        self._queue = queue.Queue()
+        self._ensure_thread = OncePerProcess(self._start_thread)
+        self._carry = None  # 因超出上限留到下一批的工作
+
+    def submit(self, items):
+        """提交一组元素并等待结果，异常在调用方线程中重新抛出
+
+        调用方的阶段计时（metrics.timed）包括等待合并的时间；批量推理本身在后台线程中执行，
+        不会计入任何请求的计时器
+        """
+        items = list(items)
+        if not items:
+            return []
+        self._ensure_thread()
+        work = _Work(items)
+        self._queue.put(work)
+        work.done.wait()
+        if work.error is not None:
+            raise work.error
+        return work.results
+
+    def _start_thread(self):
+        """在当前进程中启动合并线程（fork后的子进程各自启动，丢弃从父进程继承的队列）"""
+        self._queue = queue.Queue()
+        self._carry = None
+        threading.Thread(target=self._loop, name=f'micro-batch-{self.name}', daemon=True).start()
+
+    def _collect(self):
+        """取出一批工作：第一份到达后最多再等待window秒，或元素数达到上限为止"""
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, count = [first], len(first.items)
+        deadline = time.perf_counter() + self.window
+        while count < self.max_items:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                work = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if count + len(work.items) > self.max_items:
+                self._carry = work
+                break
+            batch.append(work)
+            count += len(work.items)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            items = [item for work in batch for item in work.items]
+            BATCH_ITEMS.observe(self.name, len(items))
+            BATCH_REQUESTS.observe(self.name, len(batch))
+            try:
+                results = self.handler(items)
+                offset = 0
+                for work in batch:
+                    work.results = results[offset:offset + len(work.items)]
+                    offset += len(work.items)
+            except Exception as e:
+                for work in batch:
+                    work.error = e
+            for work in batch:
+                work.done.set()
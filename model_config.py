@@ -0,0 +1,32 @@
+"""
+模型配置读取 - models/model-config.json
+Python端各模块（ONNX引擎、缓存、批处理设置等）共用的配置入口
+"""
+import os
+import json
+
+# 项目根目录（配置文件中的模型路径均相对于此目录）
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+MODEL_CONFIG_PATH = os.path.join(PROJECT_ROOT, 'models', 'model-config.json')
+
+
+def load_model_config(config_path=MODEL_CONFIG_PATH):
+    """读取模型配置文件"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_default_settings(config_path=MODEL_CONFIG_PATH):
+    """读取 defaultSettings，配置文件缺失或损坏时返回空字典"""
+    try:
+        return load_model_config(config_path).get('defaultSettings', {})
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取模型配置失败: {e}")
+        return {}
+
+
+def resolve_model_path(path):
+    """将配置中的相对路径转换为绝对路径"""
+    if os.path.isabs(path):
+        return path
+    return os.path.normpath(os.path.join(PROJECT_ROOT, path))
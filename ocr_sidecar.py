@@ -0,0 +1,214 @@
+"""
+OCR推理旁路进程 (sidecar)
+模型只在这一个进程中加载一次，所有gunicorn worker通过本地Unix socket调用，
+worker数量增加或重启时都不需要重新加载模型。
+
+启动方式:
+    OCR_SIDECAR_AUTHKEY=<随机密钥> python ocr_sidecar.py --socket /tmp/ocr_sidecar.sock [--engine onnx] [--model paddle-v4]
+通常由 gunicorn.conf.py 在 OCR_MODEL_MODE=sidecar 时自动启动（自动生成密钥，进程退出或无响应时重启）。
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from warmup import WARMUP_ENABLED, warm_up
+
+# 进程间认证密钥的环境变量（gunicorn启动时随机生成，推理进程和worker通过环境变量继承）
+AUTHKEY_ENV = 'OCR_SIDECAR_AUTHKEY'
+# 存活检查等待推理进程响应的秒数（gunicorn master的监督线程 / worker的 /readyz）
+PING_TIMEOUT = 10
+READY_PING_TIMEOUT = 2
+# worker可调用的识别器方法（detect/recognize 供EasyOCR大图分块检测使用）
+READER_METHODS = ('readtext', 'readtext_batch', 'detect', 'recognize')
+
+
+def authkey():
+    """进程间认证密钥，未设置时报错（单独运行推理进程时需手动设置相同的随机值）"""
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise RuntimeError(f"未设置 {AUTHKEY_ENV}，推理进程和worker需要使用相同的随机密钥")
+    return key.encode('utf-8')
+
+
+def create_reader(engine, model_name):
+    """按引擎类型创建识别器，返回 (reader, 引擎信息)"""
+    if engine == 'onnx':
+        from onnx_ocr_engine import ONNXOCREngine
+        reader = ONNXOCREngine(model_name)
+        info = {'engine': 'onnx', 'model_name': reader.model_name,
+                'det_threshold': reader.det_threshold, 'tiling': reader.tiling}
+    else:
+        import easyocr
+        reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
+        info = {'engine': 'easyocr', 'model_name': 'ch_sim+en', 'det_threshold': None, 'tiling': None}
+    return reader, info
+
+
+def warm_up_reader(reader, engine):
+    """用合成图像预热识别器，返回耗时（秒）"""
+    if engine == 'onnx':
+        read_text = reader.readtext_batch
+    else:
+        import cv2
+        read_text = lambda imgs: [reader.readtext(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in imgs]
+    seconds = warm_up(read_text)
+    print(f"🔥 Sidecar预热完成，用时 {seconds:.2f}s")
+    return seconds
+
+
+def _handle_connection(conn, reader, info):
+    """处理单个worker连接：循环接收请求并返回结果"""
+    try:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except EOFError:
+                break
+            try:
+                if method == 'info':
+                    conn.send(('ok', info))
+                elif method in READER_METHODS:
+                    conn.send(('ok', getattr(reader, method)(*args, **kwargs)))
+                else:
+                    conn.send(('error', f"未知方法: {method}"))
+            except Exception as e:
+                conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+
+def serve(socket_path, engine='easyocr', model_name=None):
+    """加载模型并在Unix socket上提供推理服务"""
+    print(f"🔍 Sidecar加载模型 (引擎: {engine})...")
+    start = time.time()
+    reader, info = create_reader(engine, model_name)
+    info['load_seconds'] = time.time() - start
+    print(f"✅ Sidecar模型加载完成，用时 {info['load_seconds']:.2f}s")
+    # 预热完成后才开始监听，gunicorn等待监听时即包含预热
+    info['warmup_seconds'] = warm_up_reader(reader, info['engine']) if WARMUP_ENABLED else 0.0
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    listener = Listener(socket_path, family='AF_UNIX', authkey=authkey())
+    print(f"🔌 Sidecar监听: {socket_path}")
+    try:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_handle_connection, args=(conn, reader, info),
+                             daemon=True).start()
+    finally:
+        listener.close()
+
+
+def wait_until_ready(socket_path, timeout=300):
+    """等待sidecar完成模型加载并开始监听"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(socket_path):
+            try:
+                Client(socket_path, family='AF_UNIX', authkey=authkey()).close()
+                return True
+            except OSError:
+                pass
+        time.sleep(0.2)
+    return False
+
+
+def ping(socket_path, timeout=PING_TIMEOUT):
+    """存活检查：新建连接请求引擎信息，推理进程正常响应时返回None，否则返回错误信息
+
+    连接认证和请求在单独的线程中进行，推理进程卡住时最多等待timeout秒
+    """
+    result = []
+    thread = threading.Thread(target=lambda: result.append(_ping(socket_path)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return result[0] if result else f"OCR推理进程 {timeout}s 内无响应"
+
+
+def _ping(socket_path):
+    try:
+        conn = Client(socket_path, family='AF_UNIX', authkey=authkey())
+    except (OSError, EOFError, AuthenticationError) as e:
+        return f"无法连接OCR推理进程: {e}"
+    try:
+        conn.send(('info', (), {}))
+        conn.recv()
+        return None
+    except (OSError, EOFError) as e:
+        return f"OCR推理进程连接中断: {e}"
+    finally:
+        conn.close()
+
+
+class SidecarReader:
+    """worker端的识别器代理，接口与 easyocr.Reader / ONNXOCREngine 的 readtext 一致"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._local = threading.local()
+        info = self._call('info')
+        self.engine = info['engine']
+        self.model_name = info['model_name']
+        self.det_threshold = info['det_threshold']
+        self.tiling = info['tiling']
+        # 模型在sidecar中加载和预热
+        self.load_seconds = info.get('load_seconds', 0.0)
+        self.warmup_seconds = info.get('warmup_seconds', 0.0)
+
+    def _connection(self):
+        # 每个线程使用独立连接，避免并发请求交错
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = Client(self.socket_path, family='AF_UNIX', authkey=authkey())
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _call(self, method, *args, **kwargs):
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((method, args, kwargs))
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # 连接断开（例如sidecar重启），重新连接后再试一次
+                self._local.conn = None
+                if attempt:
+                    raise
+        if status != 'ok':
+            raise RuntimeError(f"Sidecar推理失败: {payload}")
+        return payload
+
+    def ping(self):
+        """推理进程存活时返回None，否则返回错误信息（/readyz）"""
+        return ping(self.socket_path, READY_PING_TIMEOUT)
+
+    def readtext(self, image, **kwargs):
+        return self._call('readtext', image, **kwargs)
+
+    def readtext_batch(self, images):
+        return self._call('readtext_batch', images)
+
+    def detect(self, image, **kwargs):
+        return self._call('detect', image, **kwargs)
+
+    def recognize(self, image, **kwargs):
+        return self._call('recognize', image, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR推理旁路进程')
+    parser.add_argument('--socket', default=os.environ.get('OCR_SIDECAR_SOCKET', '/tmp/ocr_sidecar.sock'))
+    parser.add_argument('--engine', default=os.environ.get('OCR_ENGINE', 'easyocr'))
+    parser.add_argument('--model', default=os.environ.get('OCR_MODEL'))
+    args = parser.parse_args()
+    serve(args.socket, args.engine, args.model)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+ONNX Runtime OCR引擎
+根据 models/model-config.json 加载检测/识别模型，在Python端直接完成推理，
+不再依赖 torch (EasyOCR) 或 paddle (PaddleOCR) 运行时。
+
+支持两类模型:
+  - paddle:  DB文字检测 + CRNN/SVTR识别 (PP-OCRv3 / PP-OCRv4)
+  - easyocr: CRAFT文字检测 + CRNN识别
+"""
+import os
+import math
+import threading
+import cv2
+import numpy as np
+from model_config import MODEL_CONFIG_PATH, load_model_config, resolve_model_path
+from ort_session import create_session
+from tiled_detection import detect_tiled, needs_tiling, tile_settings
+from text_masks import crop_box
+from micro_batcher import MicroBatcher, batching_settings
+import metrics
+
+
+class ONNXOCREngine:
+    """基于ONNX Runtime的文字检测+识别引擎"""
+
+    # DB后处理参数（与PaddleOCR默认值保持一致）
+    DB_BOX_THRESH = 0.6
+    DB_UNCLIP_RATIO = 1.5
+    DB_MIN_SIZE = 3
+    DB_MAX_CANDIDATES = 1000
+
+    # CRAFT后处理参数（与EasyOCR默认值保持一致）
+    CRAFT_TEXT_THRESHOLD = 0.7
+    CRAFT_LINK_THRESHOLD = 0.4
+    CRAFT_LOW_TEXT = 0.4
+
+    def __init__(self, model_name=None, language=None, config_path=MODEL_CONFIG_PATH, intra_op_threads=None):
+        """加载配置中指定的检测/识别模型
+
+        intra_op_threads: 每个推理会话的线程数，None时由ONNX Runtime按CPU核数决定；
+                          多进程并行时应设置为 CPU核数/进程数，避免线程过多争抢
+        """
+        self.intra_op_threads = intra_op_threads
+        self.config = load_model_config(config_path)
+        settings = self.config.get('defaultSettings', {})
+
+        self.model_name = model_name or settings.get('model', 'paddle-v4')
+        if self.model_name not in self.config['models']:
+            raise ValueError(f"模型配置中不存在: {self.model_name}")
+        self.model_config = self.config['models'][self.model_name]
+        self.family = self.model_config.get('family', 'paddle')
+
+        # 语言不被当前模型支持时，退回模型支持的第一种语言
+        supported = self.model_config.get('supportedLanguages', [])
+        language = language or settings.get('language', 'ch_sim')
+        if supported and language not in supported:
+            language = supported[0]
+        self.language = language
+
+        det_config = self.model_config['detection']
+        rec_config = self.model_config['recognition']
+        self.det_limit_side = max(det_config.get('inputSize', [640, 640]))
+        self.det_threshold = det_config.get('threshold', settings.get('detectionThreshold', 0.3))
+        # 大图分块检测：各块按原分辨率检测，不再整体缩放到 det_limit_side
+        self.tiling = tile_settings(settings)
+        self.rec_image_shape = rec_config.get('inputSize', [48, 320])
+        # 识别阶段每批处理的文字区域数量
+        self.batch_size = settings.get('batchSize', 8) if settings.get('enableBatch', True) else 1
+
+        print(f"🔍 加载ONNX模型: {self.model_config.get('name', self.model_name)}")
+        self.det_session = self._create_session(det_config['modelPath'])
+        self.rec_session = self._create_session(rec_config['modelPath'])
+        self.det_input_name = self.det_session.get_inputs()[0].name
+        # 检测模型batch维为动态时，多张图像可以一起检测
+        self.det_dynamic_batch = not isinstance(self.det_session.get_inputs()[0].shape[0], int)
+        self.rec_input_name = self.rec_session.get_inputs()[0].name
+        # 识别模型输入宽度为固定值时不能按批次动态加宽
+        rec_width = self.rec_session.get_inputs()[0].shape[3]
+        self.rec_dynamic_width = not isinstance(rec_width, int)
+
+        # 并发请求的检测和识别在一个短时间窗口内合并为一次批量推理（defaultSettings.microBatching）
+        self.batching = batching_settings(settings)
+        self.detect_batcher = self.recognize_batcher = None
+        if self.batching['enabled']:
+            window = self.batching['windowMs'] / 1000.0
+            if self.det_dynamic_batch:
+                self.detect_batcher = MicroBatcher(self.detect_batch, window, self.batching['maxImages'], 'detect')
+            self.recognize_batcher = MicroBatcher(self.recognize, window, self.batching['maxCrops'], 'recognize')
+        self._active = 0  # 正在执行 readtext_batch 的调用数
+        self._active_lock = threading.Lock()
+
+        # 字典由识别模型的输出层决定，每个模型在 recognition.dictPath 中指定；未指定时使用语言的字典
+        dict_path = rec_config.get('dictPath') or self.config['languages'][self.language]['dictPath']
+        self.dict_path = resolve_model_path(dict_path)
+        self.character = self._load_dictionary(self.dict_path)
+        num_classes = self.rec_session.get_outputs()[0].shape[-1]
+        if isinstance(num_classes, int):
+            self._check_dictionary(num_classes)
+        print(f"✅ ONNX模型加载完成 (语言: {self.language}, 字符数: {len(self.character) - 1}, "
+              f"执行提供程序: {', '.join(self.det_session.get_providers())})")
+
+    def _create_session(self, model_path):
+        """创建ONNX Runtime推理会话（线程数、图优化、执行提供程序见 defaultSettings.onnxRuntime）"""
+        return create_session(model_path, self.config, self.intra_op_threads)
+
+    def _load_dictionary(self, dict_path):
+        """加载字符字典，索引0保留给CTC blank"""
+        if not os.path.exists(dict_path):
+            raise FileNotFoundError(f"字符字典不存在: {dict_path}")
+        with open(dict_path, 'r', encoding='utf-8') as f:
+            chars = [line.rstrip('\r\n') for line in f if line.rstrip('\r\n')]
+        if self.family == 'paddle':
+            # PaddleOCR识别模型在字典末尾额外包含空格字符
+            chars.append(' ')
+        return ['blank'] + chars
+
+    def _check_dictionary(self, num_classes):
+        """识别模型输出的类别数必须与字典字符数（含blank）一致，否则解码结果全部错位"""
+        if num_classes != len(self.character):
+            raise ValueError(f"识别模型 {self.model_name} 输出 {num_classes} 个类别，与字典 {self.dict_path} 的 "
+                             f"{len(self.character)} 个字符（含blank）不一致，请检查 recognition.dictPath")
+
+    # ------------------------------------------------------------------
+    # 检测
+    # ------------------------------------------------------------------
+    def _resize_for_detection(self, img, limit_side=None):
+        """按最长边限制缩放，并对齐到32的倍数"""
+        limit_side = limit_side or self.det_limit_side
+        h, w = img.shape[:2]
+        ratio = 1.0
+        if max(h, w) > limit_side:
+            ratio = limit_side / max(h, w)
+        resize_h = max(32, int(round(h * ratio / 32)) * 32)
+        resize_w = max(32, int(round(w * ratio / 32)) * 32)
+        resized = cv2.resize(img, (resize_w, resize_h))
+        return resized, resize_h / h, resize_w / w
+
+    def _preprocess_detection(self, img, limit_side=None):
+        """检测模型输入预处理，返回NCHW张量"""
+        resized, ratio_h, ratio_w = self._resize_for_detection(img, limit_side)
+        if self.family == 'easyocr':
+            # CRAFT使用RGB输入，均值方差以0-255为尺度
+            data = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB).astype(np.float32)
+            data -= np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255.0
+            data /= np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255.0
+        else:
+            data = resized.astype(np.float32) / 255.0
+            data -= np.array([0.485, 0.456, 0.406], dtype=np.float32)
+            data /= np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        data = data.transpose(2, 0, 1)[np.newaxis, ...]
+        return data, ratio_h, ratio_w
+
+    def detect(self, img):
+        """检测文字区域，返回四点坐标数组列表（原图坐标）"""
+        return self.detect_batch([img])[0]
+
+    def detect_batch(self, imgs, limit_side=None):
+        """多张图像一起检测，返回每张图像的文本框列表
+
+        各图像按自身比例缩放后右下补零到批次内的最大尺寸；模型batch维固定时逐张检测
+        limit_side: 缩放后的最长边，默认为检测模型的输入尺寸
+        """
+        prepared = [self._preprocess_detection(img, limit_side) for img in imgs]
+        step = max(1, len(imgs)) if self.det_dynamic_batch else 1
+        results = []
+
+        for start in range(0, len(imgs), step):
+            group = prepared[start:start + step]
+            if len(group) == 1:
+                batch = group[0][0]
+            else:
+                max_h = max(data.shape[2] for data, _, _ in group)
+                max_w = max(data.shape[3] for data, _, _ in group)
+                batch = np.zeros((len(group), 3, max_h, max_w), dtype=np.float32)
+                for k, (data, _, _) in enumerate(group):
+                    batch[k, :, :data.shape[2], :data.shape[3]] = data[0]
+            output = self.det_session.run(None, {self.det_input_name: batch})[0]
+
+            for k, (data, ratio_h, ratio_w) in enumerate(group):
+                # 去掉补零部分（CRAFT输出为NHWC且尺寸减半，DB输出为NCHW）
+                h, w = data.shape[2], data.shape[3]
+                if self.family == 'easyocr':
+                    out_h = output.shape[1] * h // batch.shape[2]
+                    out_w = output.shape[2] * w // batch.shape[3]
+                    boxes = self._craft_postprocess(output[k, :out_h, :out_w], ratio_h, ratio_w)
+                else:
+                    boxes = self._db_postprocess(output[k, 0, :h, :w], ratio_h, ratio_w)
+                results.append(self._clip_and_sort_boxes(boxes, imgs[start + k].shape[:2]))
+        return results
+
+    def detect_tiled(self, img):
+        """大图分块检测：块内不缩放，接缝处的重复框合并后返回原图坐标的文本框"""
+        tile_size = self.tiling['tileSize']
+        return detect_tiled(img, lambda tiles: self.detect_batch(tiles, limit_side=tile_size),
+                            tile_size, self.tiling['overlap'],
+                            self.tiling['batchSize'], self.tiling['workers'])
+
+    def detect_images(self, imgs):
+        """检测多张图像：超过块大小的大图分块检测（开启 tiledDetection 时），其余图像一起批量检测"""
+        tiled = [self.tiling['enabled'] and needs_tiling(img.shape, self.tiling['tileSize'], self.det_limit_side)
+                 for img in imgs]
+        regular = [i for i, is_tiled in enumerate(tiled) if not is_tiled]
+        all_boxes = [None] * len(imgs)
+        for i, boxes in zip(regular, self._run_batched(self.detect_batcher, self.detect_batch,
+                                                       [imgs[i] for i in regular])):
+            all_boxes[i] = boxes
+        for i, is_tiled in enumerate(tiled):
+            if is_tiled:
+                all_boxes[i] = self.detect_tiled(imgs[i])
+        return all_boxes
+
+    def _db_postprocess(self, prob_map, ratio_h, ratio_w):
+        """DB (Differentiable Binarization) 后处理"""
+        bitmap = (prob_map > self.det_threshold).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours[:self.DB_MAX_CANDIDATES]:
+            box, short_side = self._min_area_box(contour)
+            if short_side < self.DB_MIN_SIZE:
+                continue
+            score = self._box_score(prob_map, contour)
+            if score < self.DB_BOX_THRESH:
+                continue
+            box = self._unclip(box, self.DB_UNCLIP_RATIO)
+            box, short_side = self._min_area_box(box.reshape(-1, 1, 2).astype(np.float32))
+            if short_side < self.DB_MIN_SIZE + 2:
+                continue
+            box[:, 0] /= ratio_w
+            box[:, 1] /= ratio_h
+            boxes.append(box)
+        return boxes
+
+    def _craft_postprocess(self, score_maps, ratio_h, ratio_w):
+        """CRAFT 后处理：字符区域图 + 连接图 -> 文本框"""
+        text_map = score_maps[:, :, 0]
+        link_map = score_maps[:, :, 1]
+        text_score = (text_map > self.CRAFT_LOW_TEXT).astype(np.uint8)
+        link_score = (link_map > self.CRAFT_LINK_THRESHOLD).astype(np.uint8)
+        combined = np.clip(text_score + link_score, 0, 1).astype(np.uint8)
+
+        n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(combined, connectivity=4)
+        boxes = []
+        for k in range(1, n_labels):
+            if stats[k, cv2.CC_STAT_AREA] < 10:
+                continue
+            component = labels == k
+            if np.max(text_map[component]) < self.CRAFT_TEXT_THRESHOLD:
+                continue
+            ys, xs = np.nonzero(component)
+            points = np.stack([xs, ys], axis=1).astype(np.float32).reshape(-1, 1, 2)
+            box, _ = self._min_area_box(points)
+            # CRAFT输出为输入尺寸的1/2
+            box[:, 0] *= 2.0 / ratio_w
+            box[:, 1] *= 2.0 / ratio_h
+            boxes.append(box)
+        return boxes
+
+    @staticmethod
+    def _min_area_box(points):
+        """最小外接矩形，按左上、右上、右下、左下排序"""
+        rect = cv2.minAreaRect(points)
+        box = sorted(cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+        left = sorted(box[:2], key=lambda p: p[1])
+        right = sorted(box[2:], key=lambda p: p[1])
+        ordered = np.array([left[0], right[0], right[1], left[1]], dtype=np.float32)
+        return ordered, min(rect[1])
+
+    @staticmethod
+    def _box_score(prob_map, contour):
+        """计算轮廓内的平均概率作为框得分"""
+        h, w = prob_map.shape
+        pts = contour.reshape(-1, 2)
+        xmin = int(np.clip(np.floor(pts[:, 0].min()), 0, w - 1))
+        xmax = int(np.clip(np.ceil(pts[:, 0].max()), 0, w - 1))
+        ymin = int(np.clip(np.floor(pts[:, 1].min()), 0, h - 1))
+        ymax = int(np.clip(np.ceil(pts[:, 1].max()), 0, h - 1))
+        mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+        shifted = (pts - np.array([xmin, ymin])).astype(np.int32)
+        cv2.fillPoly(mask, [shifted], 1)
+        return cv2.mean(prob_map[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+    @staticmethod
+    def _unclip(box, unclip_ratio):
+        """按 面积*比例/周长 向外扩展矩形框"""
+        area = cv2.contourArea(box)
+        length = cv2.arcLength(box.reshape(-1, 1, 2), True)
+        if length == 0:
+            return box
+        distance = area * unclip_ratio / length
+        (cx, cy), (w, h), angle = cv2.minAreaRect(box)
+        return cv2.boxPoints(((cx, cy), (w + 2 * distance, h + 2 * distance), angle))
+
+    @staticmethod
+    def _clip_and_sort_boxes(boxes, shape):
+        """裁剪到图像范围内，并按从上到下、从左到右排序"""
+        height, width = shape
+        clipped = []
+        for box in boxes:
+            box = box.copy()
+            box[:, 0] = np.clip(box[:, 0], 0, width - 1)
+            box[:, 1] = np.clip(box[:, 1], 0, height - 1)
+            if np.linalg.norm(box[0] - box[1]) <= 3 or np.linalg.norm(box[0] - box[3]) <= 3:
+                continue
+            clipped.append(box)
+        return sorted(clipped, key=lambda b: (round(b[0][1] / 10), b[0][0]))
+
+    # ------------------------------------------------------------------
+    # 识别
+    # ------------------------------------------------------------------
+    def _preprocess_recognition(self, crop, img_w):
+        """识别模型输入预处理：等比缩放到固定高度，右侧补零到批次宽度"""
+        img_h = self.rec_image_shape[0]
+        h, w = crop.shape[:2]
+        resized_w = min(img_w, int(math.ceil(img_h * w / float(h))))
+        resized = cv2.resize(crop, (max(resized_w, 1), img_h))
+        if self.family == 'easyocr':
+            # EasyOCR的CRNN使用单通道灰度输入
+            if resized.ndim == 3:
+                resized = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+            resized = resized[:, :, np.newaxis]
+        elif resized.ndim == 2:
+            resized = cv2.cvtColor(resized, cv2.COLOR_GRAY2BGR)
+        data = resized.astype(np.float32).transpose(2, 0, 1) / 255.0
+        data = (data - 0.5) / 0.5
+        padded = np.zeros((data.shape[0], img_h, img_w), dtype=np.float32)
+        padded[:, :, :data.shape[2]] = data
+        return padded
+
+    def _ctc_decode(self, preds):
+        """CTC贪心解码：去除重复字符和blank"""
+        self._check_dictionary(preds.shape[2])
+        indices = preds.argmax(axis=2)
+        probs = preds.max(axis=2)
+        results = []
+        for seq, seq_probs in zip(indices, probs):
+            keep = np.ones(len(seq), dtype=bool)
+            keep[1:] = seq[1:] != seq[:-1]
+            keep &= seq != 0
+            chars = [self.character[idx] for idx in seq[keep]]
+            confidence = float(np.mean(seq_probs[keep])) if keep.any() else 0.0
+            results.append((''.join(chars), confidence))
+        return results
+
+    def recognize(self, crops, batch_size=None):
+        """批量识别裁剪后的文字图像，返回 (文本, 置信度) 列表（顺序与输入一致）
+        
+        按宽高比排序后分批，使同一批次内的图像宽度相近，减少补零浪费
+        """
+        if not crops:
+            return []
+        batch_size = max(1, batch_size or self.batch_size)
+        img_h, base_w = self.rec_image_shape
+
+        ratios = [crop.shape[1] / float(max(crop.shape[0], 1)) for crop in crops]
+        order = np.argsort(ratios)
+        results = [None] * len(crops)
+
+        for start in range(0, len(crops), batch_size):
+            indices = order[start:start + batch_size]
+            img_w = base_w
+            if self.rec_dynamic_width:
+                # 批次宽度取组内最大宽高比，长文本不会被压缩
+                max_ratio = max(ratios[i] for i in indices)
+                img_w = max(base_w, int(math.ceil(img_h * max_ratio)))
+            batch = np.stack([self._preprocess_recognition(crops[i], img_w) for i in indices])
+            preds = self.rec_session.run(None, {self.rec_input_name: batch})[0]
+            for i, decoded in zip(indices, self._ctc_decode(preds)):
+                results[i] = decoded
+        return results
+
+    # ------------------------------------------------------------------
+    # 完整流程
+    # ------------------------------------------------------------------
+    def _load_image(self, image):
+        """读取图像路径或数组，统一为BGR三通道图像"""
+        img = cv2.imread(image) if isinstance(image, str) else image
+        if img is None:
+            raise ValueError(f"无法读取图像: {image}")
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return img
+
+    def readtext(self, image):
+        """检测并识别文字，返回格式与 easyocr.Reader.readtext 相同: [(bbox, text, confidence), ...]"""
+        return self.readtext_batch([image])[0]
+
+    def _run_batched(self, batcher, handler, items):
+        """有其他请求同时在处理时交给微批处理器与它们合并推理，只有一个请求时直接推理，不等待时间窗口"""
+        with self._active_lock:
+            concurrent = self._active > 1
+        if batcher is None or not concurrent:
+            return handler(items)
+        return batcher.submit(items)
+
+    def readtext_batch(self, images):
+        """多张图像一起检测，所有图像的文字区域合并后批量识别；返回每张图像的 readtext 结果
+
+        并发调用时（多个请求线程或推理进程的多个连接），各调用的检测和识别会合并为一次批量推理
+        """
+        imgs = [self._load_image(image) for image in images]
+        with self._active_lock:
+            self._active += 1
+        try:
+            with metrics.timed('detect'):
+                all_boxes = self.detect_images(imgs)
+            with metrics.timed('recognize'):
+                crops = [crop_box(img, box) for img, boxes in zip(imgs, all_boxes) for box in boxes]
+                recognized = iter(self._run_batched(self.recognize_batcher, self.recognize, crops))
+        finally:
+            with self._active_lock:
+                self._active -= 1
+
+        results = []
+        for boxes in all_boxes:
+            image_results = []
+            for box in boxes:
+                text, confidence = next(recognized)
+                bbox = [[int(round(x)), int(round(y))] for x, y in box]
+                image_results.append((bbox, text, confidence))
+            results.append(image_results)
+        return results
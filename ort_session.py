@@ -0,0 +1,148 @@
+"""
+ONNX Runtime会话工厂 - 按 models/model-config.json 中的 defaultSettings.onnxRuntime 创建推理会话
+线程数、图优化级别、内存分配策略和执行提供程序顺序都可按部署调整（环境变量优先于配置），
+优化后的模型图缓存到磁盘，之后加载时跳过图优化。
+"""
+import os
+import hashlib
+import onnxruntime as ort
+from model_config import resolve_model_path
+
+# defaultSettings.onnxRuntime 的默认值
+DEFAULT_SESSION_SETTINGS = {
+    'providers': ['openvino', 'dnnl', 'cpu'],   # executionProviders中的名称，按顺序使用已安装的
+    'intraOpThreads': 0,                       # 单个算子内的并行线程数，0为按CPU核数
+    'interOpThreads': 1,                       # 算子间并行线程数（executionMode为parallel时有效）
+    'executionMode': 'sequential',             # sequential / parallel
+    'graphOptimizationLevel': 'all',           # disable / basic / extended / all
+    'enableCpuMemArena': True,                 # 内存池：重复推理不再反复申请内存
+    'enableMemPattern': True,                  # 按首次推理的内存分配模式预分配（输入尺寸变化大时可关闭）
+    'optimizedModelDir': './models/optimized',  # 优化后模型图的缓存目录，为空时不缓存
+}
+# 可以覆盖配置的环境变量
+ENV_OVERRIDES = {
+    'ORT_PROVIDERS': ('providers', lambda v: [p.strip() for p in v.split(',') if p.strip()]),
+    'ORT_INTRA_OP_THREADS': ('intraOpThreads', int),
+    'ORT_INTER_OP_THREADS': ('interOpThreads', int),
+    'ORT_OPTIMIZATION_LEVEL': ('graphOptimizationLevel', str),
+    'ORT_OPTIMIZED_MODEL_DIR': ('optimizedModelDir', str),
+}
+OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+# executionProviders中的名称 -> ONNX Runtime执行提供程序（配置项可用 ortProvider 指定）
+ORT_PROVIDERS = {
+    'cpu': 'CPUExecutionProvider',
+    'openvino': 'OpenVINOExecutionProvider',
+    'dnnl': 'DnnlExecutionProvider',
+}
+
+
+def session_settings(config):
+    """合并配置中的会话设置、默认值和环境变量"""
+    merged = dict(DEFAULT_SESSION_SETTINGS)
+    merged.update(config.get('defaultSettings', {}).get('onnxRuntime') or {})
+    for env_name, (key, parse) in ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            merged[key] = parse(os.environ[env_name])
+    return merged
+
+
+def select_providers(config, names):
+    """按names的顺序选出已安装的执行提供程序，返回 [(提供程序, 选项), ...]，CPU始终作为最后的后备"""
+    available = set(ort.get_available_providers())
+    declared = config.get('executionProviders', {})
+    providers = []
+    for name in names:
+        entry = declared.get(name, {})
+        provider = entry.get('ortProvider') or ORT_PROVIDERS.get(name)
+        if provider in available and provider not in [p for p, _ in providers]:
+            providers.append((provider, entry.get('providerOptions') or {}))
+    if 'CPUExecutionProvider' not in [p for p, _ in providers]:
+        providers.append(('CPUExecutionProvider', {}))
+    return providers
+
+
+def _optimized_path(model_path, settings, providers):
+    """优化后模型的缓存路径：原模型、优化级别、提供程序或ONNX Runtime版本变化时使用新的文件"""
+    directory = settings.get('optimizedModelDir')
+    level = settings['graphOptimizationLevel']
+    # 只缓存纯CPU会话的优化结果（其他提供程序的融合算子不能保存为通用模型），不优化时无需缓存
+    if not directory or level == 'disable' or [p for p, _ in providers] != ['CPUExecutionProvider']:
+        return None
+    stat = os.stat(model_path)
+    key = f'{os.path.abspath(model_path)}|{stat.st_size}|{stat.st_mtime_ns}|{level}|{ort.__version__}'
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(resolve_model_path(directory), f'{name}.{level}.{digest}.onnx')
+
+
+def create_session(model_path, config, intra_op_threads=None):
+    """创建推理会话
+
+    model_path: 配置中的模型路径（相对路径相对于项目根目录）
+    intra_op_threads: 调用方指定的线程数（如多进程并行时 CPU核数/进程数），优先于配置
+    """
+    path = resolve_model_path(model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX模型文件不存在: {path}")
+    settings = session_settings(config)
+    if settings['graphOptimizationLevel'] not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"未知的图优化级别: {settings['graphOptimizationLevel']}")
+
+    options = ort.SessionOptions()
+    threads = intra_op_threads or settings['intraOpThreads']
+    if threads:
+        options.intra_op_num_threads = threads
+    if settings['interOpThreads']:
+        options.inter_op_num_threads = settings['interOpThreads']
+    options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if settings['executionMode'] == 'parallel'
+                              else ort.ExecutionMode.ORT_SEQUENTIAL)
+    options.enable_cpu_mem_arena = bool(settings['enableCpuMemArena'])
+    options.enable_mem_pattern = bool(settings['enableMemPattern'])
+    options.graph_optimization_level = OPTIMIZATION_LEVELS[settings['graphOptimizationLevel']]
+
+    providers = select_providers(config, settings['providers'])
+    optimized_path = _optimized_path(path, settings, providers)
+    if optimized_path and os.path.exists(optimized_path):
+        try:
+            return _load_optimized(optimized_path, options, settings, providers)
+        except Exception as e:
+            print(f"⚠️ 缓存的优化模型无法加载，重新优化: {e}")
+            os.remove(optimized_path)
+
+    temp_path = None
+    if optimized_path:
+        os.makedirs(os.path.dirname(optimized_path), exist_ok=True)
+        # 先写入临时文件，会话创建成功后再改名，避免并发加载时读到不完整的文件
+        temp_path = f'{optimized_path}.{os.getpid()}.tmp'
+        options.optimized_model_filepath = temp_path
+        # all级别的布局优化（NCHWc等）与CPU指令集相关，保存的模型只做到extended级别
+        if settings['graphOptimizationLevel'] == 'all':
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    session = _inference_session(path, options, providers)
+    if temp_path and os.path.exists(temp_path):
+        os.replace(temp_path, optimized_path)
+        print(f"💾 已缓存优化后的模型: {optimized_path}")
+        if settings['graphOptimizationLevel'] == 'all':
+            # 推理使用完整优化的会话
+            session = _load_optimized(optimized_path, options, settings, providers)
+    return session
+
+
+def _inference_session(path, options, providers):
+    return ort.InferenceSession(path, sess_options=options,
+                                providers=[p for p, _ in providers],
+                                provider_options=[o for _, o in providers])
+
+
+def _load_optimized(path, options, settings, providers):
+    """加载缓存的优化模型：已完成的优化不再重复，all级别只需再做与本机相关的布局优化"""
+    options.optimized_model_filepath = ''
+    options.graph_optimization_level = (ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                                        if settings['graphOptimizationLevel'] == 'all'
+                                        else ort.GraphOptimizationLevel.ORT_DISABLE_ALL)
+    return _inference_session(path, options, providers)
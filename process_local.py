@@ -0,0 +1,29 @@
+"""
+按进程启动后台线程 - gunicorn preload模式下应用在master进程中导入，线程不会随fork进入worker，
+需要后台线程的组件（任务队列、结果清理、微批处理、模型预热）在首次使用时按进程启动。
+
+    start_workers = OncePerProcess(self._start_workers)
+    start_workers()   # 每个进程（包括fork出的worker）只执行一次 _start_workers
+"""
+import os
+import threading
+
+
+class OncePerProcess:
+    """包装一个启动函数，使其在每个进程中只执行一次（线程安全）"""
+
+    def __init__(self, start):
+        self.start = start
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        """当前进程尚未执行过时执行启动函数，返回是否在本次调用中执行"""
+        if self._pid == os.getpid():
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            self.start()
+        return True
@@ -0,0 +1,313 @@
+"""
+INT8模型量化 - 为配置中的检测/识别模型生成动态量化和静态量化的INT8版本，
+在本地样本图片上对比各版本的速度和识别结果，并将量化模型登记到 models/model-config.json
+
+    python quantize_models.py --model paddle-v4 --samples samples/ -o quantization_report.json
+
+- dynamic: 只量化权重，激活值在推理时动态量化，不需要校准数据
+- static:  权重和激活值都量化为INT8（QDQ格式），用样本图片校准激活值范围，CPU上通常更快
+样本目录中与图片同名的 .txt 文件（或 --labels 指定的JSON: {文件名: 文本}）作为标注；
+没有标注时以原模型（FP32）的识别结果为参照计算字符差异率。
+"""
+import os
+import re
+import sys
+import copy
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+
+import numpy as np
+import cv2
+from model_config import MODEL_CONFIG_PATH, PROJECT_ROOT, load_model_config, resolve_model_path
+from batch_processor import is_image_name
+from text_masks import crop_box
+
+QUANTIZATION_MODES = ('dynamic', 'static')
+
+
+# ----------------------------------------------------------------------
+# 样本和标注
+# ----------------------------------------------------------------------
+def load_samples(sample_dir, labels_path=None):
+    """读取样本图片，返回 [(文件名, BGR图像, 标注文本或None), ...]"""
+    labels = {}
+    if labels_path:
+        with open(labels_path, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+    samples = []
+    for name in sorted(os.listdir(sample_dir)):
+        if not is_image_name(name):
+            continue
+        img = cv2.imread(os.path.join(sample_dir, name))
+        if img is None:
+            print(f"⚠️ 无法读取样本: {name}")
+            continue
+        label = labels.get(name)
+        label_path = os.path.join(sample_dir, os.path.splitext(name)[0] + '.txt')
+        if label is None and os.path.exists(label_path):
+            with open(label_path, 'r', encoding='utf-8') as f:
+                label = f.read()
+        samples.append((name, img, label))
+    return samples
+
+
+def normalize_text(text):
+    """比较识别结果时忽略空白"""
+    return re.sub(r'\s+', '', text or '')
+
+
+def edit_distance(a, b):
+    """字符级编辑距离"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_error_rate(predictions, references):
+    """所有样本合计的字符错误率（编辑距离之和 / 参照文本长度之和）"""
+    errors = sum(edit_distance(normalize_text(p), normalize_text(r)) for p, r in zip(predictions, references))
+    total = sum(len(normalize_text(r)) for r in references)
+    return errors / total if total else 0.0
+
+
+# ----------------------------------------------------------------------
+# 量化
+# ----------------------------------------------------------------------
+class _InputReader:
+    """按模型输入名依次提供校准数据（onnxruntime.quantization.CalibrationDataReader接口）"""
+
+    def __init__(self, input_name, tensors):
+        self.input_name = input_name
+        self.tensors = iter(tensors)
+
+    def get_next(self):
+        tensor = next(self.tensors, None)
+        return None if tensor is None else {self.input_name: tensor}
+
+    def rewind(self):
+        pass
+
+
+def calibration_tensors(engine, samples, limit):
+    """用原模型对样本做预处理和检测，得到检测和识别模型的校准输入"""
+    det_inputs, rec_inputs = [], []
+    for _, img, _ in samples[:limit]:
+        det_inputs.append(engine._preprocess_detection(img)[0])
+        crops = [crop_box(img, box) for box in engine.detect(img)]
+        img_h, base_w = engine.rec_image_shape
+        for start in range(0, len(crops), engine.batch_size):
+            group = crops[start:start + engine.batch_size]
+            img_w = base_w
+            if engine.rec_dynamic_width:
+                img_w = max(base_w, max(int(np.ceil(img_h * c.shape[1] / max(c.shape[0], 1))) for c in group))
+            rec_inputs.append(np.stack([engine._preprocess_recognition(c, img_w) for c in group]))
+    return det_inputs, rec_inputs
+
+
+def quantized_path(model_path, mode):
+    """量化模型与原模型放在同一目录: xxx.onnx -> xxx.int8-dynamic.onnx"""
+    base, ext = os.path.splitext(model_path)
+    return f'{base}.int8-{mode}{ext}'
+
+
+def quantize_model(model_path, output_path, mode, input_name=None, tensors=None):
+    """生成一个量化模型"""
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    source = model_path
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            # 量化前做形状推断和图优化，量化的覆盖范围更完整
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            source = os.path.join(temp_dir, 'preprocessed.onnx')
+            # 符号形状推断需要sympy，未安装时只做ONNX形状推断
+            quant_pre_process(model_path, source,
+                              skip_symbolic_shape=importlib.util.find_spec('sympy') is None)
+        except Exception as e:
+            print(f"⚠️ 量化预处理失败，直接量化原模型: {e}")
+            source = model_path
+
+        if mode == 'dynamic':
+            # CPU上的ConvInteger只支持uint8权重
+            quantize_dynamic(source, output_path, weight_type=QuantType.QUInt8)
+        else:
+            quantize_static(source, output_path, _InputReader(input_name, tensors),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    print(f"💾 已生成{mode}量化模型: {output_path}")
+
+
+def relative_model_path(path):
+    """配置中的模型路径使用相对于项目根目录的写法（./models/xxx.onnx）"""
+    path = os.path.abspath(path)
+    if path.startswith(PROJECT_ROOT + os.sep):
+        return './' + os.path.relpath(path, PROJECT_ROOT).replace(os.sep, '/')
+    return path
+
+
+def variant_entry(base_entry, base_name, mode, det_path, rec_path):
+    """量化模型在配置中的条目：复制原模型的设置，替换模型路径"""
+    entry = copy.deepcopy(base_entry)
+    entry['name'] = f"{base_entry.get('name', base_name)} INT8 ({mode})"
+    entry['description'] = f"{base_name} 的INT8{'动态' if mode == 'dynamic' else '静态'}量化版本，CPU推理更快，模型更小"
+    entry['detection']['modelPath'] = relative_model_path(det_path)
+    entry['recognition']['modelPath'] = relative_model_path(rec_path)
+    entry['baseModel'] = base_name
+    entry['quantization'] = f'int8-{mode}'
+    entry['size'] = 'small'
+    return entry
+
+
+def save_model_config(config, config_path):
+    """写回配置文件，保持原有格式（2空格缩进，数值数组写在一行）"""
+    text = json.dumps(config, indent=2, ensure_ascii=False)
+    text = re.sub(r'\[\n\s+([^\[\]{}]*?)\n\s+\]', lambda m: '[' + re.sub(r',\n\s+', ', ', m.group(1)) + ']', text)
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+
+
+# ----------------------------------------------------------------------
+# 评估
+# ----------------------------------------------------------------------
+def evaluate(engine, samples, repeats=1):
+    """在样本上运行完整的检测+识别，返回耗时统计和每个样本的识别文本"""
+    import metrics
+
+    engine.readtext(samples[0][1])  # 预热
+    latencies, detect, recognize, texts, boxes = [], [], [], [], 0
+    for _ in range(repeats):
+        texts = []
+        for _, img, _ in samples:
+            with metrics.request_timer() as timer:
+                start = time.perf_counter()
+                results = engine.readtext(img)
+                latencies.append(time.perf_counter() - start)
+            detect.append(timer.timings.get('detect', 0.0))
+            recognize.append(timer.timings.get('recognize', 0.0))
+            texts.append('\n'.join(text for _, text, _ in results))
+            boxes += len(results)
+    return {
+        'latency_mean': float(np.mean(latencies)),
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'detect_mean': float(np.mean(detect)),
+        'recognize_mean': float(np.mean(recognize)),
+        'boxes_per_image': boxes / (len(samples) * repeats),
+    }, texts
+
+
+def model_size_mb(entry):
+    return sum(os.path.getsize(resolve_model_path(entry[part]['modelPath']))
+               for part in ('detection', 'recognition')) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成INT8量化模型并对比速度和识别结果')
+    parser.add_argument('--model', help='要量化的模型，默认为配置中的 defaultSettings.model')
+    parser.add_argument('--samples', required=True, help='样本图片目录（可附带同名 .txt 标注）')
+    parser.add_argument('--labels', help='标注JSON文件: {文件名: 文本}')
+    parser.add_argument('--modes', nargs='+', choices=QUANTIZATION_MODES, default=list(QUANTIZATION_MODES),
+                        help='量化方式')
+    parser.add_argument('--calibration', type=int, default=32, help='静态量化使用的校准图片数')
+    parser.add_argument('--repeats', type=int, default=1, help='评估时每张样本的运行次数')
+    parser.add_argument('--config', default=MODEL_CONFIG_PATH, help='模型配置文件')
+    parser.add_argument('--no-register', action='store_true', help='只生成和评估，不写入模型配置')
+    parser.add_argument('--skip-existing', action='store_true', help='量化模型已存在时不重新生成')
+    parser.add_argument('-o', '--output', default='quantization_report.json', help='评估报告JSON文件')
+    args = parser.parse_args()
+
+    from onnx_ocr_engine import ONNXOCREngine
+
+    config = load_model_config(args.config)
+    base_name = args.model or config.get('defaultSettings', {}).get('model', 'paddle-v4')
+    if base_name not in config['models']:
+        print(f"❌ 模型配置中不存在: {base_name}")
+        sys.exit(1)
+    base_entry = config['models'][base_name]
+    samples = load_samples(args.samples, args.labels)
+    if not samples:
+        print(f"❌ 样本目录中没有图片: {args.samples}")
+        sys.exit(1)
+    print(f"📂 样本: {len(samples)} 张，标注: {sum(label is not None for _, _, label in samples)} 张")
+
+    base_engine = ONNXOCREngine(base_name, config_path=args.config)
+    det_source = resolve_model_path(base_entry['detection']['modelPath'])
+    rec_source = resolve_model_path(base_entry['recognition']['modelPath'])
+
+    # 1. 量化
+    variants = {}
+    tensors = None
+    for mode in args.modes:
+        det_path, rec_path = quantized_path(det_source, mode), quantized_path(rec_source, mode)
+        if not (args.skip_existing and os.path.exists(det_path) and os.path.exists(rec_path)):
+            if mode == 'static' and tensors is None:
+                print(f"📐 准备校准数据（{min(args.calibration, len(samples))} 张图片）...")
+                tensors = calibration_tensors(base_engine, samples, args.calibration)
+            det_tensors, rec_tensors = tensors if mode == 'static' else (None, None)
+            if mode == 'static' and not rec_tensors:
+                print("❌ 样本中没有检测到文字，无法校准识别模型")
+                sys.exit(1)
+            quantize_model(det_source, det_path, mode, base_engine.det_input_name, det_tensors)
+            quantize_model(rec_source, rec_path, mode, base_engine.rec_input_name, rec_tensors)
+        variants[f'{base_name}-int8-{mode}'] = variant_entry(base_entry, base_name, mode, det_path, rec_path)
+
+    # 2. 评估：量化模型登记在临时配置中，与原模型使用相同的引擎设置
+    eval_config = copy.deepcopy(config)
+    eval_config['models'].update(variants)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(eval_config, f, ensure_ascii=False)
+        eval_config_path = f.name
+    try:
+        print(f"⏱️ 评估原模型: {base_name}")
+        base_stats, base_texts = evaluate(base_engine, samples, args.repeats)
+        labels = [label for _, _, label in samples]
+        labeled = [i for i, label in enumerate(labels) if label is not None]
+        report = {'base_model': base_name, 'samples': len(samples), 'labeled': len(labeled), 'models': {}}
+
+        def summarize(name, entry, stats, texts):
+            stats['size_mb'] = round(model_size_mb(entry), 2)
+            stats['speedup'] = base_stats['latency_mean'] / stats['latency_mean'] if stats['latency_mean'] else 0.0
+            # 与原模型识别结果的差异；有标注时另外计算相对标注的字符错误率
+            stats['cer_vs_base'] = char_error_rate(texts, base_texts)
+            if labeled:
+                stats['cer'] = char_error_rate([texts[i] for i in labeled], [labels[i] for i in labeled])
+            report['models'][name] = stats
+
+        summarize(base_name, base_entry, base_stats, base_texts)
+        for name, entry in variants.items():
+            print(f"⏱️ 评估量化模型: {name}")
+            engine = ONNXOCREngine(name, config_path=eval_config_path)
+            stats, texts = evaluate(engine, samples, args.repeats)
+            summarize(name, entry, stats, texts)
+    finally:
+        os.remove(eval_config_path)
+
+    # 3. 报告
+    base_cer = report['models'][base_name].get('cer')
+    print(f"\n📊 {'模型':<28}{'大小MB':>8}{'平均耗时':>10}{'加速':>7}{'差异率':>8}{'CER':>8}{'ΔCER':>8}")
+    for name, stats in report['models'].items():
+        cer = stats.get('cer')
+        delta = f"{cer - base_cer:+.3f}" if cer is not None else '-'
+        print(f"   {name:<28}{stats['size_mb']:>8.1f}{stats['latency_mean'] * 1000:>8.1f}ms"
+              f"{stats['speedup']:>6.2f}x{stats['cer_vs_base']:>8.3f}"
+              f"{(f'{cer:.3f}' if cer is not None else '-'):>8}{delta:>8}")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 评估报告已保存: {args.output}")
+
+    # 4. 登记到模型配置
+    if not args.no_register:
+        config['models'].update(variants)
+        save_model_config(config, args.config)
+        print(f"📝 已登记到模型配置: {', '.join(variants)}（OCR_MODEL=<名称> 使用）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+OCR结果缓存 - 以图像内容哈希 + 引擎参数为键
+相同图片重复上传时直接返回已生成的识别结果和文件，不再重新运行OCR
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class OCRResultCache:
+    """带容量、总大小和过期时间限制的LRU结果缓存（线程安全）
+
+    artifact_size: 以输出目录调用，返回其中结果文件的字节数（如结果保留索引中记录的大小），
+                   None表示只按结果JSON计算条目大小
+    """
+
+    def __init__(self, max_entries=256, max_bytes=512 * 1024 * 1024, max_age=24 * 3600, artifact_size=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.artifact_size = artifact_size
+        self._entries = OrderedDict()  # key -> {'result', 'size', 'created'}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes, **params):
+        """缓存键: 图像SHA-256 + 排序后的参数（引擎、模型、阈值等）"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        param_str = json.dumps(params, sort_keys=True, default=str)
+        param_digest = hashlib.sha256(param_str.encode('utf-8')).hexdigest()[:16]
+        return f"{digest}_{param_digest}"
+
+    def _entry_size(self, result, encoded):
+        """缓存条目大小 = 结果JSON大小 + 输出目录中的文件大小（由 artifact_size 提供，不遍历目录）"""
+        size = len(encoded)
+        output_dir = result.get('output_dir')
+        if output_dir and self.artifact_size is not None:
+            size += self.artifact_size(output_dir) or 0
+        return size
+
+    def get(self, key, outputs=None):
+        """查询缓存，过期或结果文件已被删除时视为未命中
+
+        outputs: 本次请求需要立即生成的结果文件类型（None为全部）；缓存的结果推迟生成了
+                 其中某种类型时视为未命中（条目保留，供只需要已生成类型的请求使用）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expired = time.time() - entry['created'] > self.max_age
+                output_dir = entry['result'].get('output_dir')
+                missing = output_dir is not None and not os.path.isdir(output_dir)
+                if expired or missing:
+                    self._remove(key)
+                    entry = None
+            if entry is not None:
+                deferred = entry['result'].get('deferred') or []
+                if any(kind in deferred for kind in (deferred if outputs is None else outputs)):
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(json.dumps(entry['result']))
+
+    def put(self, key, result):
+        """写入缓存，并按LRU顺序淘汰超出限制的条目"""
+        encoded = json.dumps(result, default=str)
+        size = self._entry_size(result, encoded.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        stored = json.loads(encoded)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {'result': stored, 'size': size, 'created': time.time()}
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry['size']
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
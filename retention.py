@@ -0,0 +1,171 @@
+"""
+结果文件保留策略 - 记录结果目录、上传文件等的大小和创建时间，后台线程按过期时间和总大小上限清理
+索引在启动时扫描一次，之后只在新增/更新时测量单个目录；定期只列出各根目录的直接子项
+（不遍历文件）来发现其他worker创建或已被删除的条目，列表查询直接从索引返回。
+"""
+import os
+import time
+import shutil
+import threading
+
+from process_local import OncePerProcess
+
+
+def measure(path):
+    """文件或目录（含子目录）的 (总字节数, 文件数)"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path), 1
+    size = count = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    size += entry.stat(follow_symlinks=False).st_size
+                    count += 1
+    return size, count
+
+
+class ResultRetention:
+    """按根目录的直接子项（结果目录、上传文件、缓存的压缩包）管理磁盘占用（线程安全）
+
+    max_age: 条目创建后保留的秒数，0为不限制
+    max_bytes: 所有条目的总大小上限，超出时从最旧的条目开始删除，0为不限制
+    min_age: 创建不足该秒数的条目不会因总大小超限被删除（可能仍在生成或下载中）
+    on_evict: 条目被删除后以其路径调用（如清除文件索引中的登记）
+    """
+
+    def __init__(self, roots, max_age=24 * 3600, max_bytes=2048 * 1024 * 1024,
+                 interval=300, min_age=300, exclude=('_jobs',), on_evict=None):
+        self.roots = [root for root in roots if root]
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.min_age = min_age
+        self.exclude = set(exclude)
+        self.on_evict = on_evict
+        self._entries = {}  # 路径 -> {'path', 'size', 'files', 'created'}
+        self._lock = threading.Lock()
+        self._ensure_thread = OncePerProcess(self._start_thread)
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.scan()
+
+    def _key(self, path):
+        # 调用方可能传入相对路径或绝对路径（按需生成文件时），统一为绝对路径
+        return os.path.abspath(path)
+
+    def _children(self, root):
+        if not os.path.isdir(root):
+            return []
+        return [os.path.join(root, name) for name in os.listdir(root)
+                if name not in self.exclude and not name.startswith('.') and not name.endswith('.tmp')]
+
+    def update(self, path):
+        """登记或重新测量一个条目（新生成结果或按需生成文件后调用）"""
+        key = self._key(path)
+        try:
+            size, files = measure(key)
+            stat = os.stat(key)
+            # Linux上没有创建时间，目录的ctime在新增文件时会变化，取较早的mtime/ctime作为近似
+            created = min(stat.st_ctime, stat.st_mtime)
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created = entry['created']
+            self._entries[key] = {'path': key, 'size': size, 'files': files, 'created': created}
+
+    def scan(self):
+        """与磁盘同步：登记新出现的条目，移除已不存在的条目；已登记的条目不重新测量"""
+        present = set()
+        for root in self.roots:
+            present.update(self._key(path) for path in self._children(root))
+        with self._lock:
+            known = set(self._entries)
+            for key in known - present:
+                del self._entries[key]
+        for key in present - known:
+            self.update(key)
+
+    def evict(self):
+        """删除过期的条目，再按创建时间从旧到新删除直到总大小不超过上限，返回删除的条目数"""
+        now = time.time()
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e['created'])
+            total = sum(e['size'] for e in entries)
+            victims = []
+            for entry in entries:
+                age = now - entry['created']
+                expired = self.max_age and age > self.max_age
+                over_budget = self.max_bytes and total > self.max_bytes and age > self.min_age
+                if expired or over_budget:
+                    victims.append(entry)
+                    total -= entry['size']
+                    del self._entries[entry['path']]
+        for entry in victims:
+            # 其他worker可能已经删除了同一条目
+            if os.path.isdir(entry['path']):
+                shutil.rmtree(entry['path'], ignore_errors=True)
+            elif os.path.exists(entry['path']):
+                try:
+                    os.remove(entry['path'])
+                except OSError:
+                    pass
+            if self.on_evict is not None:
+                self.on_evict(entry['path'])
+        if victims:
+            freed = sum(e['size'] for e in victims)
+            with self._lock:
+                self.evicted += len(victims)
+                self.evicted_bytes += freed
+            print(f"🧹 已清理 {len(victims)} 个过期结果，释放 {freed / 1024 / 1024:.1f}MB")
+        return len(victims)
+
+    def ensure_started(self):
+        """在当前进程中启动后台清理线程（处理第一个请求时调用，见 process_local）"""
+        self._ensure_thread()
+
+    def _start_thread(self):
+        threading.Thread(target=self._loop, name='result-retention', daemon=True).start()
+        print(f"🧹 结果清理已启动: 保留 {self.max_age}s, 上限 {self.max_bytes / 1024 / 1024:.0f}MB, "
+              f"每 {self.interval}s 检查一次")
+
+    def _loop(self):
+        while True:
+            try:
+                self.scan()
+                self.evict()
+            except Exception as e:
+                print(f"⚠️ 结果清理出错: {e}")
+            time.sleep(self.interval)
+
+    def size(self, path):
+        """已登记条目的字节数（update 时测量，不访问文件系统），未登记时返回None"""
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+            return entry['size'] if entry is not None else None
+
+    def list_entries(self, root=None):
+        """索引中的条目（按创建时间从新到旧），root指定时只返回该根目录下的条目"""
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values()]
+        if root is not None:
+            root = self._key(root)
+            entries = [e for e in entries if os.path.dirname(e['path']) == root]
+        return sorted(entries, key=lambda e: e['created'], reverse=True)
+
+    def stats(self):
+        """索引统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(e['size'] for e in self._entries.values()),
+                'evicted': self.evicted,
+                'evicted_bytes': self.evicted_bytes
+            }
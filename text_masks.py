@@ -0,0 +1,92 @@
+"""
+文字区域掩码 - 总体掩码只分配一张整图，每个文字区域只保存其裁剪范围内的局部掩码
+文字区域数量增加时内存占用基本不变。
+"""
+import cv2
+import numpy as np
+
+EXPAND_RATIO = 1.2  # 以中心点为基准扩展20%
+REGION_MARGIN = 10  # 分离文字区域时的裁剪边距
+
+
+def expand_polygons(bboxes, ratio=EXPAND_RATIO):
+    """以中心点为基准批量扩展检测框，返回int32多边形列表"""
+    if len(bboxes) == 0:
+        return []
+    try:
+        points = np.asarray(bboxes, dtype=np.int32)
+    except ValueError:
+        # 各检测框点数不同时逐个扩展
+        return [expand_polygons([bbox], ratio)[0] for bbox in bboxes]
+    center = points.mean(axis=1, keepdims=True)
+    return list((center + (points - center) * ratio).astype(np.int32))
+
+
+def region_rect(polygon, img_shape, margin=REGION_MARGIN):
+    """计算文字区域的裁剪位置 (x, y, w, h)：多边形在图像内的外接矩形加边距，完全在图像外时返回None"""
+    height, width = img_shape[:2]
+    x, y, w, h = cv2.boundingRect(polygon)
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    x, y, w, h = x0, y0, x1 - x0, y1 - y0
+    # 添加一些边距
+    x = max(0, x - margin)
+    y = max(0, y - margin)
+    w = min(width - x, w + 2 * margin)
+    h = min(height - y, h + 2 * margin)
+    return (x, y, w, h)
+
+
+def build_text_masks(img_shape, bboxes, margin=REGION_MARGIN):
+    """创建总体掩码和每个文字区域的局部掩码
+
+    返回 (combined_mask, regions)，regions 与 bboxes 一一对应，
+    每项为 (x, y, w, h) 裁剪位置和 h*w 的局部掩码；区域在图像外时为None。
+    """
+    height, width = img_shape[:2]
+    combined_mask = np.zeros((height, width), dtype=np.uint8)
+    regions = []
+
+    for polygon in expand_polygons(bboxes):
+        # 逐个填充：一次传入多个多边形时重叠部分会被异或抵消
+        cv2.fillPoly(combined_mask, [polygon], 255)
+
+        rect = region_rect(polygon, img_shape, margin)
+        if rect is None:
+            regions.append(None)
+            continue
+        x, y, w, h = rect
+        local_mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillPoly(local_mask, [polygon - np.array([x, y], dtype=np.int32)], 255)
+        regions.append((rect, local_mask))
+
+    # 对掩码进行形态学处理
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
+    combined_mask = cv2.dilate(combined_mask, kernel, iterations=1)
+
+    return combined_mask, regions
+
+
+def crop_box(img, box, rotate_vertical=True):
+    """透视变换裁剪文本框（四点坐标）用于识别，竖排文本旋转为横排（rotate_vertical=False时保持原方向）"""
+    box = np.asarray(box, dtype=np.float32)
+    crop_w = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+    crop_h = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+    crop_w, crop_h = max(crop_w, 1), max(crop_h, 1)
+    dst = np.array([[0, 0], [crop_w, 0], [crop_w, crop_h], [0, crop_h]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(box, dst)
+    crop = cv2.warpPerspective(img, matrix, (crop_w, crop_h),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if rotate_vertical and crop_h / crop_w >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def crop_region(img, rect, local_mask):
+    """从原图裁剪文字区域，掩码外的像素置黑"""
+    x, y, w, h = rect
+    roi = img[y:y + h, x:x + w]
+    return cv2.bitwise_and(roi, roi, mask=local_mask)
@@ -0,0 +1,143 @@
+"""
+分块文字检测 - 大图切分为互相重叠的小块，各块按原分辨率并行检测，再合并接缝处的重复框
+整图缩放到检测尺寸时长截图中的小文字会丢失；分块后每次推理的输入不超过块大小，
+内存占用和单次推理耗时与整图尺寸无关。
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from box_clustering import connected_labels
+
+# models/model-config.json 中 defaultSettings.tiledDetection 的默认值
+DEFAULT_TILE_SETTINGS = {
+    'enabled': True,
+    'tileSize': 1280,   # 块的最大边长，图像最长边超过该值（且超过引擎自身的缩放上限）时才分块
+    'overlap': 128,     # 相邻块的重叠像素，应大于一行文字的高度
+    'batchSize': 4,     # 每次一起检测的块数
+    'workers': 2,       # 并行检测的线程数
+}
+DUPLICATE_THRESHOLD = 0.5  # 交集面积/较小框面积 超过该值视为同一文字的重复检测
+SEAM_TOLERANCE = 3         # 框边缘距离块边界小于该值时视为被接缝截断
+
+
+def tile_settings(settings):
+    """合并配置中的分块检测设置与默认值"""
+    merged = dict(DEFAULT_TILE_SETTINGS)
+    merged.update(settings.get('tiledDetection') or {})
+    return merged
+
+
+def needs_tiling(shape, tile_size, resize_limit=0):
+    """图像是否需要分块检测
+
+    resize_limit: 引擎整图检测时的最长边上限，不超过该值的图像按原分辨率检测，分块没有收益，
+                  只会改变检测结果（如EasyOCR的canvas_size为2560）
+    """
+    return max(shape[:2]) > max(tile_size, resize_limit)
+
+
+def make_tiles(height, width, tile_size, overlap):
+    """计算覆盖整图的块 (x0, y0, x1, y1)：相邻块重叠overlap像素，最后一块与图像边缘对齐"""
+    overlap = min(overlap, tile_size // 2)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, tile_size - overlap))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def detect_tiled(img, detect_batch, tile_size, overlap, batch_size=4, workers=2):
+    """分块检测整张图像，返回合并后的四点文本框列表（原图坐标）
+
+    detect_batch: 接收图像块列表、返回每块文本框列表的检测函数，会在多个线程中同时调用；
+    同一时刻最多只有 workers*batch_size 个块在推理，块本身是原图的视图，不复制像素
+    """
+    height, width = img.shape[:2]
+    tiles = make_tiles(height, width, tile_size, overlap)
+    groups = [tiles[i:i + batch_size] for i in range(0, len(tiles), max(1, batch_size))]
+
+    def run(group):
+        return detect_batch([img[y0:y1, x0:x1] for x0, y0, x1, y1 in group])
+
+    boxes, sources = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for group, group_boxes in zip(groups, executor.map(run, groups)):
+            for tile, tile_boxes in zip(group, group_boxes):
+                offset = np.array(tile[:2], dtype=np.float32)
+                for box in tile_boxes:
+                    boxes.append(np.asarray(box, dtype=np.float32) + offset)
+                    sources.append(tile)
+    return merge_tile_boxes(boxes, sources, (height, width))
+
+
+def merge_tile_boxes(boxes, sources, shape):
+    """合并来自不同块的文本框
+
+    boxes: 原图坐标的四点框列表；sources: 每个框所在块的 (x0, y0, x1, y1)
+    - 重复检测（两块重叠区域内的同一文字）：按面积做NMS，只保留较大的框
+    - 接缝截断（一行文字被块边界切成两段）：合并为两段的外接矩形
+    只有落在两个以上块内的框才参与比较，比较次数与接缝附近的框数相关
+    """
+    if not boxes:
+        return []
+    height, width = shape
+    points = np.stack(boxes)
+    rects = np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)  # x0, y0, x1, y1
+    owners = np.array(sources, dtype=np.float32)
+    tiles = np.unique(owners, axis=0)
+
+    # 与多个块相交的框才可能在接缝处重复或被截断
+    hits = ((rects[:, None, 0] < tiles[None, :, 2]) & (rects[:, None, 2] > tiles[None, :, 0]) &
+            (rects[:, None, 1] < tiles[None, :, 3]) & (rects[:, None, 3] > tiles[None, :, 1]))
+    candidates = np.flatnonzero(hits.sum(axis=1) > 1)
+
+    pairs_i = pairs_j = np.empty(0, dtype=np.int64)
+    split_members = np.empty(0, dtype=np.int64)
+    if len(candidates) > 1:
+        r, o = rects[candidates], owners[candidates]
+        ix = np.minimum(r[:, None, 2], r[None, :, 2]) - np.maximum(r[:, None, 0], r[None, :, 0])
+        iy = np.minimum(r[:, None, 3], r[None, :, 3]) - np.maximum(r[:, None, 1], r[None, :, 1])
+        w, h = r[:, 2] - r[:, 0], r[:, 3] - r[:, 1]
+        area = w * h
+        inter = np.clip(ix, 0, None) * np.clip(iy, 0, None)
+        other_tile = np.any(o[:, None] != o[None, :], axis=2)
+        duplicate = inter > DUPLICATE_THRESHOLD * np.minimum(area[:, None], area[None, :])
+
+        # 框在块的内侧边界（不是图像边界）被截断
+        cut_x = (((r[:, 0] <= o[:, 0] + SEAM_TOLERANCE) & (o[:, 0] > 0)) |
+                 ((r[:, 2] >= o[:, 2] - 1 - SEAM_TOLERANCE) & (o[:, 2] < width)))
+        cut_y = (((r[:, 1] <= o[:, 1] + SEAM_TOLERANCE) & (o[:, 1] > 0)) |
+                 ((r[:, 3] >= o[:, 3] - 1 - SEAM_TOLERANCE) & (o[:, 3] < height)))
+        # 左右截断的两段需在同一行（垂直方向大部分重叠），上下截断同理
+        same_row = iy > 0.5 * np.minimum(h[:, None], h[None, :])
+        same_col = ix > 0.5 * np.minimum(w[:, None], w[None, :])
+        split = other_tile & (ix >= 0) & (iy >= 0) & (
+            ((cut_x[:, None] | cut_x[None, :]) & same_row) |
+            ((cut_y[:, None] | cut_y[None, :]) & same_col))
+
+        a, b = np.nonzero(np.triu(split | (other_tile & duplicate), k=1))
+        pairs_i, pairs_j = candidates[a], candidates[b]
+        split_members = candidates[np.nonzero(np.triu(split, k=1))[0]]
+
+    labels = connected_labels(len(boxes), pairs_i, pairs_j)
+    split_roots = set(labels[split_members].tolist())
+    groups = {}
+    for i, label in enumerate(labels.tolist()):
+        groups.setdefault(label, []).append(i)
+
+    merged = []
+    for root, members in groups.items():
+        if len(members) == 1:
+            merged.append(points[members[0]])
+        elif root in split_roots:
+            x0, y0 = rects[members, 0].min(), rects[members, 1].min()
+            x1, y1 = rects[members, 2].max(), rects[members, 3].max()
+            merged.append(np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float32))
+        else:
+            areas = [(rects[i, 2] - rects[i, 0]) * (rects[i, 3] - rects[i, 1]) for i in members]
+            merged.append(points[members[int(np.argmax(areas))]])
+    return sorted(merged, key=lambda b: (round(b[0][1] / 10), b[0][0]))
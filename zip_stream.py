@@ -0,0 +1,115 @@
+"""
+流式ZIP打包 - 边读取文件边生成zip数据块，不在磁盘上生成临时压缩包
+已压缩的图片（JPEG/PNG等）以STORED方式存储，只有文本等文件使用DEFLATE压缩；
+压缩包写入不可寻址的输出流，每个文件的大小和CRC写在数据之后（data descriptor）。
+"""
+import os
+import time
+import zipfile
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+# 本身已经压缩过的格式，再次DEFLATE几乎不会变小，只会占用CPU
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip')
+
+
+class _ChunkWriter:
+    """zipfile写入的输出流：数据先暂存，由生成器按块取出"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def list_entries(root):
+    """目录下的所有文件 (路径, 压缩包内路径)，按压缩包内路径排序"""
+    entries = []
+    for current, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.tmp'):
+                continue  # 正在写入的结果文件
+            path = os.path.join(current, name)
+            entries.append((path, os.path.relpath(path, root).replace(os.sep, '/')))
+    return entries
+
+
+def tree_version(root, entries):
+    """目录内容的版本标识：文件和子目录的最新修改时间 + 文件数，内容有变化时随之改变"""
+    latest = os.stat(root).st_mtime_ns
+    for current, dirs, files in os.walk(root):
+        latest = max(latest, os.stat(current).st_mtime_ns)
+    for path, _ in entries:
+        latest = max(latest, os.stat(path).st_mtime_ns)
+    return f'{latest}_{len(entries)}'
+
+
+def compress_type(arcname):
+    return zipfile.ZIP_STORED if arcname.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE, on_complete=None):
+    """逐块产出由 entries [(路径, 压缩包内路径), ...] 组成的zip数据
+
+    on_complete(文件数, 字节数, 打包耗时): 全部输出后调用；耗时只统计读取和压缩，不含客户端接收数据的时间
+    """
+    output = _ChunkWriter()
+    elapsed, total, count = 0.0, 0, 0
+    start = time.perf_counter()
+    archive = zipfile.ZipFile(output, 'w')
+    for path, arcname in entries:
+        try:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            source = open(path, 'rb')
+        except OSError as e:
+            # 打包期间被删除的文件跳过
+            print(f"⚠️ 跳过无法读取的文件 {path}: {e}")
+            continue
+        info.compress_type = compress_type(arcname)
+        with source, archive.open(info, 'w') as target:
+            while True:
+                data = source.read(chunk_size)
+                if not data:
+                    break
+                target.write(data)
+                if output.size >= chunk_size:
+                    chunk = output.take()
+                    elapsed += time.perf_counter() - start
+                    total += len(chunk)
+                    yield chunk
+                    start = time.perf_counter()
+        count += 1
+    archive.close()
+    chunk = output.take()
+    elapsed += time.perf_counter() - start
+    total += len(chunk)
+    yield chunk
+    if on_complete is not None:
+        on_complete(count, total, elapsed)
+
+
+def tee_to_file(chunks, path):
+    """产出数据块的同时写入path；完整输出后才以原子重命名生成文件，中途断开时不留下不完整的文件"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)